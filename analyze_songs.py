@@ -0,0 +1,175 @@
+import argparse
+import collections
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # keyboard_geometry imports pygame for Rect; no window is opened
+
+import pygame
+
+from keyboard_geometry import KeyboardGeometry, fit_key_range, parse_key_range
+from midi_file import load_midi_file, PARSER_VERSION
+from timeline import ChordSteps, compile_note_events, DEFAULT_CHORD_TOLERANCE_SEC
+
+SONG_EXTENSIONS = ('.mid', '.midi')
+IN_FLIGHT_PER_WORKER = 2  # Files submitted ahead per worker; bounds how many are suspects when a worker dies
+DEFAULT_KEY_RANGE = '60-83'  # The two octaves from middle C that the computer keyboard plays
+RESULT_FIELDS = ('path', 'size', 'mtime_ns', 'parser_version', 'error', 'num_notes', 'duration', 'min_pitch', 'max_pitch',
+                 'fit_first_note', 'fit_last_note', 'keyboard_first_note', 'keyboard_last_note', 'notes_off_keyboard', 'fraction_off_keyboard',
+                 'notes_per_second', 'num_chords', 'chords_per_second', 'mean_chord_size', 'max_chord_size', 'max_chord_time', 'max_polyphony')
+
+
+def analyze_song(path, key_range=(60, 83), chord_tolerance_sec=DEFAULT_CHORD_TOLERANCE_SEC):
+    # Statistics for one MIDI file, from the same note model, keyboard mapping and chord grouping the app uses.
+    result = dict.fromkeys(RESULT_FIELDS); result.update(path=path, parser_version=PARSER_VERSION)
+    try: stat = os.stat(path); result.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns); notes = load_midi_file(path)
+    except (OSError, ValueError) as e: result['error'] = str(e); return result
+    geometry = KeyboardGeometry(key_range[0], key_range[1], pygame.Rect(0, 0, 1200, 200))
+    num_notes = len(notes); duration = notes.total_duration
+    result.update(num_notes=num_notes, duration=round(duration, 3), keyboard_first_note=geometry.first_midi_note, keyboard_last_note=geometry.last_midi_note)
+    if not num_notes: return result
+    fit_first_note, fit_last_note = fit_key_range(notes.pitches)
+    notes_off_keyboard = sum(1 for pitch in notes.pitches if not geometry.contains(pitch))
+    chords = ChordSteps(notes, chord_tolerance_sec); chord_sizes = [len(chords.note_range(c)) for c in range(len(chords))]
+    largest_chord = max(range(len(chords)), key=chord_sizes.__getitem__)
+    # Polyphony: running count of sounding notes over the compiled note-on/off events
+    _, is_note_on, _ = compile_note_events(notes); sounding = max_polyphony = 0
+    for note_on in is_note_on:
+        sounding += 1 if note_on else -1
+        if sounding > max_polyphony: max_polyphony = sounding
+    result.update(min_pitch=min(notes.pitches), max_pitch=max(notes.pitches), fit_first_note=fit_first_note, fit_last_note=fit_last_note,
+                  notes_off_keyboard=notes_off_keyboard, fraction_off_keyboard=round(notes_off_keyboard / num_notes, 4),
+                  notes_per_second=round(num_notes / duration, 3) if duration > 0 else None, num_chords=len(chords),
+                  chords_per_second=round(len(chords) / duration, 3) if duration > 0 else None, mean_chord_size=round(num_notes / len(chords), 3),
+                  max_chord_size=chord_sizes[largest_chord], max_chord_time=round(chords.starts[largest_chord], 3), max_polyphony=max_polyphony)
+    return result
+
+
+def error_row(path, error):
+    row = dict.fromkeys(RESULT_FIELDS); row.update(path=path, parser_version=PARSER_VERSION, error=f"{type(error).__name__}: {error}")
+    try: stat = os.stat(path); row.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    except OSError: pass
+    return row
+
+
+def find_songs(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dir_names, file_names in os.walk(path):
+                dir_names[:] = sorted(name for name in dir_names if not name.startswith('.'))
+                for file_name in sorted(file_names):
+                    if file_name.lower().endswith(SONG_EXTENSIONS): yield os.path.join(root, file_name)
+        else: yield path
+
+
+class ResultWriter:
+    # Appends results to a JSONL or CSV file as they arrive, flushing each row so an interrupted run loses at most
+    # the row being written. Rows already in the file (same path, size, mtime and parser version) are skipped on resume.
+
+    def __init__(self, path, output_format):
+        self.path = path; self.output_format = output_format
+        self.done = self._read_done() if path != '-' and os.path.exists(path) else set()
+        if path == '-': self._file = sys.stdout; write_header = True
+        else: write_header = not os.path.exists(path) or not os.path.getsize(path); self._file = open(path, 'a', newline='')
+        self._csv = csv.DictWriter(self._file, RESULT_FIELDS, extrasaction='ignore') if output_format == 'csv' else None
+        if self._csv and write_header: self._csv.writeheader()
+
+    @staticmethod
+    def row_key(row):
+        return str(row['path']), str(row['size']), str(row['mtime_ns']), str(row['parser_version'])
+
+    def _read_done(self):
+        # Drops a trailing partial row (from an interrupted write) before anything is appended.
+        with open(self.path, 'rb+') as result_file:
+            data = result_file.read(); complete_len = data.rfind(b'\n') + 1
+            if complete_len < len(data): result_file.truncate(complete_len)
+        with open(self.path, newline='') as result_file:
+            if self.output_format == 'csv': rows = list(csv.DictReader(result_file))
+            else:
+                rows = []
+                for line in result_file:
+                    try: rows.append(json.loads(line))
+                    except ValueError: continue
+        return {self.row_key(row) for row in rows}  # Failed files too: they are retried once the file or the parser changes
+
+    def is_done(self, path):
+        try: stat = os.stat(path)
+        except OSError: return False
+        return (path, str(stat.st_size), str(stat.st_mtime_ns), str(PARSER_VERSION)) in self.done
+
+    def write(self, row):
+        if self._csv: self._csv.writerow(row)
+        else: self._file.write(json.dumps(row) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout: self._file.close()
+
+
+def _analyze_on_pool(song_paths, jobs, key_range, chord_tolerance_sec, write_row):
+    # Analyses the song_paths deque (consumed) on a fresh pool with a few files in flight per worker. Returns [] once
+    # all are written, or the files still in flight when a worker died (BrokenProcessPool): those get no row.
+    in_flight = {}; suspects = []
+    with ProcessPoolExecutor(jobs) as executor:
+        while (song_paths or in_flight) and not suspects:
+            try:
+                while song_paths and len(in_flight) < jobs * IN_FLIGHT_PER_WORKER:
+                    future = executor.submit(analyze_song, song_paths[0], key_range, chord_tolerance_sec); in_flight[future] = song_paths.popleft()
+            except BrokenProcessPool:  # Broke since the last wait; the caller starts a new pool for what is left
+                if not in_flight: return suspects
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                song_path = in_flight.pop(future)
+                # Anything else analyze_song raises for a bad file becomes an error row for that song, not the end of the scan
+                try: write_row(future.result())
+                except BrokenProcessPool: suspects.append(song_path)
+                except Exception as e: write_row(error_row(song_path, e))
+        for future, song_path in in_flight.items():  # The pool is broken: finished files still count, the rest are suspects
+            try: write_row(future.result())
+            except BrokenProcessPool: suspects.append(song_path)
+            except Exception as e: write_row(error_row(song_path, e))
+    return suspects
+
+
+def analyze_catalogue(paths, output_path, output_format, key_range, chord_tolerance_sec, jobs=None):
+    writer = ResultWriter(output_path, output_format); t0 = time.perf_counter()
+    song_paths = list(find_songs(paths)); num_found = len(song_paths)
+    song_paths = collections.deque(song_path for song_path in song_paths if not writer.is_done(song_path))
+    skipped = num_found - len(song_paths); counts = {'analyzed': 0, 'failed': 0, 'crashed': 0}
+    def write_row(row):
+        writer.write(row); counts['analyzed'] += 1; counts['failed'] += row['error'] is not None
+    try:
+        while song_paths:
+            # A dead worker takes the whole pool down; the files in flight are rerun one per pool, which pins the crash
+            # on one file. It gets no row, so a later run retries it, and the scan carries on with a new pool.
+            for song_path in _analyze_on_pool(song_paths, jobs or os.cpu_count() or 1, key_range, chord_tolerance_sec, write_row):
+                if _analyze_on_pool(collections.deque([song_path]), 1, key_range, chord_tolerance_sec, write_row):
+                    counts['crashed'] += 1; print(f"{song_path}: worker process died; skipped, will be retried on the next run", file=sys.stderr)
+    finally: writer.close()
+    print(f"Analyzed {counts['analyzed']} songs ({counts['failed']} failed, {counts['crashed']} crashed, {skipped} already done) in {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+    return counts['analyzed'], counts['failed'] + counts['crashed']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute per-song statistics for MIDI files without opening a window.")
+    parser.add_argument('paths', nargs='+', help="MIDI files and/or directories to scan recursively")
+    parser.add_argument('-o', '--output', default='-', help="results file (.jsonl or .csv); an existing file is resumed. Default: JSONL on stdout")
+    parser.add_argument('--format', dest='output_format', choices=('jsonl', 'csv'), help="output format (default: from the output file extension)")
+    parser.add_argument('--key-range', default=DEFAULT_KEY_RANGE, help="keyboard window the songs are compared against, as for PIANO_KEYBOARD_RANGE (default: %(default)s)")
+    parser.add_argument('--chord-tolerance', type=float, default=DEFAULT_CHORD_TOLERANCE_SEC, help="seconds within which notes form one learning-mode chord")
+    parser.add_argument('--jobs', type=int, help="worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+    output_format = args.output_format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    key_range = parse_key_range(args.key_range)
+    if key_range is None: parser.error("--key-range needs a fixed range ('88' or 'first-last')")
+    _, failed = analyze_catalogue(args.paths, args.output, output_format, key_range, args.chord_tolerance, args.jobs)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import queue
+import threading
+import time
+
+
+class AssetLoader:
+    # Runs load jobs on one background thread, in submission order, so the window and first frame do not wait for
+    # them. Each job is identified by the id submit() returns; readiness is tracked per job and on_ready(job_id)
+    # is called from the loader thread when a job finishes (e.g. to post a wake-up event to the main loop).
+
+    def __init__(self, on_ready=None):
+        self.on_ready = on_ready
+        self._jobs = queue.Queue(); self._thread = None
+        self._done = {}; self._results = {}; self._errors = {}
+        self.names = {}; self.load_ms = {}
+        self._next_job_id = 1
+
+    def submit(self, name, load_func, *args):
+        job_id = self._next_job_id; self._next_job_id += 1
+        self.names[job_id] = name; self._done[job_id] = threading.Event()
+        self._jobs.put((job_id, load_func, args))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='asset-loader', daemon=True); self._thread.start()
+        return job_id
+
+    def _run(self):
+        while True:
+            job_id, load_func, args = self._jobs.get()
+            t0 = time.perf_counter()
+            try: self._results[job_id] = load_func(*args)
+            except Exception as e: self._errors[job_id] = e; print(f"Loading {self.names[job_id]} failed: {e}")
+            self.load_ms[job_id] = (time.perf_counter() - t0) * 1000.0
+            self._done[job_id].set()
+            if self.on_ready is not None: self.on_ready(job_id)
+
+    def is_ready(self, job_id):
+        return self._done[job_id].is_set()
+
+    @property
+    def all_ready(self):
+        return all(done.is_set() for done in self._done.values())
+
+    def wait(self, job_id, timeout=None):
+        return self._done[job_id].wait(timeout)
+
+    def result(self, job_id):
+        # The job's return value; re-raises its exception. Only valid once the job is ready.
+        if job_id in self._errors: raise self._errors[job_id]
+        return self._results.get(job_id)
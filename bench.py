@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import random
+import time
+from array import array
+
+# The harness must select SDL's dummy drivers before main.py initialises pygame and opens its window.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+import main as app
+from note_store import NoteStore
+
+DEFAULT_SONG_SIZES = (1000, 10000, 100000)
+DEFAULT_FRAMES = 600
+NOTES_PER_SECOND = 8.0
+
+
+def make_synthetic_song(num_notes, notes_per_second=NOTES_PER_SECOND, seed=0):
+    # Random melody with occasional chords, spread over a wider range than the keyboard so off-key notes are exercised too.
+    rng = random.Random(seed)
+    pitches = array('B'); starts = array('d'); durations = array('d'); velocities = array('B')
+    t = 0.0; step = 1.0 / notes_per_second
+    while len(pitches) < num_notes:
+        for _ in range(min(rng.choice((1, 1, 1, 2, 3)), num_notes - len(pitches))):
+            pitches.append(rng.randint(36, 96)); starts.append(t); durations.append(rng.uniform(0.1, 1.0)); velocities.append(rng.randint(40, 120))
+        t += step
+    return NoteStore.from_columns(pitches, starts, durations, velocities)
+
+
+def _click(pos):
+    return [pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=pos), pygame.event.Event(pygame.MOUSEBUTTONUP, button=1, pos=pos)]
+
+
+def _key(key):
+    return [pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode='', scancode=0), pygame.event.Event(pygame.KEYUP, key=key, mod=0, unicode='', scancode=0)]
+
+
+def _button_pos(action_id):
+    for button_info in app.control_panel_buttons:
+        if button_info['action_id'] == action_id: return button_info['rect'].center
+    return None
+
+
+def scripted_events(frame_idx, rng):
+    # Deterministic event stream: note presses every few frames plus periodic slider drags, seeks and mode switches.
+    events = []
+    if frame_idx == 1: events += _click(_button_pos('action_start'))
+    if frame_idx % 3 == 0:
+        events += _key(rng.choice(tuple(app.key_map)))
+    if frame_idx % 20 == 10: events += _key(pygame.K_SPACE)
+    if frame_idx % 90 == 30 and app.tempo_slider_props['rect']:
+        track = app.tempo_slider_props['rect']
+        events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=track.center))
+        for step in range(8): events.append(pygame.event.Event(pygame.MOUSEMOTION, pos=(track.left + step * track.width // 8, track.centery), rel=(0, 0), buttons=(1, 0, 0)))
+        events.append(pygame.event.Event(pygame.MOUSEBUTTONUP, button=1, pos=track.center))
+    if frame_idx % 90 == 60 and app.volume_slider_props['rect']:
+        track = app.volume_slider_props['rect']
+        events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1, pos=track.center))
+        for step in range(8): events.append(pygame.event.Event(pygame.MOUSEMOTION, pos=(track.right - step * track.width // 8, track.centery), rel=(0, 0), buttons=(1, 0, 0)))
+        events.append(pygame.event.Event(pygame.MOUSEBUTTONUP, button=1, pos=track.center))
+    if frame_idx % 120 == 45 and app.progress_bar_props['rect']:
+        bar = app.progress_bar_props['rect']
+        events += _click((bar.left + rng.randrange(bar.width), bar.centery))
+    if frame_idx % 150 == 75: events += _click(_button_pos('action_toggle_mode'))
+    if frame_idx % 150 == 80: events += _key(pygame.K_c)
+    return events
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values: return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))]
+
+
+def run_benchmark(note_store, num_frames, seed=0):
+    app.set_song(note_store)
+    rng = random.Random(seed)
+    stage_ns = {}
+    def timed_stage(stage_name, stage_func, *args):
+        t0 = time.perf_counter_ns(); result = stage_func(*args)
+        stage_ns.setdefault(stage_name, []).append(time.perf_counter_ns() - t0)
+        return result
+    app.run_frame([], 0)  # Warm-up frame lays out the control panel so scripted clicks have targets
+    frame_ns = []; last_ns = time.perf_counter_ns(); dt_ms = 0
+    for frame_idx in range(num_frames):
+        t0 = time.perf_counter_ns()
+        pygame.event.pump()
+        app.run_frame(scripted_events(frame_idx, rng), dt_ms, timed_stage)
+        now_ns = time.perf_counter_ns(); frame_ns.append(now_ns - t0)
+        dt_ms = (now_ns - last_ns) // 1000000; last_ns = now_ns
+    return summarize(frame_ns, stage_ns)
+
+
+def summarize(frame_ns, stage_ns):
+    frame_ms = sorted(ns / 1e6 for ns in frame_ns)
+    result = {'frames': len(frame_ms), 'p50_ms': percentile(frame_ms, 50), 'p95_ms': percentile(frame_ms, 95), 'p99_ms': percentile(frame_ms, 99),
+              'max_ms': frame_ms[-1] if frame_ms else 0.0, 'stages': {}}
+    for stage_name, samples in stage_ns.items():
+        stage_ms = sorted(ns / 1e6 for ns in samples)
+        result['stages'][stage_name] = {'mean_ms': sum(stage_ms) / len(stage_ms), 'p95_ms': percentile(stage_ms, 95), 'max_ms': stage_ms[-1]}
+    return result
+
+
+def print_report(num_notes, result):
+    print(f"\n{num_notes} notes, {result['frames']} frames: p50 {result['p50_ms']:.2f} ms  p95 {result['p95_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms  max {result['max_ms']:.2f} ms")
+    for stage_name, stats in result['stages'].items():
+        print(f"  {stage_name:<14} mean {stats['mean_ms']:7.3f} ms  p95 {stats['p95_ms']:7.3f} ms  max {stats['max_ms']:7.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless frame-time benchmark for the piano app main loop.")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SONG_SIZES)), help="comma-separated synthetic song sizes in notes")
+    parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES, help="frames to run per song")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', dest='json_path', help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+    results = {}
+    for num_notes in (int(size) for size in args.sizes.split(',') if size):
+        result = run_benchmark(make_synthetic_song(num_notes, seed=args.seed), args.frames, args.seed)
+        results[str(num_notes)] = result; print_report(num_notes, result)
+    if args.json_path:
+        with open(args.json_path, 'w') as f: json.dump(results, f, indent=2)
+    app.synth.stop(); pygame.quit()
+    return results
+
+
+if __name__ == '__main__':
+    main()
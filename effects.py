@@ -0,0 +1,72 @@
+from array import array
+
+import pygame
+
+SPRITE_COLOR_KEY = (255, 0, 255)
+
+
+class ShockwavePool:
+    # Fixed-capacity pool of expanding-ring shockwaves. Every wave shares one duration, so live waves form a FIFO
+    # ring buffer (oldest expires first) and spawning never allocates. Ring images are rendered once per
+    # (progress step, ring index) and shared by all waves.
+
+    def __init__(self, capacity, duration_ms, max_radius, color, num_rings=3, ring_base_thickness=4, progress_steps=48):
+        self.capacity = capacity; self.duration_ms = duration_ms
+        self.num_rings = num_rings; self.ring_base_thickness = ring_base_thickness; self.progress_steps = progress_steps
+        self.start_ms = array('d', bytes(8 * capacity)); self.center_x = array('i', bytes(4 * capacity)); self.center_y = array('i', bytes(4 * capacity))
+        self.head = 0; self.live_count = 0
+        self._blit_batch = []
+        self.configure(max_radius, color)
+
+    def configure(self, max_radius, color):
+        # Changing the look invalidates the shared ring sprites; they are re-rendered lazily on next use.
+        self.max_radius = max_radius; self.color = tuple(color)
+        self._sprites = [[False] * self.num_rings for _ in range(self.progress_steps)]
+
+    def clear(self):
+        self.head = 0; self.live_count = 0
+
+    def spawn(self, center_x, center_y, now_ms):
+        if self.live_count == self.capacity:  # Pool full: the oldest wave gives up its slot
+            self.head = (self.head + 1) % self.capacity; self.live_count -= 1
+        slot = (self.head + self.live_count) % self.capacity
+        self.start_ms[slot] = now_ms; self.center_x[slot] = int(center_x); self.center_y[slot] = int(center_y)
+        self.live_count += 1
+
+    def _expire(self, now_ms):
+        while self.live_count and now_ms - self.start_ms[self.head] > self.duration_ms:
+            self.head = (self.head + 1) % self.capacity; self.live_count -= 1
+
+    def _ring_sprite(self, step, ring_idx):
+        sprite = self._sprites[step][ring_idx]
+        if sprite is False: sprite = self._sprites[step][ring_idx] = self._render_ring(step, ring_idx)
+        return sprite
+
+    def _render_ring(self, step, ring_idx):
+        # Same geometry and colour fade as drawing the ring directly, evaluated at the middle of the progress step.
+        progress = (step + 0.5) / self.progress_steps
+        ring_radius = int(self.max_radius * progress * (1 - (ring_idx / self.num_rings) * 0.7))
+        if ring_radius < 1: return None
+        thickness = max(1, int(self.ring_base_thickness * (1.0 - progress)))
+        alpha_factor = int(max(0, min(255, 255 * (1.0 - progress ** 2)))) / 255.0
+        ring_color = tuple(max(0, min(255, int(c * alpha_factor))) for c in self.color)
+        sprite = pygame.Surface((ring_radius * 2 + 1, ring_radius * 2 + 1))
+        sprite.fill(SPRITE_COLOR_KEY); sprite.set_colorkey(SPRITE_COLOR_KEY, pygame.RLEACCEL)  # Thin rings are mostly transparent runs
+        pygame.draw.circle(sprite, ring_color, (ring_radius, ring_radius), ring_radius, thickness)
+        return (sprite.convert() if pygame.display.get_surface() else sprite), ring_radius
+
+    def draw(self, surface, now_ms, clip_area_rect):
+        self._expire(now_ms)
+        if not self.live_count: return
+        batch = self._blit_batch; batch.clear()
+        steps = self.progress_steps; duration = self.duration_ms
+        for k in range(self.live_count - 1, -1, -1):  # Newest first, so older (fainter) waves end up on top as before
+            slot = (self.head + k) % self.capacity
+            step = min(steps - 1, int((now_ms - self.start_ms[slot]) / duration * steps))
+            cx = self.center_x[slot]; cy = self.center_y[slot]
+            for ring_idx in range(self.num_rings):
+                ring = self._ring_sprite(step, ring_idx)
+                if ring is not None: batch.append((ring[0], (cx - ring[1], cy - ring[1])))
+        original_clip = surface.get_clip(); surface.set_clip(clip_area_rect)
+        surface.blits(batch, doreturn=False)
+        surface.set_clip(original_clip)
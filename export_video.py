@@ -0,0 +1,127 @@
+import argparse
+import math
+import multiprocessing
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+from midi_file import load_midi_file, MidiFileError
+
+DEFAULT_FPS = 30
+DEFAULT_SIZE = (1280, 720)
+DEFAULT_CHUNK_FRAMES = 30
+STAR_SEED = 0  # Every worker builds the same starfield, so frames match whichever process renders them
+OUTPUT_FORMATS = ('png', 'raw')
+
+# Per-process state set up by _init_worker; the app module is only imported inside workers, so the parent never opens a window.
+app = None; frame_size = None; frames_per_second = None; clip_start_sec = 0.0
+
+
+def _init_worker(song_path, size, fps, start_sec):
+    global app, frame_size, frames_per_second, clip_start_sec
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'; os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    os.environ['PIANO_FPS'] = 'uncapped'; os.environ.setdefault('PIANO_STAR_DENSITY', 'classic')
+    import main
+    app = main; frame_size = tuple(size); frames_per_second = fps; clip_start_sec = start_sec
+    app.open_window(frame_size, False); app.apply_window_layout(frame_size)
+    app.stars = app.Starfield(app.NUM_STARS, app.layout.width, app.layout.stars_max_y, app.STAR_COLORS, seed=STAR_SEED)
+    app.current_mode = app.APP_MODES['PRESENTATION']
+    app.set_song(app.load_song(song_path)); app.song_playback_status = 'PLAYING'
+
+
+def frame_time(frame_idx):
+    return clip_start_sec + frame_idx / frames_per_second
+
+
+def render_frame(frame_idx):
+    # Draws the frame at a fixed song time. Everything shown is a function of that time (timeline keys, star phase),
+    # never of the wall clock, so any process can render any frame.
+    time_sec = frame_time(frame_idx); screen = app.screen
+    app.current_song_time_seconds = time_sec; app.advance_presentation_to(time_sec, play_notes=False)
+    app.stars.set_time(time_sec * 1000.0)
+    app.draw_background(screen); app.draw_control_panel_stage(screen); app.draw_piano_roll(screen, build_budget_ms=None)  # Tiles built in full: output never depends on timing
+    app.draw_piano(screen, app.white_key_pressed_states, app.black_key_pressed_states); app.draw_shockwaves(screen); app.draw_overlays(screen)
+    app.frame_dirty_rects.clear(); app.frame_overlay_rects.clear()  # Frames are read back from the surface, never presented
+    return screen
+
+
+def render_chunk(task):
+    # Renders frames [first_frame, end_frame) in order after one seek to the chunk's first frame; writes PNGs, or one
+    # raw RGB24 file per chunk that the parent concatenates. Returns (first_frame, raw chunk path or None).
+    first_frame, end_frame, output_format, output_dir = task
+    app.sync_timeline_to(frame_time(first_frame))
+    if output_format == 'png':
+        for frame_idx in range(first_frame, end_frame): app.pygame.image.save(render_frame(frame_idx), os.path.join(output_dir, f'frame_{frame_idx:06d}.png'))
+        return first_frame, None
+    chunk_path = os.path.join(output_dir, f'chunk_{first_frame:06d}.rgb')
+    with open(chunk_path, 'wb') as chunk_file:
+        for frame_idx in range(first_frame, end_frame): chunk_file.write(app.pygame.image.tobytes(render_frame(frame_idx), 'RGB'))
+    return first_frame, chunk_path
+
+
+def plan_chunks(num_frames, chunk_frames, output_format, output_dir):
+    return [(first, min(num_frames, first + chunk_frames), output_format, output_dir) for first in range(0, num_frames, chunk_frames)]
+
+
+def _copy_and_remove(chunk_path, sink):
+    with open(chunk_path, 'rb') as chunk_file:
+        while True:
+            block = chunk_file.read(1 << 22)
+            if not block: break
+            sink.write(block)
+    os.remove(chunk_path)
+
+
+def export(song_path, output_dir, fps=DEFAULT_FPS, size=DEFAULT_SIZE, start_sec=0.0, duration_sec=None, output_format='png', pipe_command=None, jobs=None, chunk_frames=DEFAULT_CHUNK_FRAMES):
+    song_duration = load_midi_file(song_path).total_duration
+    if duration_sec is None: duration_sec = max(0.0, song_duration - start_sec)
+    num_frames = int(math.ceil(duration_sec * fps)) + 1
+    if pipe_command: output_format = 'raw'
+    os.makedirs(output_dir, exist_ok=True)
+    chunk_dir = tempfile.mkdtemp(prefix='chunks-', dir=output_dir) if output_format == 'raw' else output_dir
+    sink = encoder = None
+    if pipe_command:
+        encoder = subprocess.Popen(shlex.split(pipe_command.format(width=size[0], height=size[1], fps=fps)), stdin=subprocess.PIPE); sink = encoder.stdin
+    elif output_format == 'raw': sink = open(os.path.join(output_dir, 'frames.rgb'), 'wb')
+    # Spawned workers start from a clean interpreter, so none inherits an SDL display or audio device from the parent.
+    context = multiprocessing.get_context('spawn'); t0 = time.perf_counter()
+    with context.Pool(jobs or os.cpu_count(), initializer=_init_worker, initargs=(song_path, size, fps, start_sec)) as pool:
+        for first_frame, chunk_path in pool.imap(render_chunk, plan_chunks(num_frames, chunk_frames, output_format, chunk_dir)):
+            if chunk_path: _copy_and_remove(chunk_path, sink)  # imap yields chunks in frame order, so the stream stays ordered
+    if sink is not None: sink.close()
+    if chunk_dir != output_dir: os.rmdir(chunk_dir)
+    if encoder is not None and encoder.wait() != 0: raise RuntimeError(f"Encoder exited with status {encoder.returncode}")
+    elapsed = time.perf_counter() - t0
+    print(f"Rendered {num_frames} frames ({duration_sec:.1f} s of song at {fps} fps, {size[0]}x{size[1]}) in {elapsed:.1f} s, {duration_sec / elapsed if elapsed > 0 else math.inf:.1f}x real time")
+    return num_frames
+
+
+def parse_size(text):
+    width_text, _, height_text = text.lower().partition('x')
+    return int(width_text), int(height_text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render presentation-mode playback of a MIDI file to video frames, offline and in parallel.")
+    parser.add_argument('song', help="MIDI file to render")
+    parser.add_argument('output_dir', help="directory for the PNG sequence or raw frames")
+    parser.add_argument('--fps', type=int, default=DEFAULT_FPS)
+    parser.add_argument('--size', type=parse_size, default=DEFAULT_SIZE, help="frame size as WIDTHxHEIGHT")
+    parser.add_argument('--start', type=float, default=0.0, help="song time of the first frame, in seconds")
+    parser.add_argument('--duration', type=float, help="seconds to render (default: to the end of the song)")
+    parser.add_argument('--format', dest='output_format', choices=OUTPUT_FORMATS, default='png', help="png sequence or one frames.rgb file of raw RGB24 frames")
+    parser.add_argument('--pipe', help="encoder command reading raw RGB24 frames on stdin; {width}, {height} and {fps} are filled in, "
+                                       "e.g. \"ffmpeg -y -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - preview.mp4\"")
+    parser.add_argument('--jobs', type=int, help="worker processes (default: one per core)")
+    parser.add_argument('--chunk-frames', type=int, default=DEFAULT_CHUNK_FRAMES, help="frames per work item")
+    args = parser.parse_args(argv)
+    try: export(args.song, args.output_dir, args.fps, args.size, args.start, args.duration, args.output_format, args.pipe, args.jobs, args.chunk_frames)
+    except (OSError, MidiFileError, RuntimeError) as e: print(f"Export failed: {e}"); return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import cProfile
+import json
+import pstats
+import time
+from array import array
+
+import pygame
+
+DEFAULT_CAPACITY = 240  # Frames kept per stage: a few seconds at 60 fps
+FRAME_STAGE_NAME = 'frame'
+NOT_RECORDED = -1
+
+
+class FrameProfiler:
+    # Times named main-loop stages with perf_counter_ns into fixed-size ring buffers (one slot per frame), so
+    # profiling allocates nothing per frame. Stages are registered the first time they run.
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.stage_names = []; self._stage_slots = {}
+        self._starts = []; self._durations = []  # Per stage: start/duration ns, indexed by frame % capacity
+        self.frame_count = 0; self._frame_start_ns = 0
+        self._cprofile = None; self._cprofile_frames_left = 0; self._cprofile_path = None
+        self._stage(FRAME_STAGE_NAME)
+
+    def _stage(self, stage_name):
+        slot = self._stage_slots.get(stage_name)
+        if slot is None:
+            slot = self._stage_slots[stage_name] = len(self.stage_names); self.stage_names.append(stage_name)
+            self._starts.append(array('q', [0] * self.capacity)); self._durations.append(array('q', [NOT_RECORDED] * self.capacity))
+        return slot
+
+    def begin_frame(self):
+        frame_slot = self.frame_count % self.capacity
+        for durations in self._durations: durations[frame_slot] = NOT_RECORDED
+        if self._cprofile is not None: self._cprofile.enable()
+        self._frame_start_ns = time.perf_counter_ns()
+
+    def run_stage(self, stage_name, stage_func, *args):
+        # Drop-in for run_frame's run_stage hook
+        slot = self._stage_slots.get(stage_name)
+        if slot is None: slot = self._stage(stage_name)
+        start_ns = time.perf_counter_ns(); result = stage_func(*args); end_ns = time.perf_counter_ns()
+        frame_slot = self.frame_count % self.capacity
+        self._starts[slot][frame_slot] = start_ns; self._durations[slot][frame_slot] = end_ns - start_ns
+        return result
+
+    def end_frame(self):
+        end_ns = time.perf_counter_ns(); frame_slot = self.frame_count % self.capacity
+        self._starts[0][frame_slot] = self._frame_start_ns; self._durations[0][frame_slot] = end_ns - self._frame_start_ns
+        self.frame_count += 1
+        if self._cprofile is not None:
+            self._cprofile.disable(); self._cprofile_frames_left -= 1
+            if self._cprofile_frames_left <= 0: self._finish_cprofile()
+
+    def stage_stats(self):
+        # [(stage_name, mean_ms, max_ms)] over the frames in the ring, frame total first
+        stats = []
+        for stage_name, durations in zip(self.stage_names, self._durations):
+            samples = [ns for ns in durations if ns != NOT_RECORDED]
+            if samples: stats.append((stage_name, sum(samples) / len(samples) / 1e6, max(samples) / 1e6))
+        return stats
+
+    def _recorded_frames(self):
+        # Ring slots of the completed frames, oldest first; the slot of a frame in progress is left out
+        num_frames = min(self.frame_count, self.capacity - 1)
+        return [(self.frame_count - num_frames + i) % self.capacity for i in range(num_frames)]
+
+    def chrome_trace(self):
+        # Trace Event Format ("X" complete events, microseconds) for chrome://tracing or Perfetto
+        trace_events = []; frame_slots = self._recorded_frames()
+        if not frame_slots: return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+        origin_ns = self._starts[0][frame_slots[0]]
+        for slot, stage_name in enumerate(self.stage_names):
+            starts = self._starts[slot]; durations = self._durations[slot]; thread_id = 0 if slot == 0 else 1
+            for frame_slot in frame_slots:
+                if durations[frame_slot] != NOT_RECORDED:
+                    trace_events.append({'name': stage_name, 'cat': 'frame' if slot == 0 else 'stage', 'ph': 'X', 'pid': 0, 'tid': thread_id,
+                                         'ts': (starts[frame_slot] - origin_ns) / 1000.0, 'dur': durations[frame_slot] / 1000.0})
+        trace_events.sort(key=lambda trace_event: (trace_event['ts'], trace_event['tid']))
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w') as trace_file: json.dump(self.chrome_trace(), trace_file)
+        return path
+
+    def capture_cprofile(self, num_frames, path):
+        # Runs cProfile over the next num_frames frames (between begin_frame and end_frame) and writes pstats data to path.
+        if self._cprofile is not None: return False
+        self._cprofile = cProfile.Profile(); self._cprofile_frames_left = num_frames; self._cprofile_path = path
+        return True
+
+    @property
+    def capturing_cprofile(self):
+        return self._cprofile is not None
+
+    def _finish_cprofile(self):
+        profile = self._cprofile; self._cprofile = None
+        profile.dump_stats(self._cprofile_path)
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(15)
+        print(f"cProfile data written to {self._cprofile_path}")
+
+    def render_overlay(self, font, text_color, background_rgba):
+        # One surface with a row per stage: name, rolling mean and worst case over the ring (numbers right-aligned).
+        rows = [('stage', 'avg ms', 'max ms')] + [(name, f"{mean_ms:.2f}", f"{max_ms:.2f}") for name, mean_ms, max_ms in self.stage_stats()]
+        cells = [[font.render(text, True, text_color) for text in row] for row in rows]
+        column_widths = [max(row_cells[column].get_width() for row_cells in cells) for column in range(3)]
+        line_height = font.get_linesize(); padding = 6; column_gap = 12
+        overlay = pygame.Surface((sum(column_widths) + 2 * column_gap + 2 * padding, len(cells) * line_height + 2 * padding), pygame.SRCALPHA)
+        overlay.fill(background_rgba)
+        for i, row_cells in enumerate(cells):
+            y = padding + i * line_height; column_right = padding + column_widths[0]
+            overlay.blit(row_cells[0], (padding, y))
+            for column in (1, 2):
+                column_right += column_gap + column_widths[column]; overlay.blit(row_cells[column], (column_right - row_cells[column].get_width(), y))
+        return overlay
@@ -0,0 +1,40 @@
+import pygame
+
+DEFAULT_TARGET_FPS = 60
+DEFAULT_IDLE_FPS = 10  # While idle the starfield still twinkles, just at a slow refresh
+
+
+def parse_frame_rate(value):
+    # 'vsync' -> (0, True), 'uncapped' or '0' -> (0, False), a number -> (fps, False)
+    value = str(value).strip().lower()
+    if value == 'vsync': return 0, True
+    if value in ('uncapped', 'unlimited', ''): return 0, False
+    return max(0, int(float(value))), False
+
+
+class FrameScheduler:
+    # Paces the main loop. While something is animating frames run at target_fps (0 = uncapped, e.g. when vsync
+    # already limits presentation); while idle the loop blocks on the event queue, so a stopped app sleeps until
+    # input arrives or the slow idle refresh is due.
+
+    def __init__(self, target_fps=DEFAULT_TARGET_FPS, idle_fps=DEFAULT_IDLE_FPS):
+        self.target_fps = target_fps
+        self.idle_timeout_ms = max(1, int(1000 / idle_fps)) if idle_fps > 0 else 0
+        self.clock = pygame.time.Clock()
+        self.last_frame_ms = pygame.time.get_ticks(); self.dt_ms = 0
+
+    def begin_frame(self, idle):
+        # Returns this frame's events; dt_ms is the real time since the previous frame began, idle waits included.
+        if idle and self.idle_timeout_ms:
+            first_event = pygame.event.wait(self.idle_timeout_ms)
+            events = ([first_event] if first_event.type != pygame.NOEVENT else []) + pygame.event.get()
+        else: events = pygame.event.get()
+        now_ms = pygame.time.get_ticks(); self.dt_ms = now_ms - self.last_frame_ms; self.last_frame_ms = now_ms
+        return events
+
+    def end_frame(self, idle):
+        if idle: self.clock.tick()  # The idle wait already throttled this frame
+        else: self.clock.tick(self.target_fps)
+
+    def get_fps(self):
+        return self.clock.get_fps()
@@ -0,0 +1,72 @@
+from array import array
+
+import pygame
+
+WHITE_KEY_SEMITONES = (0, 2, 4, 5, 7, 9, 11)
+KEY_OFF_KEYBOARD = 0; KEY_WHITE = 1; KEY_BLACK = 2  # key_types codes
+A0_MIDI_NOTE = 21; C8_MIDI_NOTE = 108  # Range of a full 88-key piano
+NUM_MIDI_NOTES = 128
+
+
+def is_white_note(midi_note):
+    return midi_note % 12 in WHITE_KEY_SEMITONES
+
+
+def _widen_to_white_keys(first_midi_note, last_midi_note):
+    # A keyboard starts and ends on white keys; black endpoints are widened by a semitone.
+    first_midi_note = max(0, min(first_midi_note, last_midi_note)); last_midi_note = min(NUM_MIDI_NOTES - 1, max(first_midi_note, last_midi_note))
+    if not is_white_note(first_midi_note): first_midi_note -= 1
+    if not is_white_note(last_midi_note): last_midi_note += 1
+    return first_midi_note, last_midi_note
+
+
+def fit_key_range(pitches, always_show=(60, 83)):
+    # Smallest whole-octave range (C..B) covering the song's pitches and the always_show notes, clamped to A0-C8.
+    pitches = set(pitches); pitches.update(always_show)
+    first_midi_note = min(pitches) // 12 * 12; last_midi_note = max(pitches) // 12 * 12 + 11
+    return max(A0_MIDI_NOTE, first_midi_note), min(C8_MIDI_NOTE, last_midi_note)
+
+
+def parse_key_range(text):
+    # 'auto' -> None (fit to each song), '88' -> A0-C8, 'first-last' in MIDI note numbers -> (first, last)
+    text = str(text).strip().lower()
+    if text in ('', 'auto'): return None
+    if text in ('88', 'full'): return A0_MIDI_NOTE, C8_MIDI_NOTE
+    first_text, _, last_text = text.partition('-')
+    return _widen_to_white_keys(int(first_text), int(last_text or first_text))
+
+
+class KeyboardGeometry:
+    # One keyboard layout: key rects in draw order plus 128-entry tables indexed by MIDI note, so every per-note
+    # lookup (key type/index, x centre, key rect, piano-roll note width) is a single indexed read.
+
+    def __init__(self, first_midi_note, last_midi_note, area_rect, black_key_width_ratio=0.6, black_key_height_ratio=0.6, white_note_width_ratio=0.8, black_note_width_ratio=0.9):
+        self.first_midi_note, self.last_midi_note = _widen_to_white_keys(first_midi_note, last_midi_note)
+        self.area_rect = pygame.Rect(area_rect)
+        white_notes = [n for n in range(self.first_midi_note, self.last_midi_note + 1) if is_white_note(n)]
+        self.num_white_keys = len(white_notes)
+        self.white_key_width = max(1, self.area_rect.width // self.num_white_keys); self.white_key_height = max(1, self.area_rect.height)
+        self.black_key_width = int(self.white_key_width * black_key_width_ratio); self.black_key_height = int(self.white_key_height * black_key_height_ratio)
+        self.key_types = array('b', bytes(NUM_MIDI_NOTES)); self.key_indices = array('h', [-1] * NUM_MIDI_NOTES)
+        self.x_centers = array('d', bytes(8 * NUM_MIDI_NOTES)); self.note_widths = array('d', bytes(8 * NUM_MIDI_NOTES))
+        self.key_rects = [None] * NUM_MIDI_NOTES
+        self.white_key_rects = []; self.black_key_rects = []
+        left = self.area_rect.left; top = self.area_rect.top
+        for midi_note in range(self.first_midi_note, self.last_midi_note + 1):
+            if is_white_note(midi_note):
+                index = len(self.white_key_rects)
+                rect = pygame.Rect(left + index * self.white_key_width, top, self.white_key_width, self.white_key_height)
+                self.white_key_rects.append(rect)
+                self.key_types[midi_note] = KEY_WHITE; self.x_centers[midi_note] = rect.left + self.white_key_width / 2.0
+                self.note_widths[midi_note] = self.white_key_width * white_note_width_ratio
+            else:  # Black keys sit on the boundary after the white key below them
+                index = len(self.black_key_rects); boundary_x = left + len(self.white_key_rects) * self.white_key_width
+                rect = pygame.Rect(boundary_x - self.black_key_width // 2, top, self.black_key_width, self.black_key_height)
+                self.black_key_rects.append(rect)
+                self.key_types[midi_note] = KEY_BLACK; self.x_centers[midi_note] = boundary_x
+                self.note_widths[midi_note] = self.black_key_width * black_note_width_ratio
+            self.key_indices[midi_note] = index; self.key_rects[midi_note] = rect
+        self.num_black_keys = len(self.black_key_rects)
+
+    def contains(self, midi_note):
+        return self.key_types[midi_note] != KEY_OFF_KEYBOARD
@@ -0,0 +1,70 @@
+import pygame
+
+TRANSPARENT_KEY_COLOR = (255, 0, 255)
+
+
+class KeyboardRenderer:
+    # Keeps the keyboard as one composed layer surface. Idle/pressed looks of each key are pre-rendered once,
+    # and only keys whose pressed state changed are recomposed into the layer between frames.
+
+    def __init__(self, geometry, shadow_offset, draw_white_key, draw_black_key):
+        self.draw_white_key = draw_white_key; self.draw_black_key = draw_black_key
+        self.white_key_rects = []; self.black_key_rects = []
+        self.build(geometry, shadow_offset)
+
+    def build(self, geometry, shadow_offset):
+        # (Re)takes key rects from a KeyboardGeometry and re-renders sprites; only needed when the layout changes.
+        self.shadow_offset = shadow_offset
+        self.white_key_rects[:] = geometry.white_key_rects; self.black_key_rects[:] = geometry.black_key_rects
+        white_key_w = geometry.white_key_width; white_key_h = geometry.white_key_height; black_key_w = geometry.black_key_width; black_key_h = geometry.black_key_height
+        area = geometry.area_rect
+        self.layer_rect = pygame.Rect(area.left, area.top, geometry.num_white_keys * white_key_w + shadow_offset, white_key_h + shadow_offset)
+        self.white_sprites = (self._render_key_sprite(white_key_w, white_key_h, self.draw_white_key, False), self._render_key_sprite(white_key_w, white_key_h, self.draw_white_key, True))
+        self.black_sprites = (self._render_key_sprite(black_key_w, black_key_h, self.draw_black_key, False), self._render_key_sprite(black_key_w, black_key_h, self.draw_black_key, True))
+        self.layer = pygame.Surface(self.layer_rect.size).convert() if pygame.display.get_surface() else pygame.Surface(self.layer_rect.size)
+        self.layer.set_colorkey(TRANSPARENT_KEY_COLOR)
+        self.drawn_white_states = [None] * len(self.white_key_rects); self.drawn_black_states = [None] * len(self.black_key_rects)
+
+    def _render_key_sprite(self, key_w, key_h, draw_key_func, is_pressed):
+        sprite = pygame.Surface((key_w + self.shadow_offset, key_h + self.shadow_offset))
+        sprite.fill(TRANSPARENT_KEY_COLOR); sprite.set_colorkey(TRANSPARENT_KEY_COLOR)
+        draw_key_func(sprite, pygame.Rect(0, 0, key_w, key_h), self.shadow_offset, is_pressed)
+        return sprite
+
+    def _key_area(self, key_rect):
+        # Key rect plus its shadow, in layer coordinates
+        return pygame.Rect(key_rect.left - self.layer_rect.left, key_rect.top - self.layer_rect.top, key_rect.width + self.shadow_offset, key_rect.height + self.shadow_offset)
+
+    def _compose_region(self, region, white_states, black_states):
+        # Redraws every key overlapping region, in the original paint order (white keys then black keys), clipped to it.
+        layer = self.layer; layer.set_clip(region); layer.fill(TRANSPARENT_KEY_COLOR, region)
+        for rects, states, sprites in ((self.white_key_rects, white_states, self.white_sprites), (self.black_key_rects, black_states, self.black_sprites)):
+            for i, key_rect in enumerate(rects):
+                key_area = self._key_area(key_rect)
+                if key_area.colliderect(region): layer.blit(sprites[1 if states[i] else 0], key_area.topleft)
+        layer.set_clip(None)
+
+    def update(self, white_states, black_states):
+        # Recomposes changed keys into the layer; returns the changed areas in screen coordinates.
+        dirty_regions = []
+        for rects, states, drawn_states in ((self.white_key_rects, white_states, self.drawn_white_states), (self.black_key_rects, black_states, self.drawn_black_states)):
+            for i, key_rect in enumerate(rects):
+                if drawn_states[i] != states[i]: dirty_regions.append(self._key_area(key_rect)); drawn_states[i] = states[i]
+        if not dirty_regions: return []
+        if len(dirty_regions) > 8: dirty_regions = [dirty_regions[0].unionall(dirty_regions[1:])]  # Many changes: one recompose beats many overlapping ones
+        for region in dirty_regions: self._compose_region(region, white_states, black_states)
+        return [region.move(self.layer_rect.left, self.layer_rect.top) for region in dirty_regions]
+
+    def blit_region(self, surface, rect):
+        # Blits the part of the layer under rect (screen coordinates)
+        area = rect.clip(self.layer_rect)
+        if area.width and area.height: surface.blit(self.layer, area.topleft, area.move(-self.layer_rect.left, -self.layer_rect.top))
+
+    def draw(self, surface, white_states, black_states, repaint_rects=None):
+        # Blits the layer only under the changed keys and repaint_rects (the other areas presented this frame);
+        # repaint_rects None blits all of it. Returns the changed areas.
+        dirty_rects = self.update(white_states, black_states)
+        if repaint_rects is None: surface.blit(self.layer, self.layer_rect.topleft); return dirty_rects
+        for rect in dirty_rects: self.blit_region(surface, rect)
+        for rect in repaint_rects: self.blit_region(surface, rect)
+        return dirty_rects
@@ -0,0 +1,22 @@
+import pygame
+
+
+class Layout:
+    # Every size-dependent rect and scale for one window size. It is rebuilt only when the window size changes;
+    # per-frame code reads these attributes instead of deriving positions from the window size.
+
+    def __init__(self, width, height, keyboard_height_ratio=0.25, control_panel_height=150, piano_roll_top_y=50, piano_roll_gap=10, piano_roll_seconds_on_screen=5.0):
+        self.width = width; self.height = height
+        self.window_rect = pygame.Rect(0, 0, width, height)
+        self.keyboard_height = int(height * keyboard_height_ratio)
+        self.keyboard_rect = pygame.Rect(0, height - self.keyboard_height, width, self.keyboard_height)
+        self.control_panel_rect = pygame.Rect(0, height - control_panel_height, width, control_panel_height)
+        self.stars_max_y = height - control_panel_height if height > control_panel_height else height
+        self.piano_roll_top_y = piano_roll_top_y; self.piano_roll_bottom_y = height - self.keyboard_height - piano_roll_gap
+        if self.piano_roll_bottom_y > self.piano_roll_top_y and piano_roll_seconds_on_screen > 0:
+            self.pixels_per_second = (self.piano_roll_bottom_y - self.piano_roll_top_y) / piano_roll_seconds_on_screen
+        else: self.pixels_per_second = 0  # Window too short for a piano roll
+
+    @property
+    def size(self):
+        return self.width, self.height
@@ -1,19 +1,69 @@
+import time
+STARTUP_START = time.perf_counter()  # Time-to-first-frame is measured from here, before pygame is imported
 import pygame
 import sys
 import os
-import random
+import json
 import math
 
+from midi_file import load_midi_file, MidiFileError
+from note_store import NoteStore
+from keyboard_renderer import KeyboardRenderer
+from keyboard_geometry import KeyboardGeometry, KEY_WHITE, KEY_BLACK, fit_key_range, parse_key_range
+from surface_cache import SurfaceCache
+from starfield import Starfield, STAR_DENSITY_MODES
+from effects import ShockwavePool
+from synth import Synth
+from timeline import EventTimeline, ChordSteps, compile_note_events, DEFAULT_CHORD_TOLERANCE_SEC
+from frame_scheduler import FrameScheduler, parse_frame_rate
+from layout import Layout
+from recorder import PerformanceRecorder
+from scoring import score_performance_log, format_score_summary
+from frame_profiler import FrameProfiler
+from song_library import SongLibrary, LibrarySong
+from asset_loader import AssetLoader
+from piano_roll_tiles import DEFAULT_BUILD_BUDGET_MS, PianoRollTiles
+from midi_input import open_midi_input, MidiInputError
+
+# Audio buffer size in sample frames; smaller values lower key-to-sound latency at the cost of more audio callbacks
+AUDIO_BUFFER_SIZE = int(os.environ.get('PIANO_AUDIO_BUFFER', 512))
+# Frame rate while animating: a number, 'uncapped', or 'vsync' (present in step with the display refresh)
+TARGET_FPS, USE_VSYNC = parse_frame_rate(os.environ.get('PIANO_FPS', 60))
+
 # Initialize Pygame
+pygame.mixer.pre_init(buffer=AUDIO_BUFFER_SIZE)
 pygame.init()
 pygame.mixer.init()
 
-# Define window dimensions
+# Define window dimensions (initial windowed size; the window is resizable and all size-dependent positions live in `layout`)
 WINDOW_WIDTH = 1200
 WINDOW_HEIGHT = 800
+START_FULLSCREEN = os.environ.get('PIANO_FULLSCREEN', '0') not in ('', '0')
 
 # Create the screen surface
-screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+def open_window(size, fullscreen):
+    # Windowed mode is resizable; fullscreen uses the desktop resolution. Vsync needs a renderer-backed (SCALED) window,
+    # which keeps its logical size and scales to the window instead.
+    flags = pygame.FULLSCREEN if fullscreen else pygame.RESIZABLE
+    if USE_VSYNC:
+        try: return pygame.display.set_mode(size, flags | pygame.SCALED, vsync=1)
+        except pygame.error as e: print(f"Vsync is not available ({e}); running uncapped.")
+    return pygame.display.set_mode((0, 0) if fullscreen else size, flags)
+is_fullscreen = START_FULLSCREEN
+screen = open_window((WINDOW_WIDTH, WINDOW_HEIGHT), is_fullscreen)
+
+# Startup timing: milliseconds from STARTUP_START to the window, the first presented frame and all background assets
+# loaded. Printed once complete; PIANO_STARTUP_LOG appends them as a JSON line for tracking across builds.
+STARTUP_LOG_PATH = os.environ.get('PIANO_STARTUP_LOG')
+startup_metrics = {}
+def note_startup(stage):
+    if stage in startup_metrics: return
+    startup_metrics[stage] = round((time.perf_counter() - STARTUP_START) * 1000.0, 1)
+    if 'first_frame_ms' in startup_metrics and 'assets_ready_ms' in startup_metrics:
+        print("Startup: " + ", ".join(f"{name[:-3].replace('_', ' ')} {ms:.0f} ms" for name, ms in startup_metrics.items()))
+        if STARTUP_LOG_PATH:
+            with open(STARTUP_LOG_PATH, 'a') as startup_log: startup_log.write(json.dumps(startup_metrics) + "\n")
+note_startup('window_ms')
 
 # Set window title
 pygame.display.set_caption("Piano App")
@@ -39,22 +89,28 @@ STAR_COLORS = [
 BACKGROUND_COLOR = DARK_BACKGROUND_COLOR
 
 # Keyboard Parameters
-OCTAVES = 2
-NUM_WHITE_KEYS = 7 * OCTAVES
+# Key range: 'auto' fits each loaded song (at most A0-C8), '88' is a full piano, 'first-last' are MIDI note numbers
+KEYBOARD_RANGE = parse_key_range(os.environ.get('PIANO_KEYBOARD_RANGE', 'auto'))
+PC_KEYS_START_MIDI_NOTE = 60  # The computer keyboard always plays the two octaves from middle C
 KEYBOARD_HEIGHT_RATIO = 0.25
-keyboard_height = int(WINDOW_HEIGHT * KEYBOARD_HEIGHT_RATIO)
-white_key_width = WINDOW_WIDTH // NUM_WHITE_KEYS
-white_key_height = keyboard_height
-black_key_width = int(white_key_width * 0.6)
-black_key_height = int(white_key_height * 0.6)
 SHADOW_OFFSET = 3
-
-KEYBOARD_RENDER_AREA_RECT = pygame.Rect(0, WINDOW_HEIGHT - keyboard_height, WINDOW_WIDTH, keyboard_height)
+CONTROL_PANEL_HEIGHT = 150
+PIANO_ROLL_SECONDS_ON_SCREEN = 5.0
+PIANO_ROLL_TOP_Y = 50
+PIANO_ROLL_KEYBOARD_GAP = 10
+def make_layout(size):
+    new_layout = Layout(size[0], size[1], KEYBOARD_HEIGHT_RATIO, CONTROL_PANEL_HEIGHT, PIANO_ROLL_TOP_Y, PIANO_ROLL_KEYBOARD_GAP, PIANO_ROLL_SECONDS_ON_SCREEN)
+    if new_layout.pixels_per_second <= 0: print("Warning: the window is too short to show the piano roll.")
+    return new_layout
+layout = make_layout(screen.get_size())
+NOTE_RECT_WIDTH_WHITE_RATIO = 0.8
+NOTE_RECT_WIDTH_BLACK_RATIO = 0.9
+def make_keyboard_geometry(first_midi_note, last_midi_note):
+    return KeyboardGeometry(first_midi_note, last_midi_note, layout.keyboard_rect, white_note_width_ratio=NOTE_RECT_WIDTH_WHITE_RATIO, black_note_width_ratio=NOTE_RECT_WIDTH_BLACK_RATIO)
+keyboard_geometry = make_keyboard_geometry(*(KEYBOARD_RANGE or (PC_KEYS_START_MIDI_NOTE, PC_KEYS_START_MIDI_NOTE + 23)))
 
 
 # --- Control Panel Constants ---
-CONTROL_PANEL_HEIGHT = 150
-CONTROL_PANEL_Y_START = WINDOW_HEIGHT - CONTROL_PANEL_HEIGHT
 CONTROL_PANEL_BG_COLOR = (30, 30, 30)
 BUTTON_TEXT_COLOR = (230, 230, 230)
 BUTTON_BASE_COLOR = (80, 80, 80)
@@ -82,18 +138,15 @@ try:
 except Exception as e:
     print(f"Could not load default font for control panel, using fallback pygame.font.SysFont: {e}")
     control_panel_font = pygame.font.SysFont(pygame.font.get_default_font(), 28)
+ui_surface_cache = SurfaceCache()  # Rendered captions and translucent fills, reused while the text/colour/size is unchanged
+FEEDBACK_FLASH_ALPHA = 128; CONFIRM_OVERLAY_RGBA = (0, 0, 0, 180)
 
 control_panel_buttons = []
 button_actions = ['action_start', 'action_pause', 'action_stop', 'action_toggle_mode']
 button_texts = ["Start", "Pause", "Stop", "Mode: Learning"]
-num_buttons = len(button_actions)
-total_buttons_width_layout = num_buttons * BUTTON_WIDTH + (num_buttons - 1) * BUTTON_MARGIN
-start_x_layout_buttons = (WINDOW_WIDTH - total_buttons_width_layout) // 2
 
 for i, action in enumerate(button_actions):
-    button_x = start_x_layout_buttons + i * (BUTTON_WIDTH + BUTTON_MARGIN)
-    button_y_placeholder = CONTROL_PANEL_Y_START + CONTROL_PANEL_HEIGHT - BUTTON_HEIGHT - padding
-    btn_rect = pygame.Rect(button_x, button_y_placeholder, BUTTON_WIDTH, BUTTON_HEIGHT)
+    btn_rect = pygame.Rect(0, 0, BUTTON_WIDTH, BUTTON_HEIGHT)  # Positioned by layout_control_panel
     control_panel_buttons.append({
         'rect': btn_rect, 'text': button_texts[i], 'action_id': action,
         'base_color': BUTTON_BASE_COLOR, 'hover_color': BUTTON_HOVER_COLOR,
@@ -104,7 +157,7 @@ tempo_slider_props = {
     'label': "Tempo", 'value_range': (0.5, 2.0),
     'current_value_func': lambda: tempo_multiplier, 'setter_func': None,
     'rect': None, 'knob_rect': None,
-    'text_label_func': lambda: f"Tempo: {int(base_bpm * tempo_multiplier)} BPM"
+    'text_label_func': lambda: f"Tempo: {round(song_notes.tempo_map.bpm_at(current_song_time_seconds) * tempo_multiplier)} BPM"
 }
 volume_slider_props = {
     'label': "Volume", 'value_range': (0.0, 1.0),
@@ -117,200 +170,224 @@ progress_bar_props = {
     'rect': None, 'fill_color': PROGRESS_BAR_FILL_COLOR,
     'track_color': PROGRESS_BAR_TRACK_COLOR
 }
+control_panel_background = None
 
-NUM_STARS = 100
-stars = []
-max_y_for_stars = WINDOW_HEIGHT - CONTROL_PANEL_HEIGHT
-if max_y_for_stars <=0: max_y_for_stars = WINDOW_HEIGHT
-for _ in range(NUM_STARS):
-    stars.append({'x': random.randint(0, WINDOW_WIDTH), 'y': random.randint(0, max_y_for_stars),
-                  'radius': random.uniform(0.5, 1.5),'base_color_tuple': random.choice(STAR_COLORS),
-                  'current_alpha': 0.0, 'alpha_cycle_duration': random.uniform(2000, 5000),
-                  'alpha_cycle_time': random.uniform(0, 5000)})
+# Star density mode: 'classic' (100 stars), 'dense' or 'galaxy' (20k+), overridable with PIANO_STAR_DENSITY
+STAR_DENSITY = os.environ.get('PIANO_STAR_DENSITY', 'classic')
+NUM_STARS = STAR_DENSITY_MODES.get(STAR_DENSITY, STAR_DENSITY_MODES['classic'])
+stars = Starfield(NUM_STARS, layout.width, layout.stars_max_y, STAR_COLORS)
 
-active_shockwaves = []
-# Each shockwave: {'center_x', 'center_y', 'start_time_ms', 'max_radius', 'duration_ms', 'color'}
+SHOCKWAVE_POOL_CAPACITY = 256; SHOCKWAVE_DURATION_MS = 2000
+shockwave_pool = ShockwavePool(SHOCKWAVE_POOL_CAPACITY, SHOCKWAVE_DURATION_MS, keyboard_geometry.white_key_width * 2.0, ACCENT_COLOR_CYAN)
 
-last_drawn_white_key_rects = []
-last_drawn_black_key_rects = []
 
-PIANO_ROLL_LOOKAHEAD_SECONDS = 5.0
-PIANO_ROLL_SECONDS_ON_SCREEN = 5.0
-PIANO_ROLL_TOP_Y = 50
-PIANO_ROLL_BOTTOM_Y = WINDOW_HEIGHT - keyboard_height - 10
 NOTE_RECT_COLOR = ACCENT_COLOR_CYAN
 NOTE_RECT_BORDER_COLOR = (100, 220, 220)
-NOTE_RECT_WIDTH_WHITE_RATIO = 0.8
-NOTE_RECT_WIDTH_BLACK_RATIO = 0.9
-if PIANO_ROLL_BOTTOM_Y > PIANO_ROLL_TOP_Y and PIANO_ROLL_SECONDS_ON_SCREEN > 0:
-    pixels_per_second = (PIANO_ROLL_BOTTOM_Y - PIANO_ROLL_TOP_Y) / PIANO_ROLL_SECONDS_ON_SCREEN
-else:
-    pixels_per_second = 0; print("Warning: Piano roll Y coordinates or seconds_on_screen are configured incorrectly.")
-NUM_BLACK_KEYS = 5 * OCTAVES
-white_key_pressed_states = [False] * NUM_WHITE_KEYS
-black_key_pressed_states = [False] * NUM_BLACK_KEYS
-SOUNDS_DIR = "sounds"; PLACEHOLDER_SOUND = os.path.join(SOUNDS_DIR, "placeholder.wav")
+white_key_pressed_states = [False] * keyboard_geometry.num_white_keys
+black_key_pressed_states = [False] * keyboard_geometry.num_black_keys
+# Slow-to-load assets (feedback sounds, tone buffers, songs) load on a background thread after the first frame is
+# drawn; each finished job wakes the main loop with an ASSET_READY_EVENT and is applied there.
+ASSET_READY_EVENT = pygame.event.custom_type()
+asset_loader = AssetLoader(on_ready=lambda job_id: pygame.event.post(pygame.event.Event(ASSET_READY_EVENT, job_id=job_id)))
+SOUNDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sounds")  # Next to the program, whatever the working directory
 CORRECT_SOUND_FILE = os.path.join(SOUNDS_DIR, "correct.wav"); INCORRECT_SOUND_FILE = os.path.join(SOUNDS_DIR, "incorrect.wav")
 correct_sound = None; incorrect_sound = None
-try: correct_sound = pygame.mixer.Sound(CORRECT_SOUND_FILE)
-except pygame.error as e: print(f"Could not load correct sound {CORRECT_SOUND_FILE}: {e}.")
-try: incorrect_sound = pygame.mixer.Sound(INCORRECT_SOUND_FILE)
-except pygame.error as e: print(f"Could not load incorrect sound {INCORRECT_SOUND_FILE}: {e}.")
-if not os.path.exists(SOUNDS_DIR): os.makedirs(SOUNDS_DIR)
-if not os.path.exists(CORRECT_SOUND_FILE): open(CORRECT_SOUND_FILE, 'w').close()
-if not os.path.exists(INCORRECT_SOUND_FILE): open(INCORRECT_SOUND_FILE, 'w').close()
-key_map = { pygame.K_a: {'type': 'white', 'index': 0, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_s: {'type': 'white', 'index': 1, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_d: {'type': 'white', 'index': 2, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_f: {'type': 'white', 'index': 3, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_g: {'type': 'white', 'index': 4, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_h: {'type': 'white', 'index': 5, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_j: {'type': 'white', 'index': 6, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_k: {'type': 'white', 'index': 7, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_l: {'type': 'white', 'index': 8, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_SEMICOLON: {'type': 'white', 'index': 9, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_w: {'type': 'black', 'index': 0, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_e: {'type': 'black', 'index': 1, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_t: {'type': 'black', 'index': 2, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_y: {'type': 'black', 'index': 3, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_u: {'type': 'black', 'index': 4, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_o: {'type': 'black', 'index': 5, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}, pygame.K_p: {'type': 'black', 'index': 6, 'sound_file': PLACEHOLDER_SOUND, 'sound_obj': None}}
-for key_code, data in key_map.items():
-    try: data['sound_obj'] = pygame.mixer.Sound(data['sound_file'])
-    except pygame.error as e: print(f"Could not load sound for key {pygame.key.name(key_code)}: {data['sound_file']} - {e}")
-midi_to_sound_map = {}; KEYBOARD_START_MIDI_NOTE = 60
+def load_feedback_sound(path):
+    try: return pygame.mixer.Sound(path)
+    except (pygame.error, FileNotFoundError) as e: print(f"Could not load feedback sound {path}: {e}."); return None
+feedback_sounds_job = asset_loader.submit('feedback sounds', lambda: (load_feedback_sound(CORRECT_SOUND_FILE), load_feedback_sound(INCORRECT_SOUND_FILE)))
+key_map = { pygame.K_a: {'type': 'white', 'index': 0}, pygame.K_s: {'type': 'white', 'index': 1}, pygame.K_d: {'type': 'white', 'index': 2}, pygame.K_f: {'type': 'white', 'index': 3}, pygame.K_g: {'type': 'white', 'index': 4}, pygame.K_h: {'type': 'white', 'index': 5}, pygame.K_j: {'type': 'white', 'index': 6}, pygame.K_k: {'type': 'white', 'index': 7}, pygame.K_l: {'type': 'white', 'index': 8}, pygame.K_SEMICOLON: {'type': 'white', 'index': 9}, pygame.K_w: {'type': 'black', 'index': 0}, pygame.K_e: {'type': 'black', 'index': 1}, pygame.K_t: {'type': 'black', 'index': 2}, pygame.K_y: {'type': 'black', 'index': 3}, pygame.K_u: {'type': 'black', 'index': 4}, pygame.K_o: {'type': 'black', 'index': 5}, pygame.K_p: {'type': 'black', 'index': 6}}
 WHITE_KEY_MIDI_OFFSETS = [0, 2, 4, 5, 7, 9, 11]; BLACK_KEY_MIDI_OFFSETS = [1, 3, 6, 8, 10]
-for pc_key, data in key_map.items():
-    key_type = data['type']; key_index_on_keyboard = data['index']; sound_obj = data['sound_obj']
-    if sound_obj:
-        midi_note = -1
-        if key_type == 'white': octave_num = (KEYBOARD_START_MIDI_NOTE // 12) + (key_index_on_keyboard // 7); offset_in_octave = WHITE_KEY_MIDI_OFFSETS[key_index_on_keyboard % 7]; midi_note = octave_num * 12 + offset_in_octave
-        elif key_type == 'black': octave_num = (KEYBOARD_START_MIDI_NOTE // 12) + (key_index_on_keyboard // 5); offset_in_octave = BLACK_KEY_MIDI_OFFSETS[key_index_on_keyboard % 5]; midi_note = octave_num * 12 + offset_in_octave
-        if midi_note != -1 and midi_note not in midi_to_sound_map: midi_to_sound_map[midi_note] = sound_obj
 pc_key_to_midi_map = {}
 for pc_key_code, data in key_map.items():
     key_type = data['type']; key_index_in_type = data['index']; midi_note = -1
-    if key_type == 'white': octave_num_for_key = (KEYBOARD_START_MIDI_NOTE // 12) + (key_index_in_type // 7); offset_in_octave_for_key = WHITE_KEY_MIDI_OFFSETS[key_index_in_type % 7]; midi_note = octave_num_for_key * 12 + offset_in_octave_for_key
-    elif key_type == 'black': octave_num_for_key = (KEYBOARD_START_MIDI_NOTE // 12) + (key_index_in_type // 5); offset_in_octave_for_key = BLACK_KEY_MIDI_OFFSETS[key_index_in_type % 5]; midi_note = octave_num_for_key * 12 + offset_in_octave_for_key
+    if key_type == 'white': octave_num_for_key = (PC_KEYS_START_MIDI_NOTE // 12) + (key_index_in_type // 7); offset_in_octave_for_key = WHITE_KEY_MIDI_OFFSETS[key_index_in_type % 7]; midi_note = octave_num_for_key * 12 + offset_in_octave_for_key
+    elif key_type == 'black': octave_num_for_key = (PC_KEYS_START_MIDI_NOTE // 12) + (key_index_in_type // 5); offset_in_octave_for_key = BLACK_KEY_MIDI_OFFSETS[key_index_in_type % 5]; midi_note = octave_num_for_key * 12 + offset_in_octave_for_key
     if midi_note != -1: pc_key_to_midi_map[pc_key_code] = midi_note
-song_data = [{'midi_note': 67, 'start_time': 0.0, 'duration': 0.4, 'played': False}, {'midi_note': 64, 'start_time': 0.5, 'duration': 0.4, 'played': False}, {'midi_note': 60, 'start_time': 1.0, 'duration': 0.4, 'played': False},{'midi_note': 67, 'start_time': 1.5, 'duration': 0.4, 'played': False},{'midi_note': 69, 'start_time': 2.0, 'duration': 0.4, 'played': False},{'midi_note': 67, 'start_time': 2.5, 'duration': 0.4, 'played': False},{'midi_note': 64, 'start_time': 3.0, 'duration': 0.4, 'played': False},{'midi_note': 60, 'start_time': 3.5, 'duration': 0.4, 'played': False},{'midi_note': 67, 'start_time': 4.0, 'duration': 0.4, 'played': False}]
+# All note playback (keys and songs) goes through one polyphonic software synth mixed into a single stream
+synth = Synth(buffer_size=AUDIO_BUFFER_SIZE)
+if not synth.start(): print("Could not open an audio output for the synth; notes will be silent.")
+asset_loader.submit('key tones', synth.prerender, list(pc_key_to_midi_map.values()))  # Keys pressed before this finishes render their tone on demand
+DEMO_SONG_DATA = [{'midi_note': 67, 'start_time': 0.0, 'duration': 0.4, 'played': False}, {'midi_note': 64, 'start_time': 0.5, 'duration': 0.4, 'played': False}, {'midi_note': 60, 'start_time': 1.0, 'duration': 0.4, 'played': False},{'midi_note': 67, 'start_time': 1.5, 'duration': 0.4, 'played': False},{'midi_note': 69, 'start_time': 2.0, 'duration': 0.4, 'played': False},{'midi_note': 67, 'start_time': 2.5, 'duration': 0.4, 'played': False},{'midi_note': 64, 'start_time': 3.0, 'duration': 0.4, 'played': False},{'midi_note': 60, 'start_time': 3.5, 'duration': 0.4, 'played': False},{'midi_note': 67, 'start_time': 4.0, 'duration': 0.4, 'played': False}]
+def load_song(path=None):
+    if path:
+        try: return load_midi_file(path)
+        except (OSError, MidiFileError) as e: print(f"Could not load MIDI file {path}: {e}. Using the demo song.")
+    return NoteStore.from_dicts(DEMO_SONG_DATA)
+song_notes = load_song()
 total_song_duration_seconds = 0.0
-def get_total_song_duration(notes_list):
-    if not notes_list: return 0.0
-    max_end_time = 0.0
-    for note in notes_list: note_end_time = note.get('start_time', 0) + note.get('duration', 0); max_end_time = max(max_end_time, note_end_time)
-    return max_end_time
-total_song_duration_seconds = get_total_song_duration(song_data)
+def get_total_song_duration(note_store):
+    return note_store.total_duration if note_store is not None else 0.0
+total_song_duration_seconds = get_total_song_duration(song_notes)
 APP_MODES = {'LEARNING': 0, 'PRESENTATION': 1}; current_mode = APP_MODES['LEARNING']
-learning_mode_state = {'paused_at_time': None, 'notes_at_pause': [], 'correctly_pressed_midi_in_pause': set()}
+CHORD_TOLERANCE_SECONDS = DEFAULT_CHORD_TOLERANCE_SEC
+learning_mode_state = {'paused_at_time': None, 'chord_cursor': 0, 'notes_at_pause': range(0), 'expected_midi_in_pause': frozenset(), 'correctly_pressed_midi_in_pause': set()}
 feedback_flash_info = {'key_midi': None, 'color': None, 'end_time_ms': 0}
-base_bpm = 120.0; tempo_multiplier = 1.0; global_volume = 1.0
+tempo_multiplier = 1.0; global_volume = 1.0
 dragging_tempo_slider = False; dragging_volume_slider = False
 song_playback_status = 'STOPPED'; mode_switch_confirm_active = False; target_mode_on_confirm = None; time_paused_at_ticks = 0
-current_song_time_seconds = 0.0; song_time_at_last_event = 0.0; real_ticks_at_last_event = 0
-def reset_song_played_states(notes_list):
-    for note_info in notes_list: note_info['played'] = False
+current_song_time_seconds = 0.0; song_time_at_last_event = 0.0; real_time_at_last_event = 0.0
+def reset_song_played_states(note_store):
+    note_store.reset_played()
 def reset_learning_mode_specific_states():
     global learning_mode_state
-    learning_mode_state['paused_at_time'] = None; learning_mode_state['notes_at_pause'].clear(); learning_mode_state['correctly_pressed_midi_in_pause'].clear()
+    learning_mode_state['paused_at_time'] = None; learning_mode_state['notes_at_pause'] = range(0); learning_mode_state['expected_midi_in_pause'] = frozenset(); learning_mode_state['correctly_pressed_midi_in_pause'].clear()
 def set_global_application_volume(volume_level):
     clamped_volume = max(0.0, min(1.0, volume_level))
-    for pc_key_data in key_map.values():
-        if pc_key_data['sound_obj']: pc_key_data['sound_obj'].set_volume(clamped_volume)
-    for sound_obj in midi_to_sound_map.values():
-        if sound_obj: sound_obj.set_volume(clamped_volume)
+    synth.set_master_gain(clamped_volume)
     if correct_sound: correct_sound.set_volume(clamped_volume)
     if incorrect_sound: incorrect_sound.set_volume(clamped_volume)
-song_playback_status = 'STOPPED'; current_song_time_seconds = 0.0; song_time_at_last_event = 0.0; real_ticks_at_last_event = 0
-reset_song_played_states(song_data); reset_learning_mode_specific_states(); set_global_application_volume(global_volume)
-def get_x_for_midi_note(midi_note, first_midi_note_on_keyboard, num_total_white_keys, white_key_width_px):
-    white_note_positions_in_octave = [0, 2, 4, 5, 7, 9, 11]; semitone = midi_note % 12; octave = midi_note // 12
-    white_key_map = {0:0, 1:0, 2:1, 3:1, 4:2, 5:3, 6:3, 7:4, 8:4, 9:5, 10:5, 11:6}
-    white_key_num_in_octave = white_key_map[semitone]; base_octave = first_midi_note_on_keyboard // 12
-    total_white_key_index = (octave - base_octave) * 7 + white_key_num_in_octave
-    if not (0 <= total_white_key_index < num_total_white_keys): return None
-    return (total_white_key_index + 1) * white_key_width_px if semitone not in white_note_positions_in_octave else (total_white_key_index * white_key_width_px) + (white_key_width_px / 2.0)
-def get_key_type_and_index_for_midi(midi_note, first_midi_note_on_keyboard, num_total_white_keys, num_total_black_keys):
-    semitone = midi_note % 12; octave = midi_note // 12; base_octave = first_midi_note_on_keyboard // 12
-    white_note_semitones_in_octave = [0, 2, 4, 5, 7, 9, 11]
-    white_key_indices_map = {0:0, 1:0, 2:1, 3:1, 4:2, 5:3, 6:3, 7:4, 8:4, 9:5, 10:5, 11:6}
-    black_key_indices_map = {1:0, 3:1, 6:2, 8:3, 10:4}
-    key_type, key_index = None, None
-    if semitone in white_note_semitones_in_octave:
-        key_type = 'white'; idx_in_octave = white_key_indices_map[semitone]; key_index = (octave - base_octave) * 7 + idx_in_octave
-        if not (0 <= key_index < num_total_white_keys): return None, None
-    elif semitone in black_key_indices_map:
-        key_type = 'black'; idx_in_octave = black_key_indices_map[semitone]; key_index = (octave - base_octave) * 5 + idx_in_octave
-        if not (0 <= key_index < num_total_black_keys): return None, None
-    else: return None, None
-    return key_type, key_index
+def song_key_range(note_store):
+    return KEYBOARD_RANGE or fit_key_range(note_store.pitches, pc_key_to_midi_map.values())
+def set_song(note_store, chords=None, note_events=None, timeline=None, key_range=None):
+    # chords/note_events: precomputed ChordSteps and compiled events (e.g. from the song library cache);
+    # timeline/key_range: an EventTimeline and the key range it was built for (see load_song_in_background)
+    global song_notes, total_song_duration_seconds, song_playback_status, current_song_time_seconds, song_time_at_last_event, real_time_at_last_event
+    finish_take(); song_notes = note_store; total_song_duration_seconds = get_total_song_duration(note_store)
+    song_playback_status = 'STOPPED'; current_song_time_seconds = 0.0; song_time_at_last_event = 0.0; real_time_at_last_event = 0.0
+    reset_song_played_states(song_notes); reset_learning_mode_specific_states(); synth.all_notes_off()
+    if KEYBOARD_RANGE is None: apply_keyboard_layout(*(key_range or song_key_range(note_store)))
+    rebuild_song_timeline(chords, note_events, timeline); invalidate_piano_roll(); sync_timeline_to(0.0)
+song_playback_status = 'STOPPED'; current_song_time_seconds = 0.0; song_time_at_last_event = 0.0; real_time_at_last_event = 0.0
+reset_song_played_states(song_notes); reset_learning_mode_specific_states(); set_global_application_volume(global_volume)
 def get_rect_for_midi_note(midi_note):
-    key_type, key_idx = get_key_type_and_index_for_midi(midi_note, KEYBOARD_START_MIDI_NOTE, NUM_WHITE_KEYS, NUM_BLACK_KEYS)
-    if key_type == 'white' and 0 <= key_idx < len(last_drawn_white_key_rects): return last_drawn_white_key_rects[key_idx]
-    elif key_type == 'black' and 0 <= key_idx < len(last_drawn_black_key_rects): return last_drawn_black_key_rects[key_idx]
-    return None
-def update_stars(star_list_ref, dt_ms):
-    for star in star_list_ref:
-        star['alpha_cycle_time'] = (star['alpha_cycle_time'] + dt_ms) % star['alpha_cycle_duration']
-        normalized_time = star['alpha_cycle_time'] / star['alpha_cycle_duration']
-        star['current_alpha'] = 0.5 * (1 + math.sin(normalized_time * math.pi * 2))
-def draw_stars(surface, star_list_ref):
-    for star in star_list_ref:
-        base_r, base_g, base_b = star['base_color_tuple']
-        alpha_factor = star['current_alpha']
-        final_r = int(base_r * alpha_factor); final_g = int(base_g * alpha_factor); final_b = int(base_b * alpha_factor)
-        final_color = (max(0, min(255, final_r)), max(0, min(255, final_g)), max(0, min(255, final_b)))
-        if star['radius'] >= 1: pygame.draw.circle(surface, final_color, (star['x'], star['y']), int(star['radius']))
-        elif alpha_factor > 0.5 : surface.set_at((star['x'], star['y']), final_color)
-def manage_shockwaves(surface, shockwave_list_ref, current_ticks_ref, clip_area_rect):
-    num_rings = 3; ring_base_thickness = 4
-    for i in range(len(shockwave_list_ref) - 1, -1, -1):
-        sw = shockwave_list_ref[i]; elapsed_ms = current_ticks_ref - sw['start_time_ms']
-        if elapsed_ms > sw['duration_ms']: shockwave_list_ref.pop(i); continue
-        progress_ratio = elapsed_ms / sw['duration_ms']
-        current_max_ring_radius = sw['max_radius'] * progress_ratio
-        alpha_value = int(max(0, min(255, 255 * (1.0 - progress_ratio**2))))
-        original_clip = surface.get_clip(); surface.set_clip(clip_area_rect)
-        for ring_idx in range(num_rings):
-            ring_radius = current_max_ring_radius * (1 - (ring_idx / num_rings) * 0.7)
-            if ring_radius < 1: continue
-            thickness = max(1, int(ring_base_thickness * (1.0 - progress_ratio)))
-            r, g, b = sw['color']; alpha_factor = alpha_value / 255.0
-            current_ring_color_tuple = (int(r * alpha_factor), int(g * alpha_factor), int(b * alpha_factor)) # Renamed
-            current_ring_color_clamped = (max(0,min(255,c)) for c in current_ring_color_tuple) # Use generator
-            try: pygame.draw.circle(surface, tuple(current_ring_color_clamped), (sw['center_x'], sw['center_y']), int(ring_radius), thickness)
-            except pygame.error: pass # print(f"Error drawing shockwave circle: {e}")
-        surface.set_clip(original_clip)
-def draw_piano_roll_notes(surface, current_time_sec, notes_list, px_per_sec, lookahead_sec, first_midi_ref, total_white_keys_ref, white_key_w_ref, black_key_w_ref):
-    if px_per_sec <= 0: return
-    for note in notes_list:
-        note_end_time = note['start_time'] + note['duration']
-        if note['start_time'] < current_time_sec + lookahead_sec and note_end_time > current_time_sec:
-            x_center = get_x_for_midi_note(note['midi_note'], first_midi_ref, total_white_keys_ref, white_key_w_ref)
-            if x_center is None: continue
-            semitone = note['midi_note'] % 12; white_note_semitones = [0, 2, 4, 5, 7, 9, 11]; is_white_note = semitone in white_note_semitones
-            rect_width = white_key_w_ref * NOTE_RECT_WIDTH_WHITE_RATIO if is_white_note else black_key_w_ref * NOTE_RECT_WIDTH_BLACK_RATIO
-            rect_left_x = x_center - (rect_width / 2)
-            time_offset_sec = note['start_time'] - current_time_sec; y_offset_px = time_offset_sec * px_per_sec
-            note_bottom_y_on_roll = PIANO_ROLL_BOTTOM_Y - y_offset_px; note_height_px = note['duration'] * px_per_sec
-            note_top_y_on_roll = note_bottom_y_on_roll - note_height_px
-            visible_top_y = max(note_top_y_on_roll, PIANO_ROLL_TOP_Y); visible_bottom_y = min(note_bottom_y_on_roll, PIANO_ROLL_BOTTOM_Y)
-            visible_height = visible_bottom_y - visible_top_y
-            if visible_height > 0:
-                note_rect = pygame.Rect(rect_left_x, visible_top_y, rect_width, visible_height)
-                pygame.draw.rect(surface, NOTE_RECT_COLOR, note_rect); pygame.draw.rect(surface, NOTE_RECT_BORDER_COLOR, note_rect, 1)
-def draw_control_panel(surface, buttons_list_ref, sliders_list_ref, progress_bar_props_ref, current_app_mode_val, app_modes_ref, mouse_pos_tuple, current_song_time_ref, total_song_duration_ref, base_bpm_ref, is_dragging_tempo, is_dragging_volume):
-    panel_rect_bg = pygame.Rect(0, CONTROL_PANEL_Y_START, WINDOW_WIDTH, CONTROL_PANEL_HEIGHT); pygame.draw.rect(surface, CONTROL_PANEL_BG_COLOR, panel_rect_bg)
-    padding_cp = 10; slider_label_width_cp = 150; slider_y_pos_abs_cp = CONTROL_PANEL_Y_START + padding_cp; slider_track_width_actual_cp = SLIDER_WIDTH
-    tempo_slider = sliders_list_ref[0]; tempo_label_x_start_cp = padding_cp ; tempo_slider_track_x_start_cp = tempo_label_x_start_cp + slider_label_width_cp + padding_cp
-    tempo_slider['rect'] = pygame.Rect(tempo_slider_track_x_start_cp, slider_y_pos_abs_cp + (SLIDER_KNOB_HEIGHT - SLIDER_TRACK_HEIGHT)//2, slider_track_width_actual_cp, SLIDER_TRACK_HEIGHT)
-    tempo_text = tempo_slider['text_label_func'](); tempo_label_surf = control_panel_font.render(tempo_text, True, BUTTON_TEXT_COLOR); tempo_label_rect = tempo_label_surf.get_rect(left=tempo_label_x_start_cp, centery=tempo_slider['rect'].centery); surface.blit(tempo_label_surf, tempo_label_rect)
-    pygame.draw.rect(surface, SLIDER_TRACK_COLOR, tempo_slider['rect'], border_radius=5); tempo_val = tempo_slider['current_value_func'](); tempo_min, tempo_max = tempo_slider['value_range']
-    knob_x_ratio_tempo = (tempo_val - tempo_min) / (tempo_max - tempo_min) if (tempo_max - tempo_min) != 0 else 0; knob_x_tempo = tempo_slider['rect'].left + int(knob_x_ratio_tempo * tempo_slider['rect'].width)
-    tempo_slider['knob_rect'] = pygame.Rect(knob_x_tempo - SLIDER_KNOB_WIDTH // 2, slider_y_pos_abs_cp, SLIDER_KNOB_WIDTH, SLIDER_KNOB_HEIGHT)
-    tempo_knob_color_to_use = ACCENT_COLOR_CYAN_BRIGHT if is_dragging_tempo else SLIDER_KNOB_COLOR
-    pygame.draw.rect(surface, tempo_knob_color_to_use, tempo_slider['knob_rect'], border_radius=3)
-    volume_slider = sliders_list_ref[1]; volume_label_x_start_cp = tempo_slider_track_x_start_cp + slider_track_width_actual_cp + padding_cp * 2; volume_slider_track_x_start_cp = volume_label_x_start_cp + slider_label_width_cp + padding_cp
-    volume_slider['rect'] = pygame.Rect(volume_slider_track_x_start_cp, slider_y_pos_abs_cp + (SLIDER_KNOB_HEIGHT - SLIDER_TRACK_HEIGHT)//2, slider_track_width_actual_cp, SLIDER_TRACK_HEIGHT)
-    volume_text = volume_slider['text_label_func'](); volume_label_surf = control_panel_font.render(volume_text, True, BUTTON_TEXT_COLOR); volume_label_rect = volume_label_surf.get_rect(left=volume_label_x_start_cp, centery=volume_slider['rect'].centery); surface.blit(volume_label_surf, volume_label_rect)
-    pygame.draw.rect(surface, SLIDER_TRACK_COLOR, volume_slider['rect'], border_radius=5); volume_val = volume_slider['current_value_func'](); volume_min, volume_max = volume_slider['value_range']
-    knob_x_ratio_volume = (volume_val - volume_min) / (volume_max - volume_min) if (volume_max - volume_min) != 0 else 0; knob_x_volume = volume_slider['rect'].left + int(knob_x_ratio_volume * volume_slider['rect'].width)
-    volume_slider['knob_rect'] = pygame.Rect(knob_x_volume - SLIDER_KNOB_WIDTH // 2, slider_y_pos_abs_cp, SLIDER_KNOB_WIDTH, SLIDER_KNOB_HEIGHT)
-    volume_knob_color_to_use = ACCENT_COLOR_CYAN_BRIGHT if is_dragging_volume else SLIDER_KNOB_COLOR
-    pygame.draw.rect(surface, volume_knob_color_to_use, volume_slider['knob_rect'], border_radius=3)
-    progress_bar_y_pos_abs_cp = slider_y_pos_abs_cp + SLIDER_KNOB_HEIGHT + padding_cp; progress_bar_width_actual_cp = WINDOW_WIDTH - 2 * padding_cp
-    progress_bar_props_ref['rect'] = pygame.Rect(padding_cp, progress_bar_y_pos_abs_cp, progress_bar_width_actual_cp, PROGRESS_BAR_HEIGHT); pygame.draw.rect(surface, progress_bar_props_ref['track_color'], progress_bar_props_ref['rect'], border_radius=3)
+    return keyboard_geometry.key_rects[midi_note]
+song_timeline = EventTimeline(song_notes, keyboard_geometry.key_types, keyboard_geometry.key_indices); song_chords = ChordSteps(song_notes, CHORD_TOLERANCE_SECONDS)
+def rebuild_song_timeline(chords=None, note_events=None, timeline=None):
+    global song_timeline, song_chords
+    if timeline is None or not timeline.matches_keyboard(keyboard_geometry.key_types, keyboard_geometry.key_indices):
+        timeline = EventTimeline(song_notes, keyboard_geometry.key_types, keyboard_geometry.key_indices, note_events)
+    song_timeline = timeline; song_chords = chords or ChordSteps(song_notes, CHORD_TOLERANCE_SECONDS)
+# Song library: with PIANO_SONG_DIR set, songs are listed from the library index and opened from its parsed-song
+# cache; Page Up/Page Down switch between them.
+SONG_LIBRARY_DIR = os.environ.get('PIANO_SONG_DIR')
+song_library = SongLibrary(SONG_LIBRARY_DIR, os.environ.get('PIANO_SONG_CACHE'), CHORD_TOLERANCE_SECONDS) if SONG_LIBRARY_DIR else None
+library_song_idx = -1; library_scan_job = None
+# Songs load on the asset loader; until the newest requested one arrives, Start is remembered rather than acted on.
+song_load_job = None; start_when_song_loads = False
+def load_song_in_background(title, load_func, *args):
+    global song_load_job
+    def load():
+        song = load_func(*args)
+        if isinstance(song, NoteStore): song = LibrarySong(title, song, ChordSteps(song, CHORD_TOLERANCE_SECONDS), compile_note_events(song))
+        synth.prerender(set(song.notes.pitches))  # Playback then finds every tone buffer already rendered
+        # The key range and the timeline's resolved keys only depend on the song, so they are built here too;
+        # set_song rebuilds the timeline only if the keyboard changed (e.g. a fixed range) in the meantime.
+        song.key_range = song_key_range(song.notes); key_geometry = make_keyboard_geometry(*song.key_range)
+        song.timeline = EventTimeline(song.notes, key_geometry.key_types, key_geometry.key_indices, song.note_events)
+        return song
+    song_load_job = asset_loader.submit(f'song {title}', load)
+def open_library_song(entry_idx):
+    global library_song_idx
+    if song_library is None or not len(song_library): return
+    library_song_idx = entry_idx % len(song_library)
+    load_song_in_background(song_library.entries[library_song_idx]['title'], song_library.open_song, library_song_idx)
+def open_song_file(path):
+    if song_library is None: load_song_in_background(path, load_song, path)
+    else: load_song_in_background(path, song_library.open_file, path)
+def handle_asset_ready(job_id):
+    global correct_sound, incorrect_sound, song_load_job, start_when_song_loads
+    if job_id == feedback_sounds_job: correct_sound, incorrect_sound = asset_loader.result(job_id); set_global_application_volume(global_volume)
+    elif job_id == library_scan_job:
+        if song_load_job is None: open_library_song(0)
+    elif job_id == song_load_job:
+        song_load_job = None
+        try: song = asset_loader.result(job_id)
+        except Exception: start_when_song_loads = False; return  # The loader has already reported the error; the current song stays
+        set_song(song.notes, song.chords, song.note_events, song.timeline, song.key_range)
+        if song_library is not None and library_song_idx >= 0: print(f"Song {library_song_idx + 1}/{len(song_library)}: {song.title}")
+        if start_when_song_loads: start_when_song_loads = False; start_playback()
+    if asset_loader.all_ready: note_startup('assets_ready_ms')
+def set_key_pressed(key_type, key_index, pressed):
+    if key_type == KEY_WHITE: white_key_pressed_states[key_index] = pressed
+    elif key_type == KEY_BLACK: black_key_pressed_states[key_index] = pressed
+def set_midi_key_pressed(midi_note, pressed):
+    set_key_pressed(keyboard_geometry.key_types[midi_note], keyboard_geometry.key_indices[midi_note], pressed)  # Notes off the keyboard are ignored
+def sync_timeline_to(time_sec):
+    # Jumps in song time (start, stop, seek, mode switch) reposition the timeline cursor and rebuild the held keys
+    # directly instead of replaying every note-on/off before time_sec. Notes already under way are shown, not re-struck.
+    synth.all_notes_off()
+    white_key_pressed_states[:] = [False] * len(white_key_pressed_states); black_key_pressed_states[:] = [False] * len(black_key_pressed_states)
+    held_notes = song_timeline.seek(time_sec); learning_mode_state['chord_cursor'] = song_chords.index_at_or_after(time_sec)
+    if current_mode == APP_MODES['PRESENTATION']:
+        for note_idx in held_notes: set_midi_key_pressed(song_notes.pitches[note_idx], True)
+# Key presses during playback are recorded as takes and scored in the background when the take ends.
+# Takes are kept in memory unless PIANO_RECORD_DIR names a directory to write .pkrec logs into.
+RECORDINGS_DIR = os.environ.get('PIANO_RECORD_DIR')
+performance_recorder = PerformanceRecorder(); take_start_time = 0.0
+def song_time_at(real_time_sec):
+    # Song time at a time.perf_counter() instant of this frame or shortly before, e.g. a MIDI event's timestamp.
+    # The playback clock is anchored on perf_counter, so recorded presses are not rounded to get_ticks() milliseconds.
+    if learning_mode_state['paused_at_time'] is not None: return learning_mode_state['paused_at_time']
+    if song_playback_status == 'PLAYING': return song_time_at_last_event + max(0.0, real_time_sec - real_time_at_last_event) * tempo_multiplier
+    return current_song_time_seconds
+def song_clock_now():
+    # Song time at this instant, between the once-per-frame updates of current_song_time_seconds
+    return song_time_at(time.perf_counter())
+def set_tempo_multiplier(multiplier):
+    # The clock is re-anchored at this instant (not at the last frame's song time) so dragging the slider never
+    # drops the time since the last frame; the tempo map itself is only ever scaled by the multiplier, never rebuilt.
+    global tempo_multiplier, song_time_at_last_event, real_time_at_last_event
+    if multiplier == tempo_multiplier: return
+    now_sec = time.perf_counter()
+    song_time_at_last_event = song_time_at(now_sec) if learning_mode_state['paused_at_time'] is None else current_song_time_seconds
+    real_time_at_last_event = now_sec; tempo_multiplier = multiplier
+def seek_time_for_ratio(ratio):
+    # Progress-bar seeks land on the beat at or before the clicked point, found through the song's tempo map.
+    tempo_map = song_notes.tempo_map
+    return min(total_song_duration_seconds, tempo_map.beats_to_seconds(math.floor(tempo_map.seconds_to_beats(ratio * total_song_duration_seconds))))
+def start_take(start_time_sec):
+    global take_start_time
+    take_path = None
+    if RECORDINGS_DIR:
+        os.makedirs(RECORDINGS_DIR, exist_ok=True); take_path = os.path.join(RECORDINGS_DIR, time.strftime('take-%Y%m%d-%H%M%S.pkrec'))
+    performance_recorder.start(take_path); take_start_time = start_time_sec
+def finish_take(wait=False):
+    if not performance_recorder.recording: return
+    take_notes = song_notes; take_chords = song_chords; start_time_sec = take_start_time; end_time_sec = max(take_start_time, current_song_time_seconds)
+    def report_take(log_bytes):  # Runs on the recorder's writer thread
+        print("Take scored: " + format_score_summary(score_performance_log(take_notes, take_chords, log_bytes, start_time_sec, end_time_sec)))
+    performance_recorder.stop(on_complete=report_take, wait=wait)
+def update_stars(starfield, dt_ms):
+    starfield.update(dt_ms)
+def draw_stars(surface, starfield):
+    starfield.draw(surface)
+# Pre-rendered piano-roll tiles for the current song, keyboard and scale; built on first draw, dropped when any of them changes.
+piano_roll_tiles = None
+def invalidate_piano_roll():
+    global piano_roll_tiles
+    piano_roll_tiles = None
+def layout_control_panel(panel_rect, buttons_list_ref, sliders_list_ref, progress_bar_props_ref):
+    # Positions the static control-panel rects for one window size and pre-renders the panel background with its
+    # slider and progress tracks; draw_control_panel only adds labels, knobs, the progress fill and buttons.
+    global control_panel_background
+    padding_cp = 10; slider_label_width_cp = 150; slider_y_pos_abs_cp = panel_rect.top + padding_cp; slider_track_width_actual_cp = SLIDER_WIDTH
+    label_x_cp = padding_cp
+    for slider in sliders_list_ref:
+        track_x_start_cp = label_x_cp + slider_label_width_cp + padding_cp; slider['label_x'] = label_x_cp
+        slider['rect'] = pygame.Rect(track_x_start_cp, slider_y_pos_abs_cp + (SLIDER_KNOB_HEIGHT - SLIDER_TRACK_HEIGHT)//2, slider_track_width_actual_cp, SLIDER_TRACK_HEIGHT)
+        slider['knob_y'] = slider_y_pos_abs_cp; label_x_cp = track_x_start_cp + slider_track_width_actual_cp + padding_cp * 2
+    progress_bar_y_pos_abs_cp = slider_y_pos_abs_cp + SLIDER_KNOB_HEIGHT + padding_cp; progress_bar_width_actual_cp = panel_rect.width - 2 * padding_cp
+    progress_bar_props_ref['rect'] = pygame.Rect(panel_rect.left + padding_cp, progress_bar_y_pos_abs_cp, progress_bar_width_actual_cp, PROGRESS_BAR_HEIGHT)
+    button_y_start_abs_cp = progress_bar_y_pos_abs_cp + PROGRESS_BAR_HEIGHT + padding_cp; num_buttons_val_cp = len(buttons_list_ref); total_buttons_width_val_cp = num_buttons_val_cp * BUTTON_WIDTH + (num_buttons_val_cp - 1) * BUTTON_MARGIN; start_x_buttons_val_cp = panel_rect.left + (panel_rect.width - total_buttons_width_val_cp) // 2
+    for i, button_info in enumerate(buttons_list_ref): button_info['rect'].topleft = (start_x_buttons_val_cp + i * (BUTTON_WIDTH + BUTTON_MARGIN), button_y_start_abs_cp)
+    control_panel_background = pygame.Surface(panel_rect.size); control_panel_background.fill(CONTROL_PANEL_BG_COLOR)
+    for track_rect, track_color, track_radius in [(slider['rect'], SLIDER_TRACK_COLOR, 5) for slider in sliders_list_ref] + [(progress_bar_props_ref['rect'], progress_bar_props_ref['track_color'], 3)]:
+        pygame.draw.rect(control_panel_background, track_color, track_rect.move(-panel_rect.left, -panel_rect.top), border_radius=track_radius)
+    if pygame.display.get_surface(): control_panel_background = control_panel_background.convert()
+def draw_control_panel(surface, buttons_list_ref, sliders_list_ref, progress_bar_props_ref, current_app_mode_val, app_modes_ref, mouse_pos_tuple, current_song_time_ref, total_song_duration_ref, is_dragging_tempo, is_dragging_volume):
+    surface.blit(control_panel_background, layout.control_panel_rect.topleft)
+    for slider, is_dragging in zip(sliders_list_ref, (is_dragging_tempo, is_dragging_volume)):
+        label_surf = ui_surface_cache.render_text(control_panel_font, slider['text_label_func'](), BUTTON_TEXT_COLOR); surface.blit(label_surf, label_surf.get_rect(left=slider['label_x'], centery=slider['rect'].centery))
+        slider_val = slider['current_value_func'](); slider_min, slider_max = slider['value_range']
+        knob_x_ratio = (slider_val - slider_min) / (slider_max - slider_min) if (slider_max - slider_min) != 0 else 0; knob_x = slider['rect'].left + int(knob_x_ratio * slider['rect'].width)
+        slider['knob_rect'] = pygame.Rect(knob_x - SLIDER_KNOB_WIDTH // 2, slider['knob_y'], SLIDER_KNOB_WIDTH, SLIDER_KNOB_HEIGHT)
+        pygame.draw.rect(surface, ACCENT_COLOR_CYAN_BRIGHT if is_dragging else SLIDER_KNOB_COLOR, slider['knob_rect'], border_radius=3)
     if total_song_duration_ref > 0:
         progress_ratio = min(current_song_time_ref / total_song_duration_ref, 1.0) if total_song_duration_ref > 0 else 0; fill_width = int(progress_ratio * progress_bar_props_ref['rect'].width)
         if fill_width > 0: fill_rect = pygame.Rect(progress_bar_props_ref['rect'].left, progress_bar_props_ref['rect'].top, fill_width, progress_bar_props_ref['rect'].height); pygame.draw.rect(surface, progress_bar_props_ref['fill_color'], fill_rect, border_radius=3)
-    button_y_start_abs_cp = progress_bar_y_pos_abs_cp + PROGRESS_BAR_HEIGHT + padding_cp; num_buttons_val_cp = len(buttons_list_ref); total_buttons_width_val_cp = num_buttons_val_cp * BUTTON_WIDTH + (num_buttons_val_cp - 1) * BUTTON_MARGIN; start_x_buttons_val_cp = (WINDOW_WIDTH - total_buttons_width_val_cp) // 2
     for i, button_info in enumerate(buttons_list_ref):
-        button_x = start_x_buttons_val_cp + i * (BUTTON_WIDTH + BUTTON_MARGIN); button_info['rect'].topleft = (button_x, button_y_start_abs_cp); btn_rect_updated = button_info['rect']
+        btn_rect_updated = button_info['rect']
         current_color = button_info['base_color']
         is_hovered = btn_rect_updated.collidepoint(mouse_pos_tuple)
         if button_info['action_id'] == 'action_toggle_mode':
@@ -323,17 +400,12 @@ def draw_control_panel(surface, buttons_list_ref, sliders_list_ref, progress_bar
         pygame.draw.rect(surface, current_color, btn_rect_updated); pygame.draw.rect(surface, (50,50,50), btn_rect_updated, 1)
         button_text_content = button_info['text']
         if button_info['action_id'] == 'action_toggle_mode': mode_name = "Learning" if current_app_mode_val == app_modes_ref['LEARNING'] else "Presentation"; button_text_content = f"Mode: {mode_name}"
-        if button_info['font'] and button_text_content: text_surf = button_info['font'].render(button_text_content, True, button_info['text_color']); text_rect = text_surf.get_rect(center=btn_rect_updated.center); surface.blit(text_surf, text_rect)
-def draw_feedback_flash_overlay(surface, flash_info, first_midi_ref, num_white_keys_ref, num_black_keys_ref, white_key_w_ref, keyboard_y_start_ref, white_key_h_ref, black_key_w_ref, black_key_h_ref):
+        if button_info['font'] and button_text_content: text_surf = ui_surface_cache.render_text(button_info['font'], button_text_content, button_info['text_color']); text_rect = text_surf.get_rect(center=btn_rect_updated.center); surface.blit(text_surf, text_rect)
+layout_control_panel(layout.control_panel_rect, control_panel_buttons, sliders_list, progress_bar_props)
+def draw_feedback_flash_overlay(surface, flash_info, geometry):
     if flash_info['key_midi'] is None or flash_info['end_time_ms'] <= pygame.time.get_ticks(): flash_info['key_midi'] = None; return
-    key_type, key_idx = get_key_type_and_index_for_midi(flash_info['key_midi'],first_midi_ref,num_white_keys_ref,num_black_keys_ref)
-    if key_type is None: flash_info['key_midi'] = None; return
-    flash_rect = None; key_center_x = get_x_for_midi_note(flash_info['key_midi'], first_midi_ref, num_white_keys_ref, white_key_w_ref)
-    if key_center_x is None: flash_info['key_midi'] = None; return
-    current_key_width = white_key_w_ref if key_type == 'white' else black_key_w_ref; current_key_height = white_key_h_ref if key_type == 'white' else black_key_h_ref
-    key_top_left_x = key_center_x - (current_key_width / 2)
-    flash_rect = pygame.Rect(key_top_left_x, keyboard_y_start_ref, current_key_width, current_key_height)
-    if flash_rect: flash_surface = pygame.Surface(flash_rect.size, pygame.SRCALPHA); flash_surface.fill((*flash_info['color'], 128)); surface.blit(flash_surface, flash_rect.topleft)
+    flash_rect = geometry.key_rects[flash_info['key_midi']]
+    if flash_rect: flash_surface = ui_surface_cache.filled_surface(flash_rect.size, (*flash_info['color'], FEEDBACK_FLASH_ALPHA)); surface.blit(flash_surface, flash_rect.topleft)
     else: flash_info['key_midi'] = None
 def draw_white_key(surface, rect, shadow_offset, is_pressed):
     current_fill_color = GRAY if is_pressed else WHITE
@@ -343,197 +415,326 @@ def draw_black_key(surface, rect, shadow_offset, is_pressed):
     current_fill_color = LIGHTER_GRAY if is_pressed else BLACK
     if is_pressed: pygame.draw.rect(surface, current_fill_color, rect)
     else: shadow_rect = rect.move(shadow_offset, shadow_offset); pygame.draw.rect(surface, (150,150,150), shadow_rect) ; pygame.draw.rect(surface, current_fill_color, rect)
+keyboard_renderer = KeyboardRenderer(keyboard_geometry, SHADOW_OFFSET, draw_white_key, draw_black_key)
+def get_background_dirty_rects(layer_rect):
+    # Everything outside the keyboard layer is repainted every frame (stars, piano roll); the layer itself only where keys change.
+    return [r for r in (pygame.Rect(0, 0, layout.width, layer_rect.top), pygame.Rect(layer_rect.right - SHADOW_OFFSET, layer_rect.top, layout.width, layer_rect.height)) if r.width > 0 and r.height > 0]
+BACKGROUND_DIRTY_RECTS = get_background_dirty_rects(keyboard_renderer.layer_rect)
+frame_dirty_rects = []; frame_overlay_rects = []; last_frame_overlay_rects = []; full_redraw_needed = True
+def rebuild_keyboard(first_midi_note, last_midi_note):
+    # Geometry, keyboard layer and sprites, shockwave sprites and background dirty rects for the current layout.
+    global keyboard_geometry, BACKGROUND_DIRTY_RECTS, full_redraw_needed
+    keyboard_geometry = make_keyboard_geometry(first_midi_note, last_midi_note)
+    keyboard_renderer.build(keyboard_geometry, SHADOW_OFFSET)
+    shockwave_pool.configure(keyboard_geometry.white_key_width * 2.0, ACCENT_COLOR_CYAN)
+    BACKGROUND_DIRTY_RECTS = get_background_dirty_rects(keyboard_renderer.layer_rect); full_redraw_needed = True
+    invalidate_piano_roll()
+def apply_keyboard_layout(first_midi_note, last_midi_note):
+    # Key range change. The song timeline caches key indices, so callers rebuild it after.
+    if (first_midi_note, last_midi_note) == (keyboard_geometry.first_midi_note, keyboard_geometry.last_midi_note): return
+    rebuild_keyboard(first_midi_note, last_midi_note)
+    white_key_pressed_states[:] = [False] * keyboard_geometry.num_white_keys; black_key_pressed_states[:] = [False] * keyboard_geometry.num_black_keys
+    shockwave_pool.clear()
+def apply_window_layout(size):
+    # The one place size-dependent state is rebuilt after a resize or fullscreen toggle: layout rects, starfield,
+    # keyboard layer, shockwave sprites, control-panel background and cached overlay surfaces. Key indices do not
+    # depend on the size, so pressed keys and the song timeline carry over.
+    global layout, stars, screen
+    screen = pygame.display.get_surface(); layout = make_layout(size)
+    stars = Starfield(NUM_STARS, layout.width, layout.stars_max_y, STAR_COLORS)
+    rebuild_keyboard(keyboard_geometry.first_midi_note, keyboard_geometry.last_midi_note)
+    layout_control_panel(layout.control_panel_rect, control_panel_buttons, sliders_list, progress_bar_props)
+    ui_surface_cache.clear()
+def handle_window_resized():
+    # VIDEORESIZE and WINDOWSIZECHANGED both arrive for one resize; only a real size change relayouts.
+    window_size = pygame.display.get_surface().get_size()
+    if window_size != layout.size: apply_window_layout(window_size)
+windowed_size = (WINDOW_WIDTH, WINDOW_HEIGHT)
+def toggle_fullscreen():
+    # F11; leaving fullscreen restores the last windowed size.
+    global is_fullscreen, windowed_size
+    if not is_fullscreen: windowed_size = layout.size
+    is_fullscreen = not is_fullscreen; open_window(windowed_size, is_fullscreen)
+    apply_window_layout(pygame.display.get_surface().get_size())
+def mark_dirty(rect): frame_dirty_rects.append(rect)
+def mark_overlay(rect): frame_overlay_rects.append(rect)  # Transient drawing over static content: must also be repainted next frame
+def keyboard_overlay_rects():
+    # Areas the shockwave and overlay stages will draw over the keyboard this frame
+    if shockwave_pool.live_count or mode_switch_confirm_active: return [layout.keyboard_rect]
+    flash_rect_f = active_flash_rect()
+    return [flash_rect_f] if flash_rect_f else []
 def draw_piano(surface, white_pressed_states, black_pressed_states):
-    global last_drawn_white_key_rects, last_drawn_black_key_rects
-    last_drawn_white_key_rects.clear(); last_drawn_black_key_rects.clear()
-    keyboard_y_start = WINDOW_HEIGHT - white_key_height
-    for i in range(NUM_WHITE_KEYS):
-        white_key_x = i * white_key_width; white_key_rect = pygame.Rect(white_key_x, keyboard_y_start, white_key_width, white_key_height)
-        last_drawn_white_key_rects.append(white_key_rect)
-        draw_white_key(surface, white_key_rect, SHADOW_OFFSET, white_key_pressed_states[i])
-    black_key_pattern = [True, True, False, True, True, True, False]; black_key_idx_counter = 0
-    for i in range(NUM_WHITE_KEYS):
-        if black_key_pattern[i % 7] and i < NUM_WHITE_KEYS -1:
-            if black_key_idx_counter < NUM_BLACK_KEYS:
-                black_key_x = (i + 1) * white_key_width - (black_key_width // 2); black_key_rect = pygame.Rect(black_key_x, keyboard_y_start, black_key_width, black_key_height)
-                last_drawn_black_key_rects.append(black_key_rect)
-                draw_black_key(surface, black_key_rect, SHADOW_OFFSET, black_key_pressed_states[black_key_idx_counter]); black_key_idx_counter += 1
-clock = pygame.time.Clock(); running = True
-while running:
-    dt_ms = clock.get_time()
-    for event in pygame.event.get():
+    # The keyboard layer is only blitted where this frame is presented: changed keys, earlier dirty areas, and last and this frame's overlays
+    repaint_rects = None if full_redraw_needed else frame_dirty_rects + last_frame_overlay_rects + keyboard_overlay_rects()
+    frame_dirty_rects.extend(keyboard_renderer.draw(surface, white_pressed_states, black_pressed_states, repaint_rects))
+def draw_shockwaves(surface):
+    if shockwave_pool.live_count: mark_overlay(layout.keyboard_rect)
+    shockwave_pool.draw(surface, pygame.time.get_ticks(), layout.keyboard_rect)
+def present_frame():
+    global full_redraw_needed, last_frame_overlay_rects, frame_overlay_rects
+    if full_redraw_needed: pygame.display.flip(); full_redraw_needed = False
+    else: pygame.display.update(frame_dirty_rects + frame_overlay_rects + last_frame_overlay_rects)
+    frame_dirty_rects.clear(); last_frame_overlay_rects, frame_overlay_rects = frame_overlay_rects, last_frame_overlay_rects; frame_overlay_rects.clear()
+def start_playback():
+    global song_playback_status, current_song_time_seconds, song_time_at_last_event, real_time_at_last_event
+    if song_playback_status == 'STOPPED': current_song_time_seconds = 0.0; reset_song_played_states(song_notes); reset_learning_mode_specific_states(); song_time_at_last_event = 0.0; real_time_at_last_event = time.perf_counter(); sync_timeline_to(0.0); start_take(0.0)
+    elif song_playback_status == 'USER_PAUSED': song_time_at_last_event = current_song_time_seconds; real_time_at_last_event = time.perf_counter()
+    song_playback_status = 'PLAYING'
+    if current_mode == APP_MODES['LEARNING']: learning_mode_state['paused_at_time'] = None
+def note_pressed(midi_note, song_time_sec, velocity=100):
+    # Presses from the computer keyboard and the MIDI input alike: take log, learning-mode matching, key state and sound.
+    global feedback_flash_info, song_time_at_last_event, real_time_at_last_event
+    if mode_switch_confirm_active: return
+    performance_recorder.record(song_time_sec, midi_note, True)
+    if current_mode == APP_MODES['LEARNING'] and learning_mode_state['paused_at_time'] is not None:
+        expected_midi_notes_set = learning_mode_state['expected_midi_in_pause']
+        if midi_note in expected_midi_notes_set and midi_note not in learning_mode_state['correctly_pressed_midi_in_pause']:
+            learning_mode_state['correctly_pressed_midi_in_pause'].add(midi_note); feedback_flash_info = {'key_midi': midi_note, 'color': (0, 255, 0), 'end_time_ms': pygame.time.get_ticks() + 300}
+            if correct_sound: correct_sound.play()
+            set_midi_key_pressed(midi_note, True)
+
+            key_rect = get_rect_for_midi_note(midi_note)
+            if key_rect: shockwave_pool.spawn(key_rect.centerx, key_rect.centery, pygame.time.get_ticks())
+
+            if learning_mode_state['correctly_pressed_midi_in_pause'] == expected_midi_notes_set:
+                song_time_at_last_event = current_song_time_seconds; real_time_at_last_event = time.perf_counter()
+                for note_idx_completed in learning_mode_state['notes_at_pause']: song_notes.set_played(note_idx_completed)
+                for midi_val_release in learning_mode_state['correctly_pressed_midi_in_pause']: set_midi_key_pressed(midi_val_release, False)
+                reset_learning_mode_specific_states(); learning_mode_state['chord_cursor'] += 1
+        elif midi_note not in expected_midi_notes_set:
+            feedback_flash_info = {'key_midi': midi_note, 'color': (255, 0, 0), 'end_time_ms': pygame.time.get_ticks() + 300}
+            if incorrect_sound: incorrect_sound.play()
+    elif learning_mode_state['paused_at_time'] is None:
+        set_midi_key_pressed(midi_note, True)
+        synth.note_on(midi_note, velocity)
+def note_released(midi_note, song_time_sec):
+    synth.note_off(midi_note)
+    if mode_switch_confirm_active: return
+    performance_recorder.record(song_time_sec, midi_note, False)
+    if not (current_mode == APP_MODES['LEARNING'] and learning_mode_state['paused_at_time'] is not None): set_midi_key_pressed(midi_note, False)
+# MIDI keyboard input (PIANO_MIDI_INPUT): a device port or a scripted fake device, read on its own thread. Events keep
+# the device's timestamps, so a press is logged and scored at the song time it happened, not when the frame ran.
+MIDI_INPUT_EVENT = pygame.event.custom_type()
+midi_input = None
+def open_midi_keyboard(spec):
+    global midi_input
+    try: midi_input = open_midi_input(spec)
+    except (MidiInputError, OSError, ValueError, pygame.error) as e: print(f"MIDI input unavailable: {e}"); return
+    if midi_input is None: return
+    midi_input.start(on_input=lambda: pygame.event.post(pygame.event.Event(MIDI_INPUT_EVENT)))
+    print(f"MIDI input: {midi_input.name}")
+def handle_midi_input():
+    # All events queued since the last frame, in order. Each one's age on the device clock places it on the
+    # perf_counter clock, and from there in song time.
+    midi_events = midi_input.poll()
+    if not midi_events: return
+    now_sec = time.perf_counter(); device_now_ms = midi_input.now_ms()
+    for timestamp_ms, midi_note, is_press, velocity in midi_events:
+        song_time_sec = song_time_at(now_sec - (device_now_ms - timestamp_ms) / 1000.0)
+        if is_press: note_pressed(midi_note, song_time_sec, velocity)
+        else: note_released(midi_note, song_time_sec)
+def handle_events(events):
+    global running, current_mode, song_playback_status, current_song_time_seconds, song_time_at_last_event, real_time_at_last_event, time_paused_at_ticks
+    global mode_switch_confirm_active, target_mode_on_confirm, feedback_flash_info, dragging_tempo_slider, dragging_volume_slider, global_volume, start_when_song_loads
+    for event in events:
         if event.type == pygame.QUIT: running = False
+        if event.type == ASSET_READY_EVENT: handle_asset_ready(event.job_id); continue
+        if event.type == MIDI_INPUT_EVENT: continue  # Only wakes the loop; the device queue is drained below
+        if event.type in (pygame.VIDEORESIZE, pygame.WINDOWSIZECHANGED): handle_window_resized()
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F11: toggle_fullscreen(); continue
+        if event.type == pygame.KEYDOWN and event.key in (pygame.K_F3, pygame.K_F4, pygame.K_F5): handle_profiler_key(event.key); continue
+        if event.type == pygame.KEYDOWN and event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN) and song_library is not None:
+            open_library_song(library_song_idx + 1 if event.key == pygame.K_PAGEDOWN else max(library_song_idx, 0) - 1); continue
         if event.type == pygame.KEYDOWN:
             if mode_switch_confirm_active:
-                if event.key == pygame.K_r: current_mode = target_mode_on_confirm; song_playback_status = 'STOPPED'; current_song_time_seconds = 0.0; song_time_at_last_event = 0.0; real_ticks_at_last_event = 0; reset_song_played_states(song_data); reset_learning_mode_specific_states(); mode_switch_confirm_active = False; target_mode_on_confirm = None
-                elif event.key == pygame.K_c: current_mode = target_mode_on_confirm;
-                    if song_playback_status == 'USER_PAUSED': song_time_at_last_event = current_song_time_seconds; real_ticks_at_last_event = pygame.time.get_ticks(); song_playback_status = 'PLAYING'
+                if event.key == pygame.K_r: finish_take(); synth.all_notes_off(); current_mode = target_mode_on_confirm; song_playback_status = 'STOPPED'; current_song_time_seconds = 0.0; song_time_at_last_event = 0.0; real_time_at_last_event = 0.0; reset_song_played_states(song_notes); reset_learning_mode_specific_states(); mode_switch_confirm_active = False; target_mode_on_confirm = None; sync_timeline_to(0.0)
+                elif event.key == pygame.K_c:
+                    current_mode = target_mode_on_confirm
+                    if song_playback_status == 'USER_PAUSED': song_time_at_last_event = current_song_time_seconds; real_time_at_last_event = time.perf_counter(); song_playback_status = 'PLAYING'
                     if current_mode == APP_MODES['LEARNING']: reset_learning_mode_specific_states()
-                    mode_switch_confirm_active = False; target_mode_on_confirm = None
+                    mode_switch_confirm_active = False; target_mode_on_confirm = None; sync_timeline_to(current_song_time_seconds)
                 elif event.key == pygame.K_ESCAPE:
-                    if song_playback_status == 'USER_PAUSED': song_time_at_last_event = current_song_time_seconds; real_ticks_at_last_event = pygame.time.get_ticks(); song_playback_status = 'PLAYING'
+                    if song_playback_status == 'USER_PAUSED': song_time_at_last_event = current_song_time_seconds; real_time_at_last_event = time.perf_counter(); song_playback_status = 'PLAYING'
                     mode_switch_confirm_active = False; target_mode_on_confirm = None
-            elif current_mode == APP_MODES['LEARNING'] and learning_mode_state['paused_at_time'] is not None:
-                pressed_midi = pc_key_to_midi_map.get(event.key); expected_midi_notes_set = {n['midi_note'] for n in learning_mode_state['notes_at_pause']}
-                if event.key == pygame.K_SPACE: song_time_at_last_event = current_song_time_seconds; real_ticks_at_last_event = pygame.time.get_ticks()
-                    for note_info_to_skip in learning_mode_state['notes_at_pause']:
-                        for song_note in song_data:
-                            if song_note['midi_note'] == note_info_to_skip['midi_note'] and song_note['start_time'] == note_info_to_skip['start_time']: song_note['played'] = True; break
-                    learning_mode_state['paused_at_time'] = None; learning_mode_state['notes_at_pause'].clear(); learning_mode_state['correctly_pressed_midi_in_pause'].clear()
-                elif pressed_midi is not None:
-                    if pressed_midi in expected_midi_notes_set and pressed_midi not in learning_mode_state['correctly_pressed_midi_in_pause']:
-                        learning_mode_state['correctly_pressed_midi_in_pause'].add(pressed_midi); feedback_flash_info = {'key_midi': pressed_midi, 'color': (0, 255, 0), 'end_time_ms': pygame.time.get_ticks() + 300}
-                        if correct_sound: correct_sound.play()
-                        key_type_flash, key_idx_flash = get_key_type_and_index_for_midi(pressed_midi, KEYBOARD_START_MIDI_NOTE, NUM_WHITE_KEYS, NUM_BLACK_KEYS)
-                        if key_type_flash == 'white': white_key_pressed_states[key_idx_flash] = True
-                        elif key_type_flash == 'black': black_key_pressed_states[key_idx_flash] = True
-
-                        key_rect = get_rect_for_midi_note(pressed_midi)
-                        if key_rect:
-                            active_shockwaves.append({
-                                'center_x': key_rect.centerx, 'center_y': key_rect.centery,
-                                'start_time_ms': pygame.time.get_ticks(), 'max_radius': white_key_width * 2.0,
-                                'duration_ms': 2000, 'color': ACCENT_COLOR_CYAN })
-
-                        if learning_mode_state['correctly_pressed_midi_in_pause'] == expected_midi_notes_set:
-                            song_time_at_last_event = current_song_time_seconds; real_ticks_at_last_event = pygame.time.get_ticks()
-                            for note_info_completed in learning_mode_state['notes_at_pause']:
-                                for song_note in song_data:
-                                    if song_note['midi_note'] == note_info_completed['midi_note'] and song_note['start_time'] == note_info_completed['start_time']: song_note['played'] = True; break
-                            for midi_val_release in learning_mode_state['correctly_pressed_midi_in_pause']:
-                                k_type_release, k_idx_release = get_key_type_and_index_for_midi(midi_val_release, KEYBOARD_START_MIDI_NOTE, NUM_WHITE_KEYS, NUM_BLACK_KEYS)
-                                if k_type_release == 'white': white_key_pressed_states[k_idx_release] = False
-                                elif k_type_release == 'black': black_key_pressed_states[k_idx_release] = False
-                            learning_mode_state['paused_at_time'] = None; learning_mode_state['notes_at_pause'].clear(); learning_mode_state['correctly_pressed_midi_in_pause'].clear()
-                    elif pressed_midi not in expected_midi_notes_set: feedback_flash_info = {'key_midi': pressed_midi, 'color': (255, 0, 0), 'end_time_ms': pygame.time.get_ticks() + 300};
-                        if incorrect_sound: incorrect_sound.play()
-            elif learning_mode_state['paused_at_time'] is None:
-                if event.key in key_map:
-                    mapped_key = key_map[event.key]; key_type = mapped_key['type']; key_index = mapped_key['index']
-                    if key_type == 'white': white_key_pressed_states[key_index] = True
-                    elif key_type == 'black': black_key_pressed_states[key_index] = True
-                    if mapped_key['sound_obj']: mapped_key['sound_obj'].play()
-        if event.type == pygame.KEYUP:
-            if not mode_switch_confirm_active and not (current_mode == APP_MODES['LEARNING'] and learning_mode_state['paused_at_time'] is not None):
-                if event.key in key_map:
-                    mapped_key = key_map[event.key]; key_type = mapped_key['type']; key_index = mapped_key['index']
-                    if key_type == 'white': white_key_pressed_states[key_index] = False
-                    elif key_type == 'black': black_key_pressed_states[key_index] = False
+            elif current_mode == APP_MODES['LEARNING'] and learning_mode_state['paused_at_time'] is not None and event.key == pygame.K_SPACE:
+                song_time_at_last_event = current_song_time_seconds; real_time_at_last_event = time.perf_counter()
+                for note_idx_to_skip in learning_mode_state['notes_at_pause']: song_notes.set_played(note_idx_to_skip)
+                reset_learning_mode_specific_states(); learning_mode_state['chord_cursor'] += 1
+            elif event.key in pc_key_to_midi_map: note_pressed(pc_key_to_midi_map[event.key], song_clock_now())
+        if event.type == pygame.KEYUP and event.key in pc_key_to_midi_map: note_released(pc_key_to_midi_map[event.key], song_clock_now())
         if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
             mouse_pos = event.pos; clicked_action_id = None
             for button_info in control_panel_buttons:
                 if button_info['rect'].collidepoint(mouse_pos): clicked_action_id = button_info['action_id']; break
             if clicked_action_id:
                 if clicked_action_id == 'action_start':
-                    if song_playback_status == 'STOPPED': current_song_time_seconds = 0.0; reset_song_played_states(song_data); reset_learning_mode_specific_states(); song_time_at_last_event = 0.0; real_ticks_at_last_event = pygame.time.get_ticks()
-                    elif song_playback_status == 'USER_PAUSED': song_time_at_last_event = current_song_time_seconds; real_ticks_at_last_event = pygame.time.get_ticks()
-                    song_playback_status = 'PLAYING'
-                    if current_mode == APP_MODES['LEARNING']: learning_mode_state['paused_at_time'] = None
+                    if song_load_job is not None: start_when_song_loads = True; print("Song still loading; playback starts when it is ready.")  # Playback waits only for the song
+                    else: start_playback()
                 elif clicked_action_id == 'action_pause':
                     can_user_pause = not (current_mode == APP_MODES['LEARNING'] and learning_mode_state['paused_at_time'] is not None)
                     if song_playback_status == 'PLAYING' and can_user_pause: song_playback_status = 'USER_PAUSED'; time_paused_at_ticks = pygame.time.get_ticks()
-                elif clicked_action_id == 'action_stop': song_playback_status = 'STOPPED'; current_song_time_seconds = 0.0; song_time_at_last_event = 0.0; real_ticks_at_last_event = 0; reset_song_played_states(song_data); reset_learning_mode_specific_states()
+                elif clicked_action_id == 'action_stop': finish_take(); song_playback_status = 'STOPPED'; current_song_time_seconds = 0.0; song_time_at_last_event = 0.0; real_time_at_last_event = 0.0; reset_song_played_states(song_notes); reset_learning_mode_specific_states(); sync_timeline_to(0.0)
                 elif clicked_action_id == 'action_toggle_mode':
-                    if not mode_switch_confirm_active: target_mode_on_confirm = APP_MODES['PRESENTATION'] if current_mode == APP_MODES['LEARNING'] else APP_MODES['LEARNING']; mode_switch_confirm_active = True
+                    if not mode_switch_confirm_active:
+                        target_mode_on_confirm = APP_MODES['PRESENTATION'] if current_mode == APP_MODES['LEARNING'] else APP_MODES['LEARNING']; mode_switch_confirm_active = True
                         if song_playback_status == 'PLAYING': song_playback_status = 'USER_PAUSED'; time_paused_at_ticks = pygame.time.get_ticks()
             elif tempo_slider_props.get('knob_rect') and tempo_slider_props['knob_rect'].collidepoint(mouse_pos): dragging_tempo_slider = True
             elif tempo_slider_props.get('rect') and tempo_slider_props['rect'].collidepoint(mouse_pos):
                 dragging_tempo_slider = True; click_ratio = max(0.0, min(1.0, (mouse_pos[0] - tempo_slider_props['rect'].left) / tempo_slider_props['rect'].width)); min_val, max_val = tempo_slider_props['value_range']; new_value = min_val + click_ratio * (max_val - min_val)
-                if tempo_multiplier != new_value: song_time_at_last_event = current_song_time_seconds; real_ticks_at_last_event = pygame.time.get_ticks(); tempo_multiplier = new_value
+                set_tempo_multiplier(new_value)
             elif volume_slider_props.get('knob_rect') and volume_slider_props['knob_rect'].collidepoint(mouse_pos): dragging_volume_slider = True
             elif volume_slider_props.get('rect') and volume_slider_props['rect'].collidepoint(mouse_pos):
                 dragging_volume_slider = True; click_ratio = max(0.0, min(1.0, (mouse_pos[0] - volume_slider_props['rect'].left) / volume_slider_props['rect'].width)); min_val, max_val = volume_slider_props['value_range']; global_volume = min_val + click_ratio * (max_val - min_val); set_global_application_volume(global_volume)
             elif progress_bar_props.get('rect') and progress_bar_props['rect'].collidepoint(mouse_pos):
                 if total_song_duration_seconds > 0:
-                    click_ratio = max(0.0, min(1.0, (mouse_pos[0] - progress_bar_props['rect'].left) / progress_bar_props['rect'].width)); new_time = click_ratio * total_song_duration_seconds; current_song_time_seconds = new_time
-                    song_time_at_last_event = current_song_time_seconds; real_ticks_at_last_event = pygame.time.get_ticks()
-                    if song_playback_status == 'USER_PAUSED': time_paused_at_ticks = real_ticks_at_last_event
-                    reset_song_played_states(song_data); reset_learning_mode_specific_states()
+                    click_ratio = max(0.0, min(1.0, (mouse_pos[0] - progress_bar_props['rect'].left) / progress_bar_props['rect'].width))
+                    # A seek ends the take, scored up to the position before the jump; scoring across it would mismatch presses
+                    take_running = performance_recorder.recording; finish_take(); current_song_time_seconds = seek_time_for_ratio(click_ratio)
+                    song_time_at_last_event = current_song_time_seconds; real_time_at_last_event = time.perf_counter()
+                    if song_playback_status == 'USER_PAUSED': time_paused_at_ticks = pygame.time.get_ticks()
+                    reset_song_played_states(song_notes); reset_learning_mode_specific_states(); sync_timeline_to(current_song_time_seconds)
                     if current_mode == APP_MODES['LEARNING']: learning_mode_state['paused_at_time'] = None
+                    if take_running: start_take(current_song_time_seconds)
                     print(f"Progress bar clicked, seek to {current_song_time_seconds:.2f}s")
         if event.type == pygame.MOUSEBUTTONUP and event.button == 1: dragging_tempo_slider = False; dragging_volume_slider = False
         if event.type == pygame.MOUSEMOTION:
             mouse_pos_motion = event.pos
             if dragging_tempo_slider and tempo_slider_props.get('rect'):
                 slider_rect = tempo_slider_props['rect']; click_ratio = max(0.0, min(1.0, (mouse_pos_motion[0] - slider_rect.left) / slider_rect.width)); min_val, max_val = tempo_slider_props['value_range']; new_value = min_val + click_ratio * (max_val - min_val)
-                if tempo_multiplier != new_value: song_time_at_last_event = current_song_time_seconds; real_ticks_at_last_event = pygame.time.get_ticks(); tempo_multiplier = new_value
+                set_tempo_multiplier(new_value)
             elif dragging_volume_slider and volume_slider_props.get('rect'):
                 slider_rect = volume_slider_props['rect']; click_ratio = max(0.0, min(1.0, (mouse_pos_motion[0] - slider_rect.left) / slider_rect.width)); min_val, max_val = volume_slider_props['value_range']; global_volume = min_val + click_ratio * (max_val - min_val); set_global_application_volume(global_volume)
-
-    update_stars(stars, dt_ms)
-
+    if midi_input is not None: handle_midi_input()
+def update_playback():
+    global current_song_time_seconds, song_time_at_last_event, real_time_at_last_event
     if song_playback_status == 'PLAYING':
-        real_elapsed_ticks_since_event = pygame.time.get_ticks() - real_ticks_at_last_event
-        real_elapsed_seconds_since_event = real_elapsed_ticks_since_event / 1000.0
+        real_elapsed_seconds_since_event = time.perf_counter() - real_time_at_last_event
         current_song_time_seconds = song_time_at_last_event + (real_elapsed_seconds_since_event * tempo_multiplier)
         if total_song_duration_seconds > 0 and current_song_time_seconds >= total_song_duration_seconds:
             current_song_time_seconds = total_song_duration_seconds
         if current_mode == APP_MODES['LEARNING']:
             if learning_mode_state['paused_at_time'] is None:
-                min_next_note_time = float('inf')
-                for note_info_iter in song_data:
-                    if not note_info_iter['played'] and note_info_iter['start_time'] < min_next_note_time: min_next_note_time = note_info_iter['start_time']
-                if min_next_note_time != float('inf') and min_next_note_time <= current_song_time_seconds:
-                    learning_mode_state['paused_at_time'] = min_next_note_time; learning_mode_state['notes_at_pause'].clear()
-                    for note_info_iter in song_data:
-                        if not note_info_iter['played'] and note_info_iter['start_time'] == min_next_note_time: learning_mode_state['notes_at_pause'].append(dict(note_info_iter))
-                    learning_mode_state['correctly_pressed_midi_in_pause'].clear(); current_song_time_seconds = min_next_note_time
-                    song_time_at_last_event = current_song_time_seconds; real_ticks_at_last_event = pygame.time.get_ticks()
-        elif current_mode == APP_MODES['PRESENTATION']:
-            for note_info_pres in song_data:
-                key_type_pres, key_idx_pres = get_key_type_and_index_for_midi(note_info_pres['midi_note'], KEYBOARD_START_MIDI_NOTE, NUM_WHITE_KEYS, NUM_BLACK_KEYS)
-                if key_type_pres is None: continue
-                if not note_info_pres['played'] and note_info_pres['start_time'] <= current_song_time_seconds:
-                    if key_type_pres == 'white': white_key_pressed_states[key_idx_pres] = True
-                    elif key_type_pres == 'black': black_key_pressed_states[key_idx_pres] = True
-                    if note_info_pres['midi_note'] in midi_to_sound_map and midi_to_sound_map[note_info_pres['midi_note']]: midi_to_sound_map[note_info_pres['midi_note']].play()
-                    note_info_pres['played'] = True
-                note_end_time_pres = note_info_pres['start_time'] + note_info_pres['duration']
-                if note_info_pres['played'] and note_end_time_pres <= current_song_time_seconds:
-                    if key_type_pres == 'white': white_key_pressed_states[key_idx_pres] = False
-                    elif key_type_pres == 'black': black_key_pressed_states[key_idx_pres] = False
-
-    screen.fill(BACKGROUND_COLOR)
-    draw_stars(screen, stars)
-    draw_control_panel(screen, control_panel_buttons, sliders_list, progress_bar_props,
+                chord_idx = learning_mode_state['chord_cursor']
+                if chord_idx < len(song_chords) and song_chords.starts[chord_idx] <= current_song_time_seconds:
+                    learning_mode_state['paused_at_time'] = song_chords.starts[chord_idx]; learning_mode_state['notes_at_pause'] = song_chords.note_range(chord_idx)
+                    learning_mode_state['expected_midi_in_pause'] = song_chords.pitch_sets[chord_idx]
+                    learning_mode_state['correctly_pressed_midi_in_pause'].clear(); current_song_time_seconds = song_chords.starts[chord_idx]
+                    song_time_at_last_event = current_song_time_seconds; real_time_at_last_event = time.perf_counter()
+        elif current_mode == APP_MODES['PRESENTATION']: advance_presentation_to(current_song_time_seconds)
+def advance_presentation_to(time_sec, play_notes=True):
+    # Only the events that came due since the last call are touched; held_counts keeps a key down while any
+    # note of its pitch is still sounding. play_notes=False moves the keys without sounding them (offline rendering).
+    first_event, last_event = song_timeline.advance(time_sec)
+    held_counts = song_timeline.held_counts
+    for event_idx in range(first_event, last_event):
+        midi_note_pres = song_timeline.pitches[event_idx]; note_idx_pres = song_timeline.note_indices[event_idx]
+        if song_timeline.is_note_on[event_idx]:
+            held_counts[midi_note_pres] += 1; song_notes.set_played(note_idx_pres)
+            if play_notes: synth.note_on(midi_note_pres, song_notes.velocities[note_idx_pres])  # Sounds even when the note is off the visible keys
+            if held_counts[midi_note_pres] == 1: set_key_pressed(song_timeline.key_types[event_idx], song_timeline.key_indices[event_idx], True)
+        elif held_counts[midi_note_pres] > 0:
+            held_counts[midi_note_pres] -= 1
+            if held_counts[midi_note_pres] == 0:
+                if play_notes: synth.note_off(midi_note_pres)
+                set_key_pressed(song_timeline.key_types[event_idx], song_timeline.key_indices[event_idx], False)
+def draw_background(surface):
+    surface.fill(BACKGROUND_COLOR)
+    draw_stars(surface, stars)
+    frame_dirty_rects.extend(BACKGROUND_DIRTY_RECTS)
+def draw_control_panel_stage(surface):
+    draw_control_panel(surface, control_panel_buttons, sliders_list, progress_bar_props,
                        current_mode, APP_MODES, pygame.mouse.get_pos(),
-                       current_song_time_seconds, total_song_duration_seconds, base_bpm,
+                       current_song_time_seconds, total_song_duration_seconds,
                        dragging_tempo_slider, dragging_volume_slider)
+def draw_piano_roll(surface, build_budget_ms=DEFAULT_BUILD_BUDGET_MS):
+    global piano_roll_tiles
     if current_mode == APP_MODES['PRESENTATION'] or current_mode == APP_MODES['LEARNING']:
         time_for_roll = learning_mode_state['paused_at_time'] if current_mode == APP_MODES['LEARNING'] and learning_mode_state['paused_at_time'] is not None else current_song_time_seconds
+        pixels_per_second = layout.pixels_per_second; roll_top_y = layout.piano_roll_top_y; roll_bottom_y = layout.piano_roll_bottom_y
         if pixels_per_second > 0:
-            for note in song_data:
-                note_end_time = note['start_time'] + note['duration']
-                if note['start_time'] < time_for_roll + PIANO_ROLL_LOOKAHEAD_SECONDS and note_end_time > time_for_roll:
-                    x_center = get_x_for_midi_note(note['midi_note'], KEYBOARD_START_MIDI_NOTE, NUM_WHITE_KEYS, white_key_width)
-                    if x_center is None: continue
-                    semitone = note['midi_note'] % 12; white_note_semitones = [0, 2, 4, 5, 7, 9, 11]; is_white_note = semitone in white_note_semitones
-                    rect_width = white_key_width * NOTE_RECT_WIDTH_WHITE_RATIO if is_white_note else black_key_width * NOTE_RECT_WIDTH_BLACK_RATIO
-                    rect_left_x = x_center - (rect_width / 2); time_offset_sec_roll = note['start_time'] - time_for_roll; y_offset_px_roll = time_offset_sec_roll * pixels_per_second
-                    note_bottom_y_on_roll = PIANO_ROLL_BOTTOM_Y - y_offset_px_roll; note_height_px = note['duration'] * px_per_sec; note_top_y_on_roll = note_bottom_y_on_roll - note_height_px
-                    visible_top_y = max(note_top_y_on_roll, PIANO_ROLL_TOP_Y); visible_bottom_y = min(note_bottom_y_on_roll, PIANO_ROLL_BOTTOM_Y); visible_height = visible_bottom_y - visible_top_y
-                    if visible_height > 0: note_rect = pygame.Rect(rect_left_x, visible_top_y, rect_width, visible_height); pygame.draw.rect(screen, NOTE_RECT_COLOR, note_rect); pygame.draw.rect(screen, NOTE_RECT_BORDER_COLOR, note_rect, 1)
-    draw_piano(screen, white_key_pressed_states, black_key_pressed_states)
-    manage_shockwaves(screen, active_shockwaves, pygame.time.get_ticks(), KEYBOARD_RENDER_AREA_RECT) # Added this call
-    if feedback_flash_info['key_midi'] is not None and feedback_flash_info['end_time_ms'] > pygame.time.get_ticks():
-        flash_info = feedback_flash_info; key_type_f, key_idx_f = get_key_type_and_index_for_midi(flash_info['key_midi'], KEYBOARD_START_MIDI_NOTE, NUM_WHITE_KEYS, NUM_BLACK_KEYS)
-        if key_type_f is not None:
-            key_center_x_f = get_x_for_midi_note(flash_info['key_midi'], KEYBOARD_START_MIDI_NOTE, NUM_WHITE_KEYS, white_key_width)
-            if key_center_x_f is not None:
-                flash_rect_f = None
-                if key_type_f == 'white': flash_rect_f = pygame.Rect(key_center_x_f - white_key_width/2, WINDOW_HEIGHT - keyboard_height, white_key_width, white_key_height)
-                elif key_type_f == 'black': flash_rect_f = pygame.Rect(key_center_x_f - black_key_width/2, WINDOW_HEIGHT - keyboard_height, black_key_width, black_key_height)
-                if flash_rect_f: flash_surface_f = pygame.Surface(flash_rect_f.size, pygame.SRCALPHA); flash_surface_f.fill((*flash_info['color'], 128)); screen.blit(flash_surface_f, flash_rect_f.topleft)
-        else: feedback_flash_info['key_midi'] = None
+            if piano_roll_tiles is None: piano_roll_tiles = PianoRollTiles(song_notes, keyboard_geometry, pixels_per_second, PIANO_ROLL_SECONDS_ON_SCREEN, NOTE_RECT_COLOR, NOTE_RECT_BORDER_COLOR)
+            piano_roll_tiles.draw(surface, time_for_roll, roll_top_y, roll_bottom_y, build_budget_ms)
+def active_flash_rect():
+    # Key rect of the feedback flash still showing, or None
+    if feedback_flash_info['key_midi'] is None or feedback_flash_info['end_time_ms'] <= pygame.time.get_ticks(): return None
+    return keyboard_geometry.key_rects[feedback_flash_info['key_midi']]
+def draw_overlays(surface):
+    flash_rect_f = active_flash_rect()
+    if flash_rect_f: mark_overlay(flash_rect_f); flash_surface_f = ui_surface_cache.filled_surface(flash_rect_f.size, (*feedback_flash_info['color'], FEEDBACK_FLASH_ALPHA)); surface.blit(flash_surface_f, flash_rect_f.topleft)
     else: feedback_flash_info['key_midi'] = None
     if mode_switch_confirm_active:
-        overlay_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA); overlay_surface.fill((0, 0, 0, 180)); screen.blit(overlay_surface, (0,0))
+        overlay_surface = ui_surface_cache.filled_surface(layout.size, CONFIRM_OVERLAY_RGBA); surface.blit(overlay_surface, (0,0)); mark_overlay(surface.get_rect())
         target_mode_name = "Presentation" if target_mode_on_confirm == APP_MODES['PRESENTATION'] else "Learning"
         prompts = [f"Switch to {target_mode_name} Mode?", "Reset song (R) or Continue current position (C)?", "Press Esc to Cancel."]
-        text_y_start = WINDOW_HEIGHT // 2 - 50
+        text_y_start = layout.height // 2 - 50
         for i_prompt, prompt_text in enumerate(prompts):
-            surf = control_panel_font.render(prompt_text, True, WHITE); rect = surf.get_rect(center=(WINDOW_WIDTH // 2, text_y_start + i_prompt * 30)); screen.blit(surf, rect)
-    pygame.display.flip()
-    clock.tick(30)
-pygame.quit()
-sys.exit()
+            surf = ui_surface_cache.render_text(control_panel_font, prompt_text, WHITE); rect = surf.get_rect(center=(layout.width // 2, text_y_start + i_prompt * 30)); surface.blit(surf, rect)
+# Frame profiler: F3 toggles the per-stage timing overlay, F4 writes a Chrome trace of the recorded frames and F5
+# runs cProfile over the next PIANO_PROFILE_FRAMES frames. Stages are only timed while the overlay is shown or a capture runs.
+PROFILE_OUTPUT_DIR = os.environ.get('PIANO_PROFILE_DIR', '.')
+PROFILE_CAPTURE_FRAMES = int(os.environ.get('PIANO_PROFILE_FRAMES', 300))
+PROFILER_OVERLAY_REFRESH_MS = 250; PROFILER_OVERLAY_RGBA = (0, 0, 0, 170)
+frame_profiler = FrameProfiler()
+profiler_overlay_visible = os.environ.get('PIANO_PROFILE', '0') not in ('', '0'); profiler_overlay_surface = None; profiler_overlay_refresh_ms = 0
+profiler_font = None  # Created the first time the overlay is shown
+def profile_output_path(prefix, extension):
+    os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+    return os.path.join(PROFILE_OUTPUT_DIR, time.strftime(f'{prefix}-%Y%m%d-%H%M%S.{extension}'))
+def handle_profiler_key(key):
+    global profiler_overlay_visible, profiler_overlay_surface
+    if key == pygame.K_F3: profiler_overlay_visible = not profiler_overlay_visible; profiler_overlay_surface = None
+    elif key == pygame.K_F4:
+        if frame_profiler.frame_count: print(f"Frame trace written to {frame_profiler.export_chrome_trace(profile_output_path('frame-trace', 'json'))}")
+        else: print("No frames profiled yet; press F3 to start timing stages.")
+    elif key == pygame.K_F5:
+        if frame_profiler.capture_cprofile(PROFILE_CAPTURE_FRAMES, profile_output_path('frame-profile', 'prof')): print(f"Profiling the next {PROFILE_CAPTURE_FRAMES} frames with cProfile...")
+def is_profiling():
+    return profiler_overlay_visible or frame_profiler.capturing_cprofile
+def draw_profiler_overlay(surface):
+    global profiler_overlay_surface, profiler_overlay_refresh_ms, profiler_font
+    if not profiler_overlay_visible: return
+    now_ms = pygame.time.get_ticks()
+    if profiler_overlay_surface is None or now_ms >= profiler_overlay_refresh_ms:  # Re-rendered a few times a second, not every frame
+        if profiler_font is None: profiler_font = pygame.font.Font(None, 20)
+        profiler_overlay_surface = frame_profiler.render_overlay(profiler_font, WHITE, PROFILER_OVERLAY_RGBA); profiler_overlay_refresh_ms = now_ms + PROFILER_OVERLAY_REFRESH_MS
+    overlay_rect = profiler_overlay_surface.get_rect(topright=(layout.width - 10, 10))
+    surface.blit(profiler_overlay_surface, overlay_rect); mark_overlay(overlay_rect)
+def _call_stage(stage_name, stage_func, *args):
+    return stage_func(*args)
+def run_frame(events, dt_ms, run_stage=_call_stage):
+    # One iteration of the main loop split into named stages; run_stage lets callers wrap each stage (e.g. for timing).
+    run_stage('events', handle_events, events)
+    run_stage('stars', update_stars, stars, dt_ms)
+    run_stage('playback', update_playback)
+    run_stage('background', draw_background, screen)
+    run_stage('control_panel', draw_control_panel_stage, screen)
+    run_stage('piano_roll', draw_piano_roll, screen)
+    run_stage('piano', draw_piano, screen, white_key_pressed_states, black_key_pressed_states)
+    run_stage('shockwaves', draw_shockwaves, screen)
+    run_stage('overlays', draw_overlays, screen)
+    draw_profiler_overlay(screen)
+    run_stage('flip', present_frame)
+def is_idle():
+    # Nothing but the starfield would change without input: no playback (a learning-mode wait freezes the song clock),
+    # effects, flashes or sounding notes.
+    return (song_playback_status != 'PLAYING' or learning_mode_state['paused_at_time'] is not None) and not shockwave_pool.live_count and feedback_flash_info['key_midi'] is None and synth.is_silent
+frame_scheduler = FrameScheduler(TARGET_FPS); running = True
+def main():
+    global library_scan_job
+    # The first frame is drawn before any song or library work is queued, so the window is never blank while loading.
+    run_frame([], 0); note_startup('first_frame_ms')
+    if len(sys.argv) > 1: open_song_file(sys.argv[1])
+    if song_library is not None: library_scan_job = asset_loader.submit('song library', song_library.scan)
+    open_midi_keyboard(os.environ.get('PIANO_MIDI_INPUT', ''))
+    while running:
+        idle = is_idle()
+        events = frame_scheduler.begin_frame(idle)
+        if is_profiling(): frame_profiler.begin_frame(); run_frame(events, frame_scheduler.dt_ms, frame_profiler.run_stage); frame_profiler.end_frame()
+        else: run_frame(events, frame_scheduler.dt_ms)
+        frame_scheduler.end_frame(idle)
+    finish_take(wait=True)
+    if midi_input is not None: midi_input.close()
+    synth.stop(); pygame.quit()
+    sys.exit()
+if __name__ == "__main__":
+    main()
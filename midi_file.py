@@ -0,0 +1,90 @@
+import struct
+from array import array
+
+from note_store import NoteStore
+from tempo_map import TempoMap
+
+PARSER_VERSION = 1  # Bump when parsing changes the notes a file yields; keys the song cache
+
+
+class MidiFileError(ValueError):
+    pass
+
+
+def _read_varlen(data, pos):
+    value = 0
+    while True:
+        if pos >= len(data): raise MidiFileError("Truncated variable-length quantity")
+        byte = data[pos]; pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80: return value, pos
+
+
+def _read_chunk_header(f):
+    header = f.read(8)
+    if len(header) < 8: return None, 0
+    return struct.unpack('>4sI', header)
+
+
+def _scan_track(data, on_ticks, off_ticks, pitches, velocities, tempo_changes):
+    # Walks one MTrk chunk event by event, appending finished notes straight into the column arrays.
+    pos = 0; tick = 0; running_status = 0; open_notes = {}
+    length = len(data)
+    while pos < length:
+        delta = data[pos]  # Single-byte deltas dominate real files, so skip the varlen call for them
+        if delta < 0x80: pos += 1
+        else: delta, pos = _read_varlen(data, pos)
+        tick += delta
+        if pos >= length: raise MidiFileError("Truncated track event")
+        status = data[pos]
+        if status == 0xFF:
+            if pos + 1 >= length: raise MidiFileError("Truncated meta event")
+            meta_type = data[pos + 1]; meta_len, pos = _read_varlen(data, pos + 2)
+            if pos + meta_len > length: raise MidiFileError("Truncated meta event")
+            if meta_type == 0x51 and meta_len == 3: tempo_changes.append((tick, (data[pos] << 16) | (data[pos + 1] << 8) | data[pos + 2]))
+            pos += meta_len; running_status = 0
+            if meta_type == 0x2F: break
+            continue
+        if status == 0xF0 or status == 0xF7:
+            sysex_len, pos = _read_varlen(data, pos + 1); pos += sysex_len; running_status = 0
+            continue
+        if status & 0x80: running_status = status; pos += 1
+        elif not running_status: raise MidiFileError(f"Data byte 0x{status:02X} without running status")
+        kind = running_status & 0xF0
+        if kind == 0xC0 or kind == 0xD0: pos += 1; continue
+        if pos + 1 >= length: raise MidiFileError("Truncated channel event")
+        note = data[pos]; velocity = data[pos + 1]; pos += 2
+        if kind == 0x90 and velocity > 0:
+            open_notes.setdefault(((running_status & 0x0F) << 7) | note, []).append((tick, velocity))
+        elif kind == 0x80 or kind == 0x90:
+            pending = open_notes.get(((running_status & 0x0F) << 7) | note)
+            if pending:
+                start_tick, start_velocity = pending.pop(0)
+                on_ticks.append(start_tick); off_ticks.append(tick); pitches.append(note); velocities.append(start_velocity)
+    for key, pending in open_notes.items():  # Notes never released are closed at the end of the track
+        for start_tick, start_velocity in pending:
+            on_ticks.append(start_tick); off_ticks.append(tick); pitches.append(key & 0x7F); velocities.append(start_velocity)
+
+
+def load_midi_file(path):
+    on_ticks = array('q'); off_ticks = array('q'); pitches = array('B'); velocities = array('B'); tempo_changes = []
+    with open(path, 'rb') as f:
+        chunk_id, length = _read_chunk_header(f)
+        if chunk_id != b'MThd' or length < 6: raise MidiFileError(f"{path} is not a Standard MIDI File")
+        header = f.read(length)
+        if len(header) < 6: raise MidiFileError("Truncated MThd chunk")
+        file_format, num_tracks, division = struct.unpack('>HHH', header[:6])
+        if file_format not in (0, 1): raise MidiFileError(f"Unsupported SMF format {file_format}")
+        if division == 0: raise MidiFileError("Invalid time division 0")
+        if division & 0x8000 and not division & 0xFF: raise MidiFileError("Invalid SMPTE time division: 0 ticks per frame")
+        tracks_read = 0
+        while tracks_read < num_tracks:
+            chunk_id, length = _read_chunk_header(f)
+            if chunk_id is None: break
+            data = f.read(length)
+            if chunk_id != b'MTrk': continue  # Unknown chunk types must be skipped per the SMF spec
+            _scan_track(data, on_ticks, off_ticks, pitches, velocities, tempo_changes); tracks_read += 1
+    tempo_map = TempoMap.from_smf(division, tempo_changes); tick_to_seconds = tempo_map.tick_to_seconds
+    starts = array('d', map(tick_to_seconds, on_ticks))
+    durations = array('d', (tick_to_seconds(off) - start for off, start in zip(off_ticks, starts)))
+    return NoteStore.from_columns(pitches, starts, durations, velocities, tempo_map)
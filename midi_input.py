@@ -0,0 +1,166 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+from midi_file import load_midi_file
+
+NOTE_ON = 0x90
+NOTE_OFF = 0x80
+MAX_EVENTS_PER_READ = 1024  # pygame.midi read size; a poll keeps reading until the device buffer is empty
+POLL_INTERVAL_SEC = 0.001
+SCRIPT_EXTENSIONS = ('.mid', '.midi')
+
+
+class MidiInputError(Exception):
+    pass
+
+
+def decode_midi_message(status, data1, data2):
+    # (midi_note, is_press, velocity) for note messages on any channel, None for everything else; note-on with velocity 0 is a release
+    kind = status & 0xF0
+    if kind == NOTE_ON: return data1, data2 > 0, data2
+    if kind == NOTE_OFF: return data1, False, 0
+    return None
+
+
+class MidiInput:
+    # Note input from a device. A reader thread drains the device in one batched read every millisecond and queues
+    # (timestamp_ms, midi_note, is_press, velocity) stamped by the device itself, on the clock now_ms() reads, so an
+    # event's age is known however late the main loop picks it up. on_input() is called from the reader thread after
+    # each batch (e.g. to wake an idle main loop); poll() hands the queued events to the main thread.
+    # Subclasses implement now_ms(), read_batch() and close_device().
+
+    def __init__(self, name):
+        self.name = name; self.on_input = None
+        self._events = collections.deque(); self._thread = None; self._running = False
+
+    def start(self, on_input=None):
+        self.on_input = on_input; self._running = True
+        self._thread = threading.Thread(target=self._run, name='midi-input', daemon=True); self._thread.start()
+
+    def _run(self):
+        while self._running:
+            batch = self.read_batch()
+            if not batch: time.sleep(POLL_INTERVAL_SEC); continue
+            self._events.extend(batch)
+            if self.on_input is not None: self.on_input()
+
+    def poll(self):
+        events = []
+        while self._events: events.append(self._events.popleft())
+        return events
+
+    def close(self):
+        self._running = False
+        if self._thread is not None: self._thread.join(); self._thread = None
+        self.close_device()
+
+
+class PygameMidiInput(MidiInput):
+    # A hardware port through pygame.midi (PortMidi); timestamps are PortMidi milliseconds.
+
+    def __init__(self, device_id=None):
+        import pygame.midi
+        self._midi = pygame.midi; pygame.midi.init()
+        if device_id is None: device_id = pygame.midi.get_default_input_id()
+        device_info = pygame.midi.get_device_info(device_id) if device_id >= 0 else None
+        if device_info is None or not device_info[2]: pygame.midi.quit(); raise MidiInputError(f"No MIDI input device {device_id if device_id >= 0 else 'found'}")
+        super().__init__(device_info[1].decode(errors='replace'))
+        self._device = pygame.midi.Input(device_id, MAX_EVENTS_PER_READ)
+
+    def now_ms(self):
+        return self._midi.time()
+
+    def read_batch(self):
+        batch = []
+        while self._device.poll():
+            for (status, data1, data2, _), timestamp_ms in self._device.read(MAX_EVENTS_PER_READ):
+                message = decode_midi_message(status, data1, data2)
+                if message is not None: batch.append((timestamp_ms, *message))
+        return batch
+
+    def close_device(self):
+        self._device.close(); self._midi.quit()
+
+
+class ScriptedMidiInput(MidiInput):
+    # A fake device replaying (offset_ms, midi_note, is_press, velocity) events, offsets counted from start(). Each
+    # event is stamped with its scheduled time, as a device would stamp the moment of the key press.
+
+    def __init__(self, events, name='script'):
+        super().__init__(name)
+        self.script = sorted(events, key=lambda event: event[0]); self._next_idx = 0; self._start_sec = time.perf_counter()
+
+    @classmethod
+    def from_file(cls, path):
+        # A MIDI file is played as a flawless performance of its notes; anything else is read as a text script.
+        if path.lower().endswith(SCRIPT_EXTENSIONS):
+            notes = load_midi_file(path); events = []
+            for start, duration, pitch, velocity in zip(notes.starts, notes.durations, notes.pitches, notes.velocities):
+                events.append((start * 1000.0, pitch, True, velocity)); events.append(((start + duration) * 1000.0, pitch, False, 0))
+            return cls(events, os.path.basename(path))
+        with open(path) as script_file: return cls(parse_midi_script(script_file), os.path.basename(path))
+
+    def start(self, on_input=None):
+        self._next_idx = 0; self._start_sec = time.perf_counter()
+        super().start(on_input)
+
+    def now_ms(self):
+        return (time.perf_counter() - self._start_sec) * 1000.0
+
+    def read_batch(self):
+        now_ms = self.now_ms(); first_idx = self._next_idx; script = self.script
+        while self._next_idx < len(script) and script[self._next_idx][0] <= now_ms: self._next_idx += 1
+        return script[first_idx:self._next_idx]
+
+    def close_device(self):
+        pass
+
+
+def parse_midi_script(lines):
+    # One event per line: "<ms> <midi note> on|off [velocity]"; blank lines and '#' comments are skipped.
+    events = []
+    for line_no, line in enumerate(lines, 1):
+        fields = line.split('#', 1)[0].split()
+        if not fields: continue
+        try:
+            offset_ms = float(fields[0]); midi_note = int(fields[1]); action = fields[2].lower()
+            if action not in ('on', 'off') or not 0 <= midi_note <= 127: raise ValueError(line.strip())
+            velocity = int(fields[3]) if len(fields) > 3 else 100
+        except (IndexError, ValueError): raise MidiInputError(f"Bad MIDI script line {line_no}: {line.strip()}")
+        events.append((offset_ms, midi_note, action == 'on', velocity if action == 'on' else 0))
+    return events
+
+
+def open_midi_input(spec):
+    # PIANO_MIDI_INPUT: 'default' or a device number opens a pygame.midi port; a file path replays a script or MIDI file.
+    spec = spec.strip()
+    if not spec: return None
+    if spec.lower() == 'default': return PygameMidiInput()
+    if spec.isdigit(): return PygameMidiInput(int(spec))
+    return ScriptedMidiInput.from_file(spec)
+
+
+def list_input_devices():
+    import pygame.midi
+    pygame.midi.init()
+    devices = []
+    for device_id in range(pygame.midi.get_count()):
+        interface, name, is_input, is_output, is_open = pygame.midi.get_device_info(device_id)
+        if is_input: devices.append((device_id, name.decode(errors='replace')))
+    pygame.midi.quit()
+    return devices
+
+
+def main():
+    # python midi_input.py: lists the MIDI input devices PIANO_MIDI_INPUT can name.
+    devices = list_input_devices()
+    for device_id, name in devices: print(f"{device_id}: {name}")
+    if not devices: print("No MIDI input devices found")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from tempo_map import TempoMap
+
+DEFAULT_VELOCITY = 100
+
+
+class NoteStore:
+    # Columnar note storage: parallel arrays sorted by (start, pitch) plus a played bitset.
+    # Scalar reads from array.array return plain ints/floats, so per-frame loops stay cheap.
+    __slots__ = ('pitches', 'starts', 'durations', 'velocities', 'total_duration', 'max_note_duration', 'tempo_map', '_played')
+
+    def __init__(self, pitches, starts, durations, velocities, total_duration=None, max_note_duration=None, tempo_map=None):
+        # Columns must already be sorted by start time; use from_columns() for unsorted input. Any indexable
+        # columns work (arrays, or memoryviews over a cached song); the two totals can be passed in to skip the scan.
+        # tempo_map: the song's TempoMap (beats and BPM at a song time); songs without one get a constant 120 BPM.
+        self.pitches = pitches; self.starts = starts; self.durations = durations; self.velocities = velocities
+        self.tempo_map = tempo_map if tempo_map is not None else TempoMap.constant()
+        self.total_duration = max((s + d for s, d in zip(starts, durations)), default=0.0) if total_duration is None else total_duration
+        self.max_note_duration = max(durations, default=0.0) if max_note_duration is None else max_note_duration
+        self._played = bytearray((len(pitches) + 7) >> 3)
+
+    @classmethod
+    def from_columns(cls, pitches, starts, durations, velocities, tempo_map=None):
+        order = sorted(range(len(starts)), key=lambda i: (starts[i], pitches[i]))
+        return cls(array('B', (pitches[i] for i in order)), array('d', (starts[i] for i in order)),
+                   array('d', (durations[i] for i in order)), array('B', (velocities[i] for i in order)), tempo_map=tempo_map)
+
+    @classmethod
+    def from_dicts(cls, notes_list):
+        # Accepts the legacy song_data format: [{'midi_note', 'start_time', 'duration'}, ...]
+        return cls.from_columns([n['midi_note'] for n in notes_list], [float(n.get('start_time', 0)) for n in notes_list],
+                                [float(n.get('duration', 0)) for n in notes_list], [n.get('velocity', DEFAULT_VELOCITY) for n in notes_list])
+
+    def __len__(self):
+        return len(self.pitches)
+
+    def end_time(self, index):
+        return self.starts[index] + self.durations[index]
+
+    def is_played(self, index):
+        return (self._played[index >> 3] >> (index & 7)) & 1 == 1
+
+    def set_played(self, index, played=True):
+        if played: self._played[index >> 3] |= 1 << (index & 7)
+        else: self._played[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def reset_played(self):
+        self._played[:] = bytes(len(self._played))
+
+    def first_unplayed(self, from_index=0):
+        # Notes are sorted by start time, so the first unplayed note is also the earliest one.
+        played = self._played; n = len(self.pitches); byte_idx = from_index >> 3
+        while byte_idx < len(played) and played[byte_idx] == 0xFF: byte_idx += 1
+        for i in range(max(from_index, byte_idx << 3), n):
+            if not (played[i >> 3] >> (i & 7)) & 1: return i
+        return None
+
+    def index_at_or_after(self, time_sec):
+        return bisect_left(self.starts, time_sec)
+
+    def index_after(self, time_sec):
+        return bisect_right(self.starts, time_sec)
+
+    def visible_range(self, start_sec, end_sec):
+        # Index range of notes that may overlap [start_sec, end_sec); callers still check end_time > start_sec.
+        lo = bisect_left(self.starts, start_sec - self.max_note_duration)
+        return lo, bisect_left(self.starts, end_sec, lo)
@@ -0,0 +1,108 @@
+import math
+import time
+from collections import OrderedDict
+
+import pygame
+
+TILE_COLOR_KEY = (255, 0, 255)
+DEFAULT_MAX_TILES = 4
+MAX_TILE_HEIGHT = 512  # Caps a tile at width x 512 px (7.5 MB at 3840 wide) however tall the roll is
+DEFAULT_BUILD_BUDGET_MS = 1.0
+
+
+class PianoRollTiles:
+    # The song's note lane pre-rendered into tall transparent tiles, each covering a fixed span of song time, kept in
+    # a small LRU so a frame blits the tiles under the visible window instead of drawing every visible note.
+    # Tiles are built a few notes at a time within a per-frame time budget, starting with the one about to scroll
+    # in, so crossing a tile boundary never renders a whole tile in one frame. A visible tile that is not built yet
+    # (after a seek) has just its visible notes drawn directly until it is. Build a new instance when the song,
+    # keyboard or scale changes.
+
+    def __init__(self, note_store, geometry, pixels_per_second, tile_seconds, note_color, border_color, max_tiles=DEFAULT_MAX_TILES):
+        self.note_store = note_store; self.geometry = geometry; self.pixels_per_second = pixels_per_second
+        self.note_color = note_color; self.border_color = border_color
+        # Whole-pixel tile height; the time span is derived from it so tile boundaries fall exactly on pixel rows
+        requested_height = max(1, int(round(tile_seconds * pixels_per_second)))
+        self.tile_height = min(requested_height, MAX_TILE_HEIGHT); self.tile_seconds = self.tile_height / pixels_per_second
+        self.tile_width = geometry.area_rect.right
+        # Capped tiles are shorter than the window, so keep enough for the window plus the next one
+        self.max_tiles = max(max_tiles, math.ceil(requested_height / self.tile_height) + 2)
+        self._tiles = OrderedDict(); self._pending = None
+
+    def _draw_notes(self, target, tile_idx, y_offset, first_idx, last_idx, deadline=None):
+        # Draws the tile's notes [first_idx, last_idx) with the tile's top row at the whole-pixel y_offset; stops at
+        # deadline (a perf_counter time) and returns the first note index not drawn.
+        tile_start = tile_idx * self.tile_seconds; tile_height = self.tile_height
+        notes = self.note_store; starts = notes.starts; durations = notes.durations; pitches = notes.pitches
+        key_types = self.geometry.key_types; x_centers = self.geometry.x_centers; note_widths = self.geometry.note_widths
+        px_per_sec = self.pixels_per_second; note_color = self.note_color; border_color = self.border_color; draw_rect = pygame.draw.rect
+        for i in range(first_idx, last_idx):
+            if deadline is not None and not (i - first_idx) & 15 and time.perf_counter() > deadline: return i
+            note_start = starts[i]; note_duration = durations[i]; midi_note = pitches[i]
+            if note_start + note_duration <= tile_start or not key_types[midi_note]: continue
+            # Song time runs upwards: a tile's bottom row is its start time. Notes crossing a tile edge are drawn
+            # whole and clipped, so each tile shows its part of the note.
+            # The rect is rounded in tile coordinates and then moved by the whole-pixel y_offset, so drawing straight
+            # onto the screen gives exactly the pixels of the built tile
+            rect_width = note_widths[midi_note]; note_bottom_y = tile_height - (note_start - tile_start) * px_per_sec; note_height = note_duration * px_per_sec
+            note_rect = pygame.Rect(x_centers[midi_note] - rect_width / 2, note_bottom_y - note_height, rect_width, note_height); note_rect.move_ip(0, y_offset)
+            # Outline as four filled rects: draw.rect(width=1) fills a rect the clip cuts to 2 rows, so its pixels would
+            # depend on the clip (tile edge or screen slice)
+            left, top, width, height = note_rect
+            if not height: continue  # Under a pixel tall: nothing to draw
+            draw_rect(target, note_color, note_rect); draw_rect(target, border_color, (left, top, width, 1)); draw_rect(target, border_color, (left, top + height - 1, width, 1))
+            draw_rect(target, border_color, (left, top, 1, height)); draw_rect(target, border_color, (left + width - 1, top, 1, height))
+        return last_idx
+
+    def _note_range(self, tile_idx):
+        tile_start = tile_idx * self.tile_seconds
+        return self.note_store.visible_range(tile_start, tile_start + self.tile_seconds)
+
+    def build_step(self, tile_idx, deadline):
+        # Advances the build of tile_idx until deadline; True once the tile is cached.
+        if tile_idx in self._tiles: return True
+        if self._pending is None or self._pending[0] != tile_idx:
+            tile = pygame.Surface((self.tile_width, self.tile_height))
+            if pygame.display.get_surface(): tile = tile.convert()
+            tile.fill(TILE_COLOR_KEY)
+            self._pending = [tile_idx, tile, *self._note_range(tile_idx)]
+        pending = self._pending; _, tile, next_idx, last_idx = pending
+        pending[2] = next_idx = self._draw_notes(tile, tile_idx, 0, next_idx, last_idx, deadline)
+        if next_idx < last_idx: return False
+        tile.set_colorkey(TILE_COLOR_KEY, pygame.RLEACCEL)  # Mostly transparent: run-length encoding makes the blit cheap
+        self._tiles[tile_idx] = tile; self._pending = None
+        if len(self._tiles) > self.max_tiles: self._tiles.popitem(last=False)
+        return True
+
+    def tile(self, tile_idx):
+        # The tile, built in full now if it is not cached yet
+        if not self.build_step(tile_idx, None): return None
+        self._tiles.move_to_end(tile_idx)
+        return self._tiles[tile_idx]
+
+    def draw(self, surface, time_sec, roll_top_y, roll_bottom_y, build_budget_ms=DEFAULT_BUILD_BUDGET_MS):
+        # Blits the song time window [time_sec, time_sec + visible seconds], with time_sec on roll_bottom_y, then
+        # spends up to build_budget_ms building the missing visible tiles and the next one to scroll in.
+        # build_budget_ms None builds every visible tile in full first (offline rendering, independent of timing).
+        if roll_bottom_y <= roll_top_y: return
+        px_per_sec = self.pixels_per_second
+        end_time = time_sec + (roll_bottom_y - roll_top_y) / px_per_sec
+        first_tile = max(0, math.floor(time_sec / self.tile_seconds)); next_tile = math.floor(end_time / self.tile_seconds) + 1
+        wanted = []
+        for tile_idx in range(first_tile, next_tile):
+            tile_top_y = round(roll_bottom_y - ((tile_idx + 1) * self.tile_seconds - time_sec) * px_per_sec)
+            src_top = max(0, roll_top_y - tile_top_y); src_bottom = min(self.tile_height, roll_bottom_y - tile_top_y)
+            if src_bottom <= src_top: continue
+            tile = self._tiles.get(tile_idx) if build_budget_ms is not None else self.tile(tile_idx)
+            if tile is not None:
+                self._tiles.move_to_end(tile_idx)
+                surface.blit(tile, (0, tile_top_y + src_top), pygame.Rect(0, src_top, self.tile_width, src_bottom - src_top))
+            else:  # Not built yet: draw this frame's visible slice of it straight onto the surface
+                previous_clip = surface.get_clip(); surface.set_clip(pygame.Rect(0, tile_top_y + src_top, self.tile_width, src_bottom - src_top))
+                self._draw_notes(surface, tile_idx, tile_top_y, *self._note_range(tile_idx))
+                surface.set_clip(previous_clip); wanted.append(tile_idx)
+        if build_budget_ms is None: return
+        wanted.append(next_tile)
+        deadline = time.perf_counter() + build_budget_ms / 1000.0
+        for tile_idx in wanted:
+            if not self.build_step(tile_idx, deadline): break
@@ -0,0 +1,81 @@
+import io
+import queue
+import struct
+import threading
+import time
+from array import array
+
+# One record per key press/release: song time (s), perf_counter_ns at capture, MIDI note, 1 = press / 0 = release
+RECORD_FORMAT = struct.Struct('<dqBB')
+LOG_MAGIC = b'PKREC\x00\x01\n'  # File signature plus format version
+DEFAULT_CAPACITY = 4096
+DEFAULT_FLUSH_BATCH = 256
+
+
+class PerformanceRecorder:
+    # Captures key presses/releases into a preallocated ring buffer. Full batches are handed to a writer thread,
+    # so recording a key costs one struct.pack_into on the main thread and disk writes never stall a frame.
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, flush_batch=DEFAULT_FLUSH_BATCH):
+        self.capacity = capacity; self.flush_batch = min(flush_batch, capacity)
+        self._ring = bytearray(capacity * RECORD_FORMAT.size)
+        self._written = 0; self._flushed = 0  # Monotonic record counts; pending records are ring[_flushed:_written]
+        self._batches = None; self._writer = None
+        self.path = None; self.recording = False
+
+    def start(self, path=None):
+        # Begins a take logged to path, or kept in memory when path is None.
+        if self.recording: self.stop()
+        self._written = 0; self._flushed = 0; self.path = path
+        self._batches = queue.Queue()
+        sink = open(path, 'wb') if path else io.BytesIO()
+        sink.write(LOG_MAGIC)
+        self._writer = threading.Thread(target=self._write_batches, args=(sink, self._batches), name='performance-log-writer', daemon=True)
+        self._writer.start(); self.recording = True
+
+    def record(self, song_time_sec, midi_note, is_press):
+        if not self.recording: return
+        if self._written - self._flushed == self.capacity: self.flush()  # Never overwrite records the writer has not seen
+        RECORD_FORMAT.pack_into(self._ring, (self._written % self.capacity) * RECORD_FORMAT.size, song_time_sec, time.perf_counter_ns(), midi_note, 1 if is_press else 0)
+        self._written += 1
+        if self._written - self._flushed >= self.flush_batch: self.flush()
+
+    def flush(self):
+        pending = self._written - self._flushed
+        if not pending or self._batches is None: return
+        start = (self._flushed % self.capacity) * RECORD_FORMAT.size; end = start + pending * RECORD_FORMAT.size
+        if end <= len(self._ring): batch = bytes(self._ring[start:end])
+        else: batch = bytes(self._ring[start:]) + bytes(self._ring[:end - len(self._ring)])  # Pending records wrap around the ring
+        self._batches.put(batch); self._flushed = self._written
+
+    def stop(self, on_complete=None, wait=False):
+        # Ends the take. on_complete(log_bytes) runs on the writer thread once everything is written, so callers can
+        # score the take there instead of in the render loop. wait=True blocks until that is done (e.g. on exit).
+        if not self.recording: return
+        self.flush(); self._batches.put((None, on_complete)); self.recording = False
+        if wait: self._writer.join()
+        self._batches = None; self._writer = None
+
+    @staticmethod
+    def _write_batches(sink, batches):
+        while True:
+            batch = batches.get()
+            if isinstance(batch, tuple): break
+            sink.write(batch)
+        _, on_complete = batch
+        log_bytes = sink.getvalue() if isinstance(sink, io.BytesIO) else None
+        sink.close()
+        if on_complete is not None:
+            if log_bytes is None:
+                with open(sink.name, 'rb') as log_file: log_bytes = log_file.read()
+            on_complete(log_bytes)
+
+
+def read_performance_log(log_bytes):
+    # Returns (song_times, capture_ns, pitches, is_press) columns from a log file's bytes.
+    if log_bytes[:len(LOG_MAGIC)] != LOG_MAGIC: raise ValueError("Not a performance log")
+    song_times = array('d'); capture_ns = array('q'); pitches = array('B'); is_press = array('b')
+    body = memoryview(log_bytes)[len(LOG_MAGIC):]
+    for song_time, captured, pitch, pressed in RECORD_FORMAT.iter_unpack(body[:len(body) - len(body) % RECORD_FORMAT.size]):
+        song_times.append(song_time); capture_ns.append(captured); pitches.append(pitch); is_press.append(pressed)
+    return song_times, capture_ns, pitches, is_press
@@ -0,0 +1,58 @@
+import math
+from array import array
+from bisect import bisect_left
+
+from recorder import read_performance_log
+
+DEFAULT_ON_TIME_SEC = 0.08  # Presses within this of a note's start count as on time
+DEFAULT_MATCH_WINDOW_SEC = 0.4  # Presses further than this from any note of their pitch are extra
+NOTE_ON_TIME = 0; NOTE_EARLY = 1; NOTE_LATE = 2; NOTE_MISSED = 3
+RESULT_NAMES = ('on_time', 'early', 'late', 'missed')
+
+
+def score_performance(note_store, chords, press_times, press_pitches, start_time=0.0, end_time=math.inf, on_time_sec=DEFAULT_ON_TIME_SEC, match_window_sec=DEFAULT_MATCH_WINDOW_SEC):
+    # Aligns presses (song-time seconds) to the notes starting in [start_time, end_time). Notes are taken in song
+    # order and each claims the closest unused press of its pitch within match_window_sec; unclaimed presses are extra.
+    presses_by_pitch = {}
+    for press_idx in sorted(range(len(press_times)), key=press_times.__getitem__):
+        times, indices = presses_by_pitch.setdefault(press_pitches[press_idx], (array('d'), array('i')))
+        times.append(press_times[press_idx]); indices.append(press_idx)
+    used = bytearray(len(press_times))
+    first_note = note_store.index_at_or_after(start_time); last_note = note_store.index_at_or_after(end_time)
+    offsets = array('d', [math.nan]) * (last_note - first_note); results = bytearray(last_note - first_note)
+    counts = dict.fromkeys(RESULT_NAMES + ('extra',), 0)
+    for i in range(first_note, last_note):
+        note_start = note_store.starts[i]; best = None
+        times, indices = presses_by_pitch.get(note_store.pitches[i], ((), ()))
+        for k in range(bisect_left(times, note_start - match_window_sec), len(times)):
+            if times[k] > note_start + match_window_sec: break
+            if not used[indices[k]] and (best is None or abs(times[k] - note_start) < abs(times[best] - note_start)): best = k
+        if best is None: result = NOTE_MISSED
+        else:
+            used[indices[best]] = 1; offset = offsets[i - first_note] = times[best] - note_start
+            result = NOTE_ON_TIME if abs(offset) <= on_time_sec else (NOTE_EARLY if offset < 0 else NOTE_LATE)
+        results[i - first_note] = result; counts[RESULT_NAMES[result]] += 1
+    counts['extra'] = len(press_times) - sum(used)
+    # Chord latency: how long after the chord's start its last matched note was pressed
+    first_chord = chords.index_at_or_after(start_time); last_chord = chords.index_at_or_after(end_time)
+    chord_latencies = array('d', [math.nan]) * (last_chord - first_chord)
+    for c in range(first_chord, last_chord):
+        press_delays = [note_store.starts[i] + offsets[i - first_note] - chords.starts[c] for i in chords.note_range(c) if first_note <= i < last_note and not math.isnan(offsets[i - first_note])]
+        if press_delays: chord_latencies[c - first_chord] = max(press_delays)
+    matched = [abs(offset) for offset in offsets if not math.isnan(offset)]
+    return {'first_note': first_note, 'note_offsets': offsets, 'note_results': results, 'counts': counts,
+            'first_chord': first_chord, 'chord_latencies': chord_latencies, 'mean_abs_offset': sum(matched) / len(matched) if matched else math.nan}
+
+
+def score_performance_log(note_store, chords, log_bytes, start_time=0.0, end_time=math.inf):
+    song_times, _, pitches, is_press = read_performance_log(log_bytes)
+    presses = [i for i in range(len(song_times)) if is_press[i]]
+    return score_performance(note_store, chords, array('d', (song_times[i] for i in presses)), array('B', (pitches[i] for i in presses)), start_time, end_time)
+
+
+def format_score_summary(score):
+    counts = score['counts']; latencies = [latency for latency in score['chord_latencies'] if not math.isnan(latency)]
+    summary = f"{counts['on_time']} on time, {counts['early']} early, {counts['late']} late, {counts['missed']} missed, {counts['extra']} extra"
+    if not math.isnan(score['mean_abs_offset']): summary += f"; mean timing error {score['mean_abs_offset'] * 1000:.0f} ms"
+    if latencies: summary += f"; mean chord latency {sum(latencies) / len(latencies) * 1000:.0f} ms"
+    return summary
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+from midi_file import load_midi_file, PARSER_VERSION
+from note_store import NoteStore
+from tempo_map import TempoMap
+from timeline import ChordSteps, compile_note_events, DEFAULT_CHORD_TOLERANCE_SEC
+
+SONG_EXTENSIONS = ('.mid', '.midi')
+CACHE_DIR_NAME = '.pianokeys-cache'
+INDEX_FILE_NAME = 'index.json'
+INDEX_VERSION = 1
+BLOB_MAGIC = b'PKSONG\x00\x02'  # File signature plus blob layout version
+# magic, parser version, note count, chord count, tempo segment count, total duration, longest note, chord tolerance, ticks per beat
+BLOB_HEADER = struct.Struct('<8sIIIIdddd')
+# Column sections in file order as (name, typecode, length in units of (notes, chords, tempo segments, sentinel)); 8-byte columns first so every section stays aligned
+BLOB_SECTIONS = (('starts', 'd', (1, 0, 0, 0)), ('durations', 'd', (1, 0, 0, 0)), ('event_times', 'd', (2, 0, 0, 0)), ('chord_starts', 'd', (0, 1, 0, 0)),
+                 ('tempo_ticks', 'q', (0, 0, 1, 0)), ('tempo_seconds', 'd', (0, 0, 1, 0)), ('tempo_seconds_per_tick', 'd', (0, 0, 1, 0)),
+                 ('event_note_indices', 'i', (2, 0, 0, 0)), ('chord_first_notes', 'i', (0, 1, 0, 1)),
+                 ('pitches', 'B', (1, 0, 0, 0)), ('velocities', 'B', (1, 0, 0, 0)), ('event_is_note_on', 'b', (2, 0, 0, 0)))
+ITEM_SIZES = {'d': 8, 'q': 8, 'i': 4, 'B': 1, 'b': 1}
+
+
+class LibrarySong:
+    # A parsed song ready for set_song: notes, learning-mode chords and compiled note events. The app's loader adds
+    # the fitted key range and an EventTimeline for it, so nothing proportional to the song runs on the UI thread.
+
+    def __init__(self, title, notes, chords, note_events):
+        self.title = title; self.notes = notes; self.chords = chords; self.note_events = note_events
+        self.key_range = None; self.timeline = None
+
+
+def _section_layout(num_notes, num_chords, num_tempo_segments):
+    offset = BLOB_HEADER.size; layout = []
+    for name, typecode, (per_note, per_chord, per_tempo_segment, extra) in BLOB_SECTIONS:
+        count = per_note * num_notes + per_chord * num_chords + per_tempo_segment * num_tempo_segments + extra
+        layout.append((name, typecode, offset, count)); offset += count * ITEM_SIZES[typecode]
+        offset = (offset + 7) & ~7
+    return layout
+
+
+def write_song_blob(path, notes, chords, note_events):
+    # Written to a temporary name and renamed, so a reader never maps a half-written blob.
+    event_times, event_is_note_on, event_note_indices = note_events; tempo_map = notes.tempo_map
+    columns = {'starts': notes.starts, 'durations': notes.durations, 'pitches': notes.pitches, 'velocities': notes.velocities,
+               'event_times': event_times, 'event_is_note_on': event_is_note_on, 'event_note_indices': event_note_indices,
+               'chord_starts': chords.starts, 'chord_first_notes': chords.first_notes,
+               'tempo_ticks': tempo_map.seg_ticks, 'tempo_seconds': tempo_map.seg_seconds, 'tempo_seconds_per_tick': tempo_map.seg_seconds_per_tick}
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as blob_file:
+        blob_file.write(BLOB_HEADER.pack(BLOB_MAGIC, PARSER_VERSION, len(notes), len(chords), len(tempo_map), notes.total_duration, notes.max_note_duration,
+                                         chords.tolerance_sec, tempo_map.ticks_per_beat))
+        for name, typecode, offset, count in _section_layout(len(notes), len(chords), len(tempo_map)):
+            blob_file.write(bytes(offset - blob_file.tell()))  # Alignment padding
+            blob_file.write(memoryview(columns[name]).cast('B'))
+    os.replace(temp_path, path)
+
+
+def map_song_blob(path, title, chord_tolerance_sec):
+    # Maps a blob read-only; columns are memoryviews into the mapping, so nothing is parsed or copied.
+    with open(path, 'rb') as blob_file: mapping = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+    # Truncated or foreign files are rejected as ValueError (before any view pins the mapping), so callers re-parse
+    if len(mapping) < BLOB_HEADER.size: mapping.close(); raise ValueError(f"{path} is too short for a song cache blob")
+    magic, parser_version, num_notes, num_chords, num_tempo_segments, total_duration, max_note_duration, tolerance_sec, ticks_per_beat = BLOB_HEADER.unpack_from(mapping)
+    if magic != BLOB_MAGIC or parser_version != PARSER_VERSION: mapping.close(); raise ValueError(f"{path} is not a current song cache blob")
+    layout = _section_layout(num_notes, num_chords, num_tempo_segments)
+    _, last_typecode, last_offset, last_count = layout[-1]
+    if last_offset + last_count * ITEM_SIZES[last_typecode] > len(mapping): mapping.close(); raise ValueError(f"{path} is a truncated song cache blob")
+    view = memoryview(mapping); columns = {}
+    for name, typecode, offset, count in layout:
+        columns[name] = view[offset:offset + count * ITEM_SIZES[typecode]].cast(typecode)
+    tempo_map = TempoMap(ticks_per_beat, columns['tempo_ticks'], columns['tempo_seconds'], columns['tempo_seconds_per_tick'])
+    notes = NoteStore(columns['pitches'], columns['starts'], columns['durations'], columns['velocities'], total_duration, max_note_duration, tempo_map)
+    if tolerance_sec == chord_tolerance_sec: chords = ChordSteps.from_columns(notes, tolerance_sec, columns['chord_starts'], columns['chord_first_notes'])
+    else: chords = ChordSteps(notes, chord_tolerance_sec)
+    return LibrarySong(title, notes, chords, (columns['event_times'], columns['event_is_note_on'], columns['event_note_indices']))
+
+
+def hash_file(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as song_file:
+        for block in iter(lambda: song_file.read(1 << 20), b''): digest.update(block)
+    return digest.hexdigest()
+
+
+class SongLibrary:
+    # Songs in a directory tree, listed from a small JSON index and opened from memory-mapped blobs of parsed
+    # notes. Blobs are keyed by content hash and parser version, so renamed or duplicated files share one blob
+    # and a parser change invalidates every blob at once. Files are only parsed the first time they are opened.
+
+    def __init__(self, song_dir, cache_dir=None, chord_tolerance_sec=DEFAULT_CHORD_TOLERANCE_SEC):
+        self.song_dir = os.path.abspath(song_dir)
+        self.cache_dir = cache_dir or os.path.join(self.song_dir, CACHE_DIR_NAME)
+        self.index_path = os.path.join(self.cache_dir, INDEX_FILE_NAME)
+        self.chord_tolerance_sec = chord_tolerance_sec
+        self.entries = []; self._index_dirty = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as index_file: index = json.load(index_file)
+        except (OSError, ValueError): return {}
+        if index.get('version') != INDEX_VERSION: return {}
+        return {entry['path']: entry for entry in index.get('songs', [])}
+
+    def save_index(self):
+        if not self._index_dirty: return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as index_file: json.dump({'version': INDEX_VERSION, 'songs': self.entries}, index_file)
+        os.replace(temp_path, self.index_path); self._index_dirty = False
+
+    def scan(self):
+        # Lists the song files. Only a stat per file: entries whose size and mtime match the index keep their hash
+        # and metadata, new or changed files get theirs when first opened.
+        indexed = self._load_index(); entries = []
+        for root, dir_names, file_names in os.walk(self.song_dir):
+            dir_names[:] = sorted(name for name in dir_names if not name.startswith('.'))
+            for file_name in sorted(file_names):
+                if not file_name.lower().endswith(SONG_EXTENSIONS): continue
+                file_path = os.path.join(root, file_name); stat = os.stat(file_path)
+                rel_path = os.path.relpath(file_path, self.song_dir).replace(os.sep, '/')
+                entry = indexed.get(rel_path)
+                if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns or entry.get('parser_version') != PARSER_VERSION:
+                    entry = {'path': rel_path, 'title': os.path.splitext(file_name)[0], 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                             'hash': None, 'parser_version': PARSER_VERSION, 'num_notes': None, 'duration': None}
+                    self._index_dirty = True
+                entries.append(entry)
+        if len(entries) != len(indexed): self._index_dirty = True
+        self.entries = entries; self.save_index()
+        return entries
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.cache_dir, f'{content_hash}-p{PARSER_VERSION}.pksong')
+
+    def open_file(self, path, title=None, content_hash=None):
+        # Any MIDI file, through the cache: mapped if a blob for its content exists, else parsed once and stored.
+        content_hash = content_hash or hash_file(path); blob_path = self._blob_path(content_hash)
+        title = title or os.path.splitext(os.path.basename(path))[0]
+        try: return map_song_blob(blob_path, title, self.chord_tolerance_sec)
+        except (OSError, ValueError): pass
+        notes = load_midi_file(path); chords = ChordSteps(notes, self.chord_tolerance_sec); note_events = compile_note_events(notes)
+        try: os.makedirs(self.cache_dir, exist_ok=True); write_song_blob(blob_path, notes, chords, note_events)
+        except OSError as e: print(f"Could not cache {path}: {e}")
+        return LibrarySong(title, notes, chords, note_events)
+
+    def open_song(self, entry_idx):
+        entry = self.entries[entry_idx]
+        song_path = os.path.join(self.song_dir, entry['path'])
+        if entry['hash'] is None: entry['hash'] = hash_file(song_path); self._index_dirty = True
+        song = self.open_file(song_path, entry['title'], entry['hash'])
+        if entry['num_notes'] is None:
+            entry['num_notes'] = len(song.notes); entry['duration'] = song.notes.total_duration; self._index_dirty = True
+        self.save_index()
+        return song
+
+    def build_cache(self):
+        # Parses and caches every song not cached yet; returns the number of songs that failed to parse.
+        failures = 0
+        for entry_idx, entry in enumerate(self.entries):
+            try: self.open_song(entry_idx)
+            except Exception as e: print(f"Skipping {entry['path']}: {e}"); failures += 1  # One bad file must not end the batch
+        return failures
+
+
+def main(argv=None):
+    # python song_library.py SONG_DIR: indexes the directory and pre-builds the cache for every song.
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1: print("usage: python song_library.py SONG_DIR"); return 2
+    library = SongLibrary(argv[0]); library.scan()
+    failures = library.build_cache()
+    print(f"{len(library) - failures} of {len(library)} songs cached in {library.cache_dir}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import math
+
+import numpy as np
+import pygame
+
+STAR_DENSITY_MODES = {'classic': 100, 'dense': 5000, 'galaxy': 25000}
+SMALL_STAR_MIN_ALPHA = 0.5  # Sub-pixel stars are only drawn while they are in the bright half of their cycle
+
+
+def _circle_offsets(radius):
+    # Pixel offsets that pygame.draw.circle fills for this radius, so stamped stars look like the drawn ones.
+    size = radius * 2 + 3
+    stamp = pygame.Surface((size, size)); stamp.fill((0, 0, 0))
+    pygame.draw.circle(stamp, (255, 255, 255), (radius + 1, radius + 1), radius)
+    return [(x - radius - 1, y - radius - 1) for x in range(size) for y in range(size) if stamp.get_at((x, y))[0]]
+
+
+class Starfield:
+    # Twinkling background stars kept as NumPy columns; alphas are updated in one vectorised step and the
+    # stars are written straight into the target surface's pixels.
+
+    def __init__(self, num_stars, width, max_y, colors, seed=None):
+        rng = np.random.default_rng(seed)
+        self.x = rng.integers(0, width + 1, num_stars); self.y = rng.integers(0, max_y + 1, num_stars)
+        self.radius = rng.uniform(0.5, 1.5, num_stars)
+        self.base_colors = np.asarray(colors, dtype=np.float32)[rng.integers(0, len(colors), num_stars)]
+        self.cycle_duration = rng.uniform(2000, 5000, num_stars)
+        self.initial_cycle_time = np.fmod(rng.uniform(0, 5000, num_stars), self.cycle_duration); self.cycle_time = self.initial_cycle_time.copy()
+        self.alpha = np.zeros(num_stars)
+        self._phase_scale = (2 * math.pi) / self.cycle_duration
+        self._stamp_cache = {}
+
+    def __len__(self):
+        return len(self.x)
+
+    def update(self, dt_ms):
+        self.cycle_time += dt_ms; np.fmod(self.cycle_time, self.cycle_duration, out=self.cycle_time)
+        self._update_alpha()
+
+    def set_time(self, elapsed_ms):
+        # Twinkle state elapsed_ms after creation, independent of the frames in between (for deterministic rendering).
+        np.add(self.initial_cycle_time, elapsed_ms, out=self.cycle_time); np.fmod(self.cycle_time, self.cycle_duration, out=self.cycle_time)
+        self._update_alpha()
+
+    def _update_alpha(self):
+        np.multiply(self.cycle_time, self._phase_scale, out=self.alpha); np.sin(self.alpha, out=self.alpha)
+        self.alpha += 1.0; self.alpha *= 0.5
+
+    def _stamp_pixels(self, star_idx, offsets, width, height):
+        idx_parts = []; x_parts = []; y_parts = []
+        for dx, dy in offsets:
+            xs = self.x[star_idx] + dx; ys = self.y[star_idx] + dy
+            inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+            idx_parts.append(star_idx[inside]); x_parts.append(xs[inside]); y_parts.append(ys[inside])
+        return np.concatenate(idx_parts), np.concatenate(x_parts), np.concatenate(y_parts)
+
+    def _stamps_for(self, surface_size):
+        # Star indices and clipped pixel coordinates for sub-pixel stars and for circle-stamped stars. Stars never
+        # move, so this only depends on the surface size.
+        stamps = self._stamp_cache.get(surface_size)
+        if stamps is None:
+            width, height = surface_size; int_radius = self.radius.astype(int)
+            small = self._stamp_pixels(np.flatnonzero(self.radius < 1), [(0, 0)], width, height)
+            big_parts = [self._stamp_pixels(np.flatnonzero(int_radius == r), _circle_offsets(r), width, height) for r in np.unique(int_radius[int_radius >= 1])]
+            big = tuple(np.concatenate(column) for column in zip(*big_parts)) if big_parts else (small[0][:0],) * 3
+            stamps = self._stamp_cache[surface_size] = (small, big)
+        return stamps
+
+    def _mapped_colors(self, surface):
+        # Packs every star colour into the surface's pixel format in one vectorised step (like Surface.map_rgb).
+        rgb = (self.base_colors * self.alpha[:, None]).astype(np.uint32)
+        shifts = surface.get_shifts(); losses = surface.get_losses(); masks = surface.get_masks()
+        mapped = np.full(len(rgb), masks[3], dtype=np.uint32)  # Opaque alpha, if the format has an alpha channel
+        for channel in range(3): mapped |= (rgb[:, channel] >> losses[channel]) << shifts[channel]
+        return mapped
+
+    def draw(self, surface):
+        if surface.get_bytesize() != 4:  # pixels2d writes 32-bit values; other formats take the slow path
+            return self._draw_per_star(surface, (self.base_colors * self.alpha[:, None]).astype(np.uint8))
+        mapped = self._mapped_colors(surface)
+        (small_idx, small_xs, small_ys), (big_idx, big_xs, big_ys) = self._stamps_for(surface.get_size())
+        pixels = pygame.surfarray.pixels2d(surface)
+        visible = self.alpha[small_idx] > SMALL_STAR_MIN_ALPHA
+        pixels[small_xs[visible], small_ys[visible]] = mapped[small_idx[visible]]
+        pixels[big_xs, big_ys] = mapped[big_idx]
+        del pixels  # Releases the surface lock before it is blitted
+
+    def _draw_per_star(self, surface, colors):
+        for i in range(len(self.x)):
+            color = tuple(int(c) for c in colors[i]); position = (int(self.x[i]), int(self.y[i]))
+            if self.radius[i] >= 1: pygame.draw.circle(surface, color, position, int(self.radius[i]))
+            elif self.alpha[i] > SMALL_STAR_MIN_ALPHA: surface.set_at(position, color)
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+
+import pygame
+
+DEFAULT_MAX_ENTRIES = 128
+
+
+class SurfaceCache:
+    # Bounded LRU of rendered surfaces (text captions, translucent fills) so steady-state frames reuse them
+    # instead of rasterising text or allocating surfaces again.
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0; self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get_or_create(self, key, create_func, *args):
+        surface = self._entries.get(key)
+        if surface is not None:
+            self._entries.move_to_end(key); self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self._entries[key] = create_func(*args)
+        if len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+        return surface
+
+    def render_text(self, font, text, color, antialias=True):
+        # The font object carries face and size, so it is part of the key along with text and colour.
+        return self._get_or_create(('text', font, text, tuple(color), antialias), font.render, text, antialias, color)
+
+    def filled_surface(self, size, rgba_color):
+        # Shared per-pixel-alpha fill (overlays, flashes); callers must treat it as read-only.
+        return self._get_or_create(('fill', tuple(size), tuple(rgba_color)), _create_filled_surface, size, rgba_color)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def _create_filled_surface(size, rgba_color):
+    surface = pygame.Surface(size, pygame.SRCALPHA)
+    surface.fill(rgba_color)
+    return surface
@@ -0,0 +1,195 @@
+import atexit
+import collections
+import threading
+import time
+
+import numpy as np
+import pygame
+
+try:
+    from pygame._sdl2 import audio as sdl2_audio
+except ImportError:  # Older pygame builds: fall back to queueing chunks on a mixer channel
+    sdl2_audio = None
+
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_BUFFER_SIZE = 512  # Frames per mix; smaller means lower latency and more callbacks
+DEFAULT_MAX_VOICES = 32
+TONE_SECONDS = 1.6
+ATTACK_SECONDS = 0.004
+RELEASE_SECONDS = 0.08
+HARMONIC_AMPLITUDES = (1.0, 0.45, 0.25, 0.12, 0.06, 0.03)
+VOICE_HEADROOM = 0.25  # Per-voice gain so a handful of simultaneous notes do not clip
+MIXER_CHUNK_BUFFERS = 4  # Mixer fallback: each queued chunk holds this many mix buffers, so thread wake-up jitter does not underrun
+MIXER_CHUNK_RING = 3  # One chunk playing, one queued, one being filled
+
+
+def midi_to_frequency(midi_note):
+    return 440.0 * 2.0 ** ((midi_note - 69) / 12.0)
+
+
+def render_tone(midi_note, sample_rate=DEFAULT_SAMPLE_RATE, duration_seconds=TONE_SECONDS):
+    # Plucked/piano-like tone: a few harmonics under an exponential decay that is faster for higher notes.
+    t = np.arange(int(sample_rate * duration_seconds), dtype=np.float32) / sample_rate
+    frequency = midi_to_frequency(midi_note); nyquist = sample_rate / 2.0
+    tone = np.zeros_like(t)
+    for harmonic, amplitude in enumerate(HARMONIC_AMPLITUDES, start=1):
+        if frequency * harmonic >= nyquist: break
+        tone += amplitude * np.exp(-t * (1.5 + 0.8 * harmonic)) * np.sin(2 * np.pi * frequency * harmonic * t)
+    tone *= np.exp(-t * (0.5 + frequency / 800.0)).astype(np.float32)
+    attack = max(1, int(sample_rate * ATTACK_SECONDS)); tone[:attack] *= np.linspace(0.0, 1.0, attack, dtype=np.float32)
+    tone[-attack:] *= np.linspace(1.0, 0.0, attack, dtype=np.float32)
+    return (tone / max(1e-6, float(np.abs(tone).max()))).astype(np.float32)
+
+
+class Synth:
+    # Fixed-size voice bank mixed into one stream. Note commands from the main thread go through a deque and are
+    # applied by the mixing side, so the audio path needs no locks. Tone buffers are rendered once per pitch.
+
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, buffer_size=DEFAULT_BUFFER_SIZE, max_voices=DEFAULT_MAX_VOICES):
+        self.sample_rate = sample_rate; self.buffer_size = buffer_size; self.max_voices = max_voices
+        self.master_gain = 1.0
+        self._tones = {}
+        self._commands = collections.deque()
+        self.voice_pitch = [-1] * max_voices; self.voice_pos = [0] * max_voices; self.voice_gain = [0.0] * max_voices
+        self.voice_release_pos = [-1] * max_voices; self.voice_started = [0] * max_voices; self._voice_counter = 0
+        release_len = max(1, int(sample_rate * RELEASE_SECONDS))
+        self._release_ramp = np.concatenate((np.linspace(1.0, 0.0, release_len, dtype=np.float32), np.zeros(buffer_size, dtype=np.float32)))
+        self._release_len = release_len
+        self._mix_buffer = np.zeros(buffer_size, dtype=np.float32); self._voice_buffer = np.zeros(buffer_size, dtype=np.float32)
+        self._device = None; self._channel = None; self._feeder = None
+
+    # --- main-thread API ---
+    def note_on(self, midi_note, velocity=100):
+        self.tone(midi_note)  # Render on the caller's thread so the mixer never has to
+        self._commands.append((True, midi_note, velocity))
+
+    def note_off(self, midi_note):
+        self._commands.append((False, midi_note, 0))
+
+    def all_notes_off(self):
+        self._commands.append((False, None, 0))
+
+    def set_master_gain(self, gain):
+        self.master_gain = max(0.0, min(1.0, gain))
+
+    def tone(self, midi_note):
+        tone = self._tones.get(midi_note)
+        if tone is None: tone = self._tones[midi_note] = render_tone(midi_note, self.sample_rate)
+        return tone
+
+    def prerender(self, midi_notes):
+        for midi_note in midi_notes: self.tone(midi_note)
+
+    @property
+    def active_voices(self):
+        return sum(1 for pitch in self.voice_pitch if pitch >= 0)
+
+    @property
+    def is_silent(self):
+        return not self._commands and all(pitch < 0 for pitch in self.voice_pitch)
+
+    # --- mixing side ---
+    def _start_voice(self, midi_note, velocity):
+        # First free slot; with every voice busy the longest-sounding one is stolen. Scans the preallocated slot
+        # arrays in place, so a note-on allocates nothing on the audio thread.
+        voice_pitch = self.voice_pitch; voice_started = self.voice_started; voice = -1; oldest = 0
+        for v in range(self.max_voices):
+            if voice_pitch[v] < 0: voice = v; break
+            if voice_started[v] < voice_started[oldest]: oldest = v
+        if voice < 0: voice = oldest
+        self._voice_counter += 1
+        self.voice_pitch[voice] = midi_note; self.voice_pos[voice] = 0; self.voice_release_pos[voice] = -1
+        self.voice_gain[voice] = VOICE_HEADROOM * velocity / 127.0; self.voice_started[voice] = self._voice_counter
+
+    def _release_voices(self, midi_note):
+        # midi_note None releases every sounding voice
+        for v in range(self.max_voices):
+            if self.voice_pitch[v] >= 0 and (midi_note is None or self.voice_pitch[v] == midi_note) and self.voice_release_pos[v] < 0: self.voice_release_pos[v] = 0
+
+    def _apply_commands(self):
+        commands = self._commands
+        while commands:
+            is_note_on, midi_note, velocity = commands.popleft()
+            if is_note_on: self._start_voice(midi_note, velocity)
+            else: self._release_voices(midi_note)
+
+    def mix(self, num_frames=None):
+        # Returns a mono float32 block of num_frames samples (a view into a reused buffer).
+        num_frames = num_frames or self.buffer_size
+        if len(self._mix_buffer) < num_frames: self._mix_buffer = np.zeros(num_frames, dtype=np.float32); self._voice_buffer = np.zeros(num_frames, dtype=np.float32)
+        if len(self._release_ramp) < self._release_len + num_frames: self._release_ramp = np.concatenate((self._release_ramp[:self._release_len], np.zeros(num_frames, dtype=np.float32)))
+        self._apply_commands()
+        out = self._mix_buffer[:num_frames]; out.fill(0.0); voice_buffer = self._voice_buffer
+        for v in range(self.max_voices):
+            midi_note = self.voice_pitch[v]
+            if midi_note < 0: continue
+            tone = self._tones[midi_note]; pos = self.voice_pos[v]
+            n = min(num_frames, len(tone) - pos); finished = pos + n >= len(tone)
+            release_pos = self.voice_release_pos[v]
+            if release_pos >= 0: n = min(n, self._release_len - release_pos)
+            voice_out = voice_buffer[:n]; np.multiply(tone[pos:pos + n], self.voice_gain[v], out=voice_out)  # In place: no per-voice temporaries
+            if release_pos >= 0:
+                voice_out *= self._release_ramp[release_pos:release_pos + n]
+                self.voice_release_pos[v] = release_pos + n
+                finished = finished or release_pos + n >= self._release_len
+            out[:n] += voice_out
+            self.voice_pos[v] = pos + n
+            if finished: self.voice_pitch[v] = -1
+        out *= self.master_gain
+        np.clip(out, -1.0, 1.0, out=out)
+        return out
+
+    # --- output stream ---
+    def start(self):
+        # Opens one output stream: an SDL audio device driven by a callback when available, otherwise a mixer
+        # channel fed by a feeder thread. Returns False when no audio output could be opened.
+        if sdl2_audio is not None:
+            try:
+                device_names = sdl2_audio.get_audio_device_names(False)  # pygame needs an explicit name for the default device
+                self._device = sdl2_audio.AudioDevice(devicename=device_names[0] if device_names else '', iscapture=False, frequency=self.sample_rate, audioformat=sdl2_audio.AUDIO_F32,
+                                                      numchannels=2, chunksize=self.buffer_size, allowed_changes=0, callback=self._audio_callback)
+                self._device.pause(0)
+                return True
+            except (pygame.error, sdl2_audio.error) as e:
+                print(f"Could not open synth audio device, falling back to the mixer: {e}"); self._device = None
+        if pygame.mixer.get_init():
+            self.sample_rate, _, channels = pygame.mixer.get_init(); self._tones.clear()
+            chunk_frames = self.buffer_size * MIXER_CHUNK_BUFFERS
+            # Preallocated chunk sounds, written in place through sndarray views and reused round-robin
+            self._mixer_chunks = [pygame.mixer.Sound(buffer=bytes(chunk_frames * channels * abs(pygame.mixer.get_init()[1]) // 8)) for _ in range(MIXER_CHUNK_RING)]
+            self._mixer_samples = [pygame.sndarray.samples(chunk) for chunk in self._mixer_chunks]
+            sample_type = self._mixer_samples[0].dtype
+            self._mixer_scale = float(np.iinfo(sample_type).max) if np.issubdtype(sample_type, np.integer) else 1.0
+            self._mixer_block = np.zeros(chunk_frames, dtype=np.float32)
+            self._channel = pygame.mixer.find_channel(True)
+            self._feeder = threading.Thread(target=self._feed_mixer, args=(self._channel, chunk_frames), name='synth-mixer-feeder', daemon=True); self._feeder.start()
+            atexit.register(self.stop)  # The feeder must not outlive pygame: interpreter shutdown with it running crashes
+            return True
+        return False
+
+    def _audio_callback(self, audio_device, audio_memoryview):
+        stereo = np.frombuffer(audio_memoryview, dtype=np.float32)
+        mono = self.mix(len(stereo) // 2)
+        stereo[0::2] = mono; stereo[1::2] = mono
+
+    def _feed_mixer(self, channel, chunk_frames):
+        # Mixer fallback: keeps the channel's queue slot filled from its own thread, independent of the frame rate.
+        chunk_sec = chunk_frames / self.sample_rate; next_chunk = 0
+        while self._channel is channel:
+            if channel.get_queue() is None:
+                np.multiply(self.mix(chunk_frames), self._mixer_scale, out=self._mixer_block)
+                samples = self._mixer_samples[next_chunk]
+                if samples.ndim == 1: samples[:] = self._mixer_block
+                else:
+                    for c in range(samples.shape[1]): samples[:, c] = self._mixer_block
+                chunk = self._mixer_chunks[next_chunk]; next_chunk = (next_chunk + 1) % MIXER_CHUNK_RING
+                if channel.get_busy(): channel.queue(chunk)
+                else: channel.play(chunk)
+            time.sleep(chunk_sec / 4)
+
+    def stop(self):
+        if self._device is not None: self._device.pause(1); self._device.close(); self._device = None
+        if self._channel is not None:
+            channel = self._channel; self._channel = None  # Ends the feeder loop
+            if self._feeder is not None: self._feeder.join(); self._feeder = None
+            channel.stop()
@@ -0,0 +1,57 @@
+from array import array
+from bisect import bisect_right
+
+DEFAULT_US_PER_BEAT = 500000  # 120 BPM, the SMF default until the first tempo event
+DEFAULT_TICKS_PER_BEAT = 480
+
+
+class TempoMap:
+    # A song's tempo as sorted constant-tempo segments: start tick, start second (cumulative offset of all earlier
+    # segments) and seconds per tick. Conversions bisect the segment starts, so they stay O(log n) with thousands of
+    # tempo events. The map holds the song's own timing; a playback tempo multiplier is applied by callers (real
+    # seconds = song seconds / multiplier, BPM * multiplier) so changing it never rebuilds the map.
+
+    def __init__(self, ticks_per_beat, seg_ticks, seg_seconds, seg_seconds_per_tick):
+        # Segments start at tick 0 and are sorted; seg_* may be arrays or memoryviews over a cached song
+        self.ticks_per_beat = ticks_per_beat
+        self.seg_ticks = seg_ticks; self.seg_seconds = seg_seconds; self.seg_seconds_per_tick = seg_seconds_per_tick
+
+    @classmethod
+    def constant(cls, bpm=60e6 / DEFAULT_US_PER_BEAT, ticks_per_beat=DEFAULT_TICKS_PER_BEAT):
+        return cls(ticks_per_beat, array('q', [0]), array('d', [0.0]), array('d', [60.0 / bpm / ticks_per_beat]))
+
+    @classmethod
+    def from_smf(cls, division, tempo_changes):
+        # division from the MThd header; tempo_changes as (tick, microseconds per quarter note) in any order
+        if division & 0x8000:  # SMPTE timing: frames per second and ticks per frame, tempo events do not apply
+            frames_per_second = 256 - (division >> 8); ticks_per_frame = division & 0xFF
+            ticks_per_second = frames_per_second * ticks_per_frame
+            return cls(ticks_per_second * DEFAULT_US_PER_BEAT / 1e6, array('q', [0]), array('d', [0.0]), array('d', [1.0 / ticks_per_second]))
+        seg_ticks = array('q', [0]); seg_seconds = array('d', [0.0]); seg_spt = array('d', [DEFAULT_US_PER_BEAT / 1e6 / division])
+        for change_tick, us_per_quarter in sorted(tempo_changes, key=lambda change: change[0]):
+            spt = max(1, us_per_quarter) / 1e6 / division
+            if change_tick == seg_ticks[-1]: seg_spt[-1] = spt; continue
+            if spt == seg_spt[-1]: continue  # Repeated tempo events do not start a new segment
+            seg_seconds.append(seg_seconds[-1] + (change_tick - seg_ticks[-1]) * seg_spt[-1]); seg_ticks.append(change_tick); seg_spt.append(spt)
+        return cls(division, seg_ticks, seg_seconds, seg_spt)
+
+    def __len__(self):
+        return len(self.seg_ticks)
+
+    def tick_to_seconds(self, tick):
+        k = bisect_right(self.seg_ticks, tick) - 1
+        return self.seg_seconds[k] + (tick - self.seg_ticks[k]) * self.seg_seconds_per_tick[k]
+
+    def seconds_to_tick(self, time_sec):
+        k = max(0, bisect_right(self.seg_seconds, time_sec) - 1)
+        return self.seg_ticks[k] + (time_sec - self.seg_seconds[k]) / self.seg_seconds_per_tick[k]
+
+    def seconds_to_beats(self, time_sec):
+        return self.seconds_to_tick(time_sec) / self.ticks_per_beat
+
+    def beats_to_seconds(self, beats):
+        return self.tick_to_seconds(beats * self.ticks_per_beat)
+
+    def bpm_at(self, time_sec):
+        k = max(0, bisect_right(self.seg_seconds, time_sec) - 1)
+        return 60.0 / (self.seg_seconds_per_tick[k] * self.ticks_per_beat)
@@ -0,0 +1,64 @@
+import csv
+import json
+import os
+import struct
+
+from analyze_songs import analyze_catalogue, analyze_song, error_row, ResultWriter, RESULT_FIELDS
+
+
+def write_song(path):
+    # One-track file with a single one-beat C4
+    track = bytes([0x00, 0x90, 60, 100, 0x83, 0x60, 0x80, 60, 0, 0x00, 0xFF, 0x2F, 0x00])
+    path.write_bytes(b'MThd' + struct.pack('>IHHH', 6, 0, 1, 480) + b'MTrk' + struct.pack('>I', len(track)) + track)
+    return str(path)
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_resumed_writer_skips_analysed_and_failed_files(tmp_path):
+    song_path = write_song(tmp_path / 'song.mid'); bad_path = tmp_path / 'bad.mid'; bad_path.write_bytes(b'not midi')
+    results = tmp_path / 'results.jsonl'
+    writer = ResultWriter(str(results), 'jsonl')
+    writer.write(analyze_song(song_path)); writer.write(error_row(str(bad_path), ValueError('bad header'))); writer.close()
+    writer = ResultWriter(str(results), 'jsonl')
+    assert writer.is_done(song_path) and writer.is_done(str(bad_path))
+    assert not writer.is_done(str(tmp_path / 'missing.mid'))
+    writer.close()
+    stat = os.stat(song_path); os.utime(song_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert not ResultWriter(str(results), 'jsonl').is_done(song_path)  # A changed file is analysed again
+
+
+def test_trailing_partial_row_is_truncated_before_appending(tmp_path):
+    song_path = write_song(tmp_path / 'song.mid'); results = tmp_path / 'results.jsonl'
+    row = analyze_song(song_path)
+    results.write_text(json.dumps(row) + '\n' + json.dumps(row)[:20])
+    writer = ResultWriter(str(results), 'jsonl')
+    assert writer.is_done(song_path)
+    writer.write(error_row(song_path, RuntimeError('boom'))); writer.close()
+    rows = read_jsonl(results)
+    assert len(rows) == 2 and rows[1]['error'] == 'RuntimeError: boom'
+
+
+def test_csv_results_resume_with_one_header(tmp_path):
+    song_path = write_song(tmp_path / 'song.mid'); results = tmp_path / 'results.csv'
+    for _ in range(2):
+        writer = ResultWriter(str(results), 'csv')
+        if not writer.is_done(song_path): writer.write(analyze_song(song_path))
+        writer.close()
+    with open(results, newline='') as result_file: rows = list(csv.reader(result_file))
+    assert rows[0] == list(RESULT_FIELDS) and len(rows) == 2
+    assert rows[1][RESULT_FIELDS.index('num_notes')] == '1'
+
+
+def test_catalogue_run_resumes_without_rescanning(tmp_path):
+    songs = tmp_path / 'songs'; songs.mkdir()
+    write_song(songs / 'a.mid'); write_song(songs / 'b.MIDI'); (songs / 'c.mid').write_bytes(b'not midi'); (songs / 'notes.txt').write_text('')
+    results = tmp_path / 'results.jsonl'
+    assert analyze_catalogue([str(songs)], str(results), 'jsonl', (60, 83), 0.03, jobs=1) == (3, 1)
+    rows = {os.path.basename(row['path']): row for row in read_jsonl(results)}
+    assert sorted(rows) == ['a.mid', 'b.MIDI', 'c.mid']
+    assert rows['a.mid']['num_notes'] == 1 and rows['a.mid']['duration'] == 0.5 and rows['c.mid']['error']
+    assert analyze_catalogue([str(songs)], str(results), 'jsonl', (60, 83), 0.03, jobs=1) == (0, 0)
+    assert len(read_jsonl(results)) == 3
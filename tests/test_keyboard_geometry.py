@@ -0,0 +1,37 @@
+from keyboard_geometry import KeyboardGeometry, fit_key_range, parse_key_range, KEY_WHITE, KEY_BLACK, KEY_OFF_KEYBOARD
+
+
+def test_two_octave_tables_match_the_key_rects():
+    geometry = KeyboardGeometry(48, 71, (10, 300, 700, 100))
+    assert geometry.num_white_keys == 14 and geometry.num_black_keys == 10
+    assert geometry.white_key_width == 50 and geometry.black_key_width == 30 and geometry.black_key_height == 60
+    assert geometry.key_types[48] == KEY_WHITE and geometry.key_types[49] == KEY_BLACK and geometry.key_types[72] == KEY_OFF_KEYBOARD
+    assert not geometry.contains(47) and geometry.contains(71)
+    assert geometry.key_indices[52] == 2 and geometry.key_indices[54] == 2  # E3 is the third white key, F#3 the third black one
+    assert geometry.key_rects[48] == geometry.white_key_rects[0] == (10, 300, 50, 100)
+    assert geometry.key_rects[49] == geometry.black_key_rects[0] == (45, 300, 30, 60)  # Centred on the C3/D3 boundary
+    assert geometry.x_centers[48] == 35.0 and geometry.x_centers[49] == 60.0
+    assert geometry.note_widths[48] == 40.0 and geometry.note_widths[49] == 27.0
+
+
+def test_black_endpoints_are_widened_to_white_keys():
+    geometry = KeyboardGeometry(61, 70, (0, 0, 600, 80))
+    assert (geometry.first_midi_note, geometry.last_midi_note) == (60, 71)
+    assert geometry.num_white_keys == 7 and geometry.num_black_keys == 5
+    reversed_geometry = KeyboardGeometry(70, 61, (0, 0, 600, 80))  # Reversed bounds collapse to the lower note
+    assert (reversed_geometry.first_midi_note, reversed_geometry.last_midi_note) == (60, 62)
+
+
+def test_fit_key_range_covers_whole_octaves():
+    assert fit_key_range([]) == (60, 83)
+    assert fit_key_range([50, 90]) == (48, 95)
+    assert fit_key_range([10, 120]) == (21, 108)  # Clamped to A0-C8
+    assert fit_key_range([64], always_show=()) == (60, 71)
+
+
+def test_parse_key_range():
+    assert parse_key_range('auto') is None and parse_key_range('') is None
+    assert parse_key_range('88') == (21, 108) and parse_key_range(' Full ') == (21, 108)
+    assert parse_key_range('48-72') == (48, 72)
+    assert parse_key_range('49-70') == (48, 71)
+    assert parse_key_range('60') == (60, 60)
@@ -0,0 +1,67 @@
+import struct
+
+import pytest
+
+from midi_file import load_midi_file, MidiFileError
+
+
+def write_smf(path, track_events, division=480):
+    # One-track format 0 file; track_events is the raw MTrk body without the end-of-track event
+    track = bytes(track_events) + b'\x00\xFF\x2F\x00'
+    path.write_bytes(b'MThd' + struct.pack('>IHHH', 6, 0, 1, division) + b'MTrk' + struct.pack('>I', len(track)) + track)
+    return str(path)
+
+
+def note_tuples(notes):
+    return [(notes.pitches[i], notes.starts[i], notes.durations[i], notes.velocities[i]) for i in range(len(notes))]
+
+
+def test_running_status_and_note_on_velocity_zero(tmp_path):
+    # C4 on, then E4 on and both released with running status note-on velocity 0
+    events = [0x00, 0x90, 60, 100, 0x00, 64, 90, 0x83, 0x60, 60, 0, 0x00, 64, 0]
+    notes = load_midi_file(write_smf(tmp_path / 'running.mid', events))
+    assert note_tuples(notes) == [(60, 0.0, 0.5, 100), (64, 0.0, 0.5, 90)]
+
+
+def test_overlapping_notes_of_one_pitch_match_first_in_first_out(tmp_path):
+    # Two note-ons of C4 a beat apart, then two note-offs: the first release ends the first note
+    events = [0x00, 0x90, 60, 100, 0x83, 0x60, 0x90, 60, 50, 0x83, 0x60, 0x80, 60, 0, 0x83, 0x60, 0x80, 60, 0]
+    notes = load_midi_file(write_smf(tmp_path / 'overlap.mid', events))
+    assert note_tuples(notes) == [(60, 0.0, 1.0, 100), (60, 0.5, 1.0, 50)]
+
+
+def test_channels_are_matched_separately(tmp_path):
+    events = [0x00, 0x90, 60, 100, 0x00, 0x91, 60, 80, 0x83, 0x60, 0x81, 60, 0, 0x83, 0x60, 0x80, 60, 0]
+    notes = load_midi_file(write_smf(tmp_path / 'channels.mid', events))
+    assert sorted(note_tuples(notes)) == [(60, 0.0, 0.5, 80), (60, 0.0, 1.0, 100)]
+
+
+def test_tempo_meta_events_apply(tmp_path):
+    # 60 BPM from the start: a one-beat note lasts one second and the map keeps the tempo
+    events = [0x00, 0xFF, 0x51, 0x03, 0x0F, 0x42, 0x40, 0x00, 0x90, 62, 100, 0x83, 0x60, 0x80, 62, 0]
+    notes = load_midi_file(write_smf(tmp_path / 'tempo.mid', events))
+    assert note_tuples(notes) == [(62, 0.0, 1.0, 100)]
+    assert notes.tempo_map.bpm_at(0.0) == pytest.approx(60.0)
+
+
+def test_unreleased_notes_end_with_the_track(tmp_path):
+    events = [0x00, 0x90, 60, 100, 0x87, 0x40, 0xB0, 7, 100]
+    notes = load_midi_file(write_smf(tmp_path / 'unreleased.mid', events))
+    assert note_tuples(notes) == [(60, 0.0, 1.0, 100)]
+
+
+def test_data_byte_without_running_status_is_rejected(tmp_path):
+    with pytest.raises(MidiFileError):
+        load_midi_file(write_smf(tmp_path / 'bad.mid', [0x00, 60, 100]))
+
+
+def test_non_midi_file_is_rejected(tmp_path):
+    path = tmp_path / 'not.mid'; path.write_bytes(b'RIFF\x00\x00\x00\x00')
+    with pytest.raises(MidiFileError):
+        load_midi_file(str(path))
+
+
+def test_smpte_division_without_ticks_per_frame_is_rejected(tmp_path):
+    # -25 frames per second with 0 ticks per frame would divide by zero when building the tempo map
+    with pytest.raises(MidiFileError):
+        load_midi_file(write_smf(tmp_path / 'smpte.mid', [0x00, 0x90, 60, 100, 0x60, 0x80, 60, 0], division=0xE700))
@@ -0,0 +1,45 @@
+import threading
+import time
+
+import pytest
+
+from midi_input import decode_midi_message, MidiInputError, parse_midi_script, ScriptedMidiInput
+
+
+def test_parse_midi_script():
+    events = parse_midi_script(['# warm-up', '', '0 60 on', '250.5 60 OFF 64  # release velocity is dropped', '500 64 on 30'])
+    assert events == [(0.0, 60, True, 100), (250.5, 60, False, 0), (500.0, 64, True, 30)]
+
+
+@pytest.mark.parametrize('line', ['0 60', '0 60 down', 'x 60 on', '0 128 on', '0 60 on loud'])
+def test_bad_script_lines_are_rejected(line):
+    with pytest.raises(MidiInputError, match='line 2'):
+        parse_midi_script(['0 60 on', line])
+
+
+def test_decode_midi_message():
+    assert decode_midi_message(0x93, 60, 90) == (60, True, 90)
+    assert decode_midi_message(0x90, 60, 0) == (60, False, 0)  # Note-on with velocity 0 is a release
+    assert decode_midi_message(0x85, 61, 40) == (61, False, 0)
+    assert decode_midi_message(0xB0, 64, 127) is None
+
+
+def test_read_batch_returns_events_once_their_offsets_pass():
+    device = ScriptedMidiInput([(20.0, 62, True, 80), (0.0, 60, True, 100), (20.0, 60, False, 0)])
+    clock_ms = [0.0]; device.now_ms = lambda: clock_ms[0]
+    assert device.read_batch() == [(0.0, 60, True, 100)]
+    clock_ms[0] = 19.9; assert device.read_batch() == []
+    clock_ms[0] = 20.0; assert device.read_batch() == [(20.0, 62, True, 80), (20.0, 60, False, 0)]
+    assert device.read_batch() == []
+
+
+def test_scripted_events_are_polled_after_their_offsets_with_their_timestamps():
+    device = ScriptedMidiInput(parse_midi_script(['0 60 on', '30 60 off', '60 64 on 70'])); woken = threading.Event()
+    device.start(on_input=woken.set); received = []; deadline = time.perf_counter() + 2.0
+    try:
+        while len(received) < 3 and time.perf_counter() < deadline:
+            woken.wait(0.1); woken.clear()
+            for event in device.poll(): received.append((device.now_ms(), event))
+    finally: device.close()
+    assert [event for _, event in received] == [(0.0, 60, True, 100), (30.0, 60, False, 0), (60.0, 64, True, 70)]
+    assert all(polled_ms >= event[0] for polled_ms, event in received)
@@ -0,0 +1,31 @@
+from note_store import NoteStore
+
+
+def make_store():
+    return NoteStore.from_columns([64, 60, 67, 62], [1.0, 0.0, 1.0, 3.0], [0.5, 2.0, 0.25, 1.0], [90, 100, 80, 70])
+
+
+def test_from_columns_sorts_by_start_then_pitch():
+    notes = make_store()
+    assert list(notes.pitches) == [60, 64, 67, 62]
+    assert list(notes.starts) == [0.0, 1.0, 1.0, 3.0]
+    assert list(notes.velocities) == [100, 90, 80, 70]
+    assert notes.total_duration == 4.0 and notes.max_note_duration == 2.0
+
+
+def test_played_bits_and_first_unplayed():
+    notes = make_store()
+    notes.set_played(0); notes.set_played(1)
+    assert notes.is_played(1) and not notes.is_played(2)
+    assert notes.first_unplayed() == 2
+    notes.set_played(1, False)
+    assert notes.first_unplayed() == 1
+    notes.reset_played()
+    assert notes.first_unplayed() == 0
+
+
+def test_visible_range_includes_long_notes_started_earlier():
+    notes = make_store()
+    first, last = notes.visible_range(1.5, 2.0)
+    assert first == 0 and last == 3  # The note at 0.0 lasts until 2.0
+    assert notes.index_at_or_after(1.0) == 1 and notes.index_after(1.0) == 3
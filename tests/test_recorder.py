@@ -0,0 +1,56 @@
+import pytest
+
+from recorder import LOG_MAGIC, PerformanceRecorder, read_performance_log, RECORD_FORMAT
+
+
+def record_take(recorder, count, path=None):
+    logs = []
+    recorder.start(path)
+    for i in range(count): recorder.record(i * 0.5, 60 + i, i % 2 == 0)
+    recorder.stop(on_complete=logs.append, wait=True)
+    return logs[0]
+
+
+def test_batches_that_wrap_around_the_ring_keep_their_order():
+    # Batches of 3 in a 4-record ring: the second batch starts at the last slot and wraps to the front
+    recorder = PerformanceRecorder(capacity=4, flush_batch=3)
+    song_times, capture_ns, pitches, is_press = read_performance_log(record_take(recorder, 11))
+    assert list(song_times) == [i * 0.5 for i in range(11)]
+    assert list(pitches) == list(range(60, 71))
+    assert list(is_press) == [1, 0] * 5 + [1]
+    assert list(capture_ns) == sorted(capture_ns)
+
+
+def test_flush_hands_pending_records_to_the_writer():
+    recorder = PerformanceRecorder(capacity=8, flush_batch=8); logs = []
+    recorder.start()
+    recorder.record(0.0, 60, True); recorder.record(0.25, 60, False)
+    assert recorder._written - recorder._flushed == 2
+    recorder.flush()
+    assert recorder._flushed == recorder._written == 2
+    recorder.flush()  # Nothing pending: no empty batch
+    recorder.stop(on_complete=logs.append, wait=True)
+    assert len(logs[0]) == len(LOG_MAGIC) + 2 * RECORD_FORMAT.size
+    assert not recorder.recording
+
+
+def test_take_logged_to_a_file_matches_the_completed_bytes(tmp_path):
+    path = tmp_path / 'take.pklog'
+    log_bytes = record_take(PerformanceRecorder(capacity=4, flush_batch=2), 5, str(path))
+    assert path.read_bytes() == log_bytes
+    assert list(read_performance_log(log_bytes)[2]) == [60, 61, 62, 63, 64]
+
+
+def test_records_outside_a_take_are_ignored():
+    recorder = PerformanceRecorder(capacity=4)
+    recorder.record(0.0, 60, True)
+    assert recorder._written == 0
+    assert len(record_take(recorder, 0)) == len(LOG_MAGIC)
+
+
+def test_read_performance_log_skips_a_partial_trailing_record():
+    log_bytes = LOG_MAGIC + RECORD_FORMAT.pack(1.5, 42, 64, 1) + b'\x00' * 5
+    song_times, capture_ns, pitches, is_press = read_performance_log(log_bytes)
+    assert list(song_times) == [1.5] and list(capture_ns) == [42] and list(pitches) == [64] and list(is_press) == [1]
+    with pytest.raises(ValueError):
+        read_performance_log(b'not a log')
@@ -0,0 +1,51 @@
+import math
+from array import array
+
+import pytest
+
+from note_store import NoteStore
+from scoring import format_score_summary, NOTE_EARLY, NOTE_LATE, NOTE_MISSED, NOTE_ON_TIME, score_performance
+from timeline import ChordSteps
+
+
+def make_song():
+    # Four single notes a second apart and a two-note chord at 4.0
+    notes = NoteStore.from_columns([60, 62, 64, 65, 67, 71], [0.0, 1.0, 2.0, 3.0, 4.0, 4.0], [0.5] * 6, [100] * 6)
+    return notes, ChordSteps(notes)
+
+
+def score(presses, **kwargs):
+    notes, chords = make_song()
+    return score_performance(notes, chords, array('d', (t for t, _ in presses)), array('B', (p for _, p in presses)), **kwargs)
+
+
+def test_presses_are_classified_on_time_early_late_missed_and_extra():
+    # 60 on time, 62 early, 64 late, 65 missed, 67/71 on time, 72 was never in the song
+    result = score([(0.03, 60), (0.8, 62), (2.2, 64), (4.01, 67), (4.05, 71), (4.5, 72)])
+    assert list(result['note_results']) == [NOTE_ON_TIME, NOTE_EARLY, NOTE_LATE, NOTE_MISSED, NOTE_ON_TIME, NOTE_ON_TIME]
+    assert result['counts'] == {'on_time': 3, 'early': 1, 'late': 1, 'missed': 1, 'extra': 1}
+    assert result['note_offsets'][1] == pytest.approx(-0.2)
+    assert math.isnan(result['note_offsets'][3])
+    assert result['chord_latencies'][4] == pytest.approx(0.05)
+
+
+def test_press_outside_the_match_window_is_extra():
+    result = score([(0.5, 60)])
+    assert result['counts']['missed'] == 6 and result['counts']['extra'] == 1
+
+
+def test_each_note_claims_the_closest_unused_press():
+    result = score([(-0.1, 60), (0.02, 60)])
+    assert result['note_offsets'][0] == pytest.approx(0.02)
+    assert result['counts']['extra'] == 1
+
+
+def test_scoring_window_limits_the_notes():
+    result = score([(1.0, 62), (2.0, 64)], start_time=1.0, end_time=3.0)
+    assert result['first_note'] == 1 and len(result['note_results']) == 2
+    assert result['counts']['on_time'] == 2 and result['counts']['missed'] == 0
+
+
+def test_summary_mentions_every_count():
+    summary = format_score_summary(score([(0.0, 60)]))
+    assert summary.startswith("1 on time, 0 early, 0 late, 5 missed, 0 extra")
@@ -0,0 +1,63 @@
+import struct
+
+import pytest
+
+from note_store import NoteStore
+from song_library import BLOB_HEADER, map_song_blob, write_song_blob
+from tempo_map import TempoMap
+from timeline import ChordSteps, compile_note_events
+
+
+def make_song():
+    tempo_map = TempoMap.from_smf(480, [(0, 500000), (960, 1000000)])
+    notes = NoteStore.from_columns([60, 64, 67, 62, 72], [0.0, 0.01, 0.5, 1.0, 2.0], [0.5, 0.5, 0.5, 1.0, 0.25], [100, 90, 80, 70, 60], tempo_map)
+    return notes, ChordSteps(notes, 0.03), compile_note_events(notes)
+
+
+def test_blob_round_trip(tmp_path):
+    notes, chords, note_events = make_song(); path = str(tmp_path / 'song.pksong')
+    write_song_blob(path, notes, chords, note_events)
+    song = map_song_blob(path, 'song', 0.03)
+    assert song.title == 'song'
+    for column in ('pitches', 'starts', 'durations', 'velocities'):
+        assert list(getattr(song.notes, column)) == list(getattr(notes, column))
+    assert song.notes.total_duration == notes.total_duration and song.notes.max_note_duration == notes.max_note_duration
+    assert list(song.chords.starts) == list(chords.starts) and list(song.chords.first_notes) == list(chords.first_notes)
+    assert [song.chords.pitch_sets[c] for c in range(len(chords))] == chords.pitch_sets
+    assert [list(column) for column in song.note_events] == [list(column) for column in note_events]
+    tempo_map = song.notes.tempo_map
+    assert tempo_map.ticks_per_beat == 480 and len(tempo_map) == 2
+    assert tempo_map.tick_to_seconds(1440) == pytest.approx(2.0)
+    assert tempo_map.bpm_at(1.5) == pytest.approx(60.0)
+
+
+def test_other_chord_tolerance_regroups_chords(tmp_path):
+    notes, chords, note_events = make_song(); path = str(tmp_path / 'song.pksong')
+    write_song_blob(path, notes, chords, note_events)
+    song = map_song_blob(path, 'song', 0.0)
+    assert song.chords.tolerance_sec == 0.0 and len(song.chords) == len(notes)
+
+
+def test_blob_from_another_layout_version_is_rejected(tmp_path):
+    notes, chords, note_events = make_song(); path = tmp_path / 'song.pksong'
+    write_song_blob(str(path), notes, chords, note_events)
+    data = bytearray(path.read_bytes()); data[7] ^= 0xFF; path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        map_song_blob(str(path), 'song', 0.03)
+
+
+def test_blob_from_another_parser_version_is_rejected(tmp_path):
+    notes, chords, note_events = make_song(); path = tmp_path / 'song.pksong'
+    write_song_blob(str(path), notes, chords, note_events)
+    data = bytearray(path.read_bytes()); struct.pack_into('<I', data, 8, 0xFFFF); path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        map_song_blob(str(path), 'song', 0.03)
+
+
+@pytest.mark.parametrize('keep_bytes', [4, BLOB_HEADER.size, BLOB_HEADER.size + 16])
+def test_truncated_blob_is_rejected(tmp_path, keep_bytes):
+    notes, chords, note_events = make_song(); path = tmp_path / 'song.pksong'
+    write_song_blob(str(path), notes, chords, note_events)
+    path.write_bytes(path.read_bytes()[:keep_bytes])
+    with pytest.raises(ValueError):
+        map_song_blob(str(path), 'song', 0.03)
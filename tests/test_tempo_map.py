@@ -0,0 +1,44 @@
+import pytest
+
+from tempo_map import TempoMap
+
+
+def test_constant_map_is_120_bpm():
+    tempo_map = TempoMap.constant()
+    assert len(tempo_map) == 1
+    assert tempo_map.tick_to_seconds(480) == pytest.approx(0.5)
+    assert tempo_map.bpm_at(10.0) == pytest.approx(120.0)
+
+
+def test_tempo_changes_convert_per_segment():
+    # 120 BPM for two beats, then 60 BPM
+    tempo_map = TempoMap.from_smf(480, [(960, 1000000), (0, 500000)])
+    assert len(tempo_map) == 2
+    assert tempo_map.tick_to_seconds(960) == pytest.approx(1.0)
+    assert tempo_map.tick_to_seconds(1440) == pytest.approx(2.0)
+    assert tempo_map.seconds_to_tick(2.0) == pytest.approx(1440)
+    assert tempo_map.bpm_at(0.5) == pytest.approx(120.0)
+    assert tempo_map.bpm_at(1.5) == pytest.approx(60.0)
+    assert tempo_map.beats_to_seconds(3) == pytest.approx(2.0)
+    assert tempo_map.seconds_to_beats(2.0) == pytest.approx(3.0)
+
+
+@pytest.mark.parametrize('tick', [0, 1, 479, 960, 961, 5000, 123456])
+def test_tick_seconds_round_trip(tick):
+    tempo_map = TempoMap.from_smf(96, [(0, 400000), (192, 750000), (1000, 250000), (4000, 1200000)])
+    assert tempo_map.seconds_to_tick(tempo_map.tick_to_seconds(tick)) == pytest.approx(tick)
+
+
+def test_repeated_tempo_events_do_not_add_segments():
+    tempo_map = TempoMap.from_smf(480, [(0, 600000), (480, 600000), (960, 600000)])
+    assert len(tempo_map) == 1
+    assert tempo_map.tick_to_seconds(960) == pytest.approx(1.2)
+
+
+def test_smpte_division_ignores_tempo_events():
+    # 25 frames per second, 40 ticks per frame: 1000 ticks per second
+    division = ((256 - 25) << 8) | 40
+    tempo_map = TempoMap.from_smf(division, [(0, 1000000), (500, 250000)])
+    assert len(tempo_map) == 1
+    assert tempo_map.tick_to_seconds(1000) == pytest.approx(1.0)
+    assert tempo_map.seconds_to_tick(2.5) == pytest.approx(2500)
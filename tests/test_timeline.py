@@ -0,0 +1,47 @@
+from array import array
+
+from note_store import NoteStore
+from timeline import ChordSteps, compile_note_events, EventTimeline
+
+
+def make_store():
+    # A spread chord at 0.0, a single note at 0.5 and a two-note chord at 1.0
+    return NoteStore.from_columns([60, 64, 67, 72, 60, 65], [0.0, 0.01, 0.02, 0.5, 1.0, 1.0], [0.5, 0.5, 0.5, 0.5, 1.0, 1.0], [100] * 6)
+
+
+def test_chords_group_notes_within_tolerance_of_the_first():
+    chords = ChordSteps(make_store(), tolerance_sec=0.03)
+    assert list(chords.starts) == [0.0, 0.5, 1.0]
+    assert [list(chords.note_range(c)) for c in range(len(chords))] == [[0, 1, 2], [3], [4, 5]]
+    assert chords.pitch_sets == [frozenset((60, 64, 67)), frozenset((72,)), frozenset((60, 65))]
+    assert chords.index_at_or_after(0.2) == 1
+
+
+def test_zero_tolerance_splits_spread_chords():
+    assert list(ChordSteps(make_store()).starts) == [0.0, 0.01, 0.02, 0.5, 1.0]
+
+
+def test_chords_from_columns_build_the_same_pitch_sets():
+    notes = make_store(); chords = ChordSteps(notes, 0.03)
+    loaded = ChordSteps.from_columns(notes, 0.03, chords.starts, chords.first_notes)
+    assert len(loaded) == len(chords)
+    assert [loaded.pitch_sets[c] for c in range(len(loaded))] == chords.pitch_sets
+
+
+def test_note_offs_sort_before_note_ons_at_the_same_instant():
+    notes = NoteStore.from_columns([60, 60], [0.0, 1.0], [1.0, 1.0], [100, 100])
+    times, is_note_on, note_indices = compile_note_events(notes)
+    assert list(times) == [0.0, 1.0, 1.0, 2.0]
+    assert list(is_note_on) == [1, 0, 1, 0]
+    assert list(note_indices) == [0, 0, 1, 1]
+
+
+def test_timeline_advance_and_seek():
+    notes = make_store(); key_types = array('b', [1] * 128); key_indices = array('h', range(128))
+    timeline = EventTimeline(notes, key_types, key_indices)
+    assert timeline.matches_keyboard(key_types, key_indices)
+    assert timeline.advance(0.015) == (0, 2)
+    assert timeline.advance(0.015) == (2, 2)
+    assert timeline.seek(1.5) == [4, 5]
+    assert timeline.held_counts[60] == 1 and timeline.held_counts[65] == 1 and timeline.held_counts[64] == 0
+    assert not timeline.matches_keyboard(array('b', [0] * 128), key_indices)
@@ -0,0 +1,102 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+DEFAULT_CHORD_TOLERANCE_SEC = 0.03  # Imported performances rarely strike a chord's notes at exactly the same instant
+
+
+def compile_note_events(note_store):
+    # (times, is_note_on, note_indices) of every note-on/off, in playback order. Note-offs sort before note-ons at
+    # the same instant, so a re-struck key ends up held; zero-length notes still turn off after their own note-on.
+    starts = note_store.starts; durations = note_store.durations; n = len(note_store)
+    events = sorted([(starts[i] + durations[i], 0 if durations[i] > 0 else 2, i) for i in range(n)] + [(starts[i], 1, i) for i in range(n)])
+    return array('d', (event[0] for event in events)), array('b', (event[1] == 1 for event in events)), array('i', (event[2] for event in events))
+
+
+class EventTimeline:
+    # A song compiled once into time-sorted note-on/note-off events with keyboard keys already resolved.
+    # Playback advances a cursor and only touches the events due since the previous frame.
+
+    def __init__(self, note_store, key_types, key_indices, note_events=None):
+        # key_types/key_indices: 128-entry keyboard tables (see KeyboardGeometry) resolved into each event.
+        # note_events: precompiled compile_note_events() columns (e.g. from the song cache); compiled here if None.
+        self.note_store = note_store; self.keyboard_tables = (key_types, key_indices)
+        self.times, self.is_note_on, self.note_indices = note_events if note_events is not None else compile_note_events(note_store)
+        store_pitches = note_store.pitches
+        self.pitches = array('B', (store_pitches[note_idx] for note_idx in self.note_indices))
+        self.key_types = array('b', (key_types[pitch] for pitch in self.pitches))  # 0 off-keyboard, 1 white, 2 black
+        self.key_indices = array('h', (key_indices[pitch] for pitch in self.pitches))
+        self.held_counts = array('h', bytes(2 * 128))  # Overlapping notes of one pitch keep its key held until the last ends
+        self.cursor = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def matches_keyboard(self, key_types, key_indices):
+        # False once the key range has changed since the timeline was built (its resolved keys are then stale)
+        return self.keyboard_tables[0] == key_types and self.keyboard_tables[1] == key_indices
+
+    def advance(self, time_sec):
+        # Range of event indices that became due since the last call; the cursor moves past them.
+        first = self.cursor
+        if first < len(self.times) and self.times[first] <= time_sec: self.cursor = bisect_right(self.times, time_sec, first)
+        return first, self.cursor
+
+    def seek(self, time_sec):
+        # Repositions the cursor and rebuilds held_counts from the notes sounding at time_sec.
+        # Returns the note indices that are held at that instant.
+        self.cursor = bisect_right(self.times, time_sec)
+        self.held_counts[:] = array('h', bytes(2 * 128))
+        store = self.note_store
+        first, _ = store.visible_range(time_sec, time_sec)
+        held_notes = [i for i in range(first, store.index_after(time_sec)) if store.end_time(i) > time_sec]
+        for i in held_notes: self.held_counts[store.pitches[i]] += 1
+        return held_notes
+
+
+class ChordSteps:
+    # Learning-mode steps: notes whose starts fall within tolerance_sec of a chord's first note form one chord,
+    # stored as its start time, its slice of note indices and the set of pitches expected from the player.
+
+    def __init__(self, note_store, tolerance_sec=0.0):
+        self.tolerance_sec = tolerance_sec
+        starts = note_store.starts; pitches = note_store.pitches
+        self.starts = array('d'); self.first_notes = array('i'); self.pitch_sets = []
+        for i in range(len(note_store)):
+            if not self.starts or starts[i] - self.starts[-1] > tolerance_sec:
+                self.starts.append(starts[i]); self.first_notes.append(i); self.pitch_sets.append(set())
+            self.pitch_sets[-1].add(pitches[i])
+        self.first_notes.append(len(note_store))  # Sentinel: chord c covers first_notes[c]:first_notes[c + 1]
+        self.pitch_sets = [frozenset(pitch_set) for pitch_set in self.pitch_sets]
+
+    @classmethod
+    def from_columns(cls, note_store, tolerance_sec, starts, first_notes):
+        # Chords loaded from stored columns (first_notes includes the sentinel); pitch sets are built on first use.
+        chords = cls.__new__(cls)
+        chords.tolerance_sec = tolerance_sec; chords.starts = starts; chords.first_notes = first_notes
+        chords.pitch_sets = _LazyPitchSets(note_store.pitches, first_notes)
+        return chords
+
+    def __len__(self):
+        return len(self.starts)
+
+    def note_range(self, chord_idx):
+        return range(self.first_notes[chord_idx], self.first_notes[chord_idx + 1])
+
+    def index_at_or_after(self, time_sec):
+        # First chord that has not started before time_sec
+        return bisect_left(self.starts, time_sec)
+
+
+class _LazyPitchSets:
+    # Sequence of per-chord pitch frozensets computed on first access, so loading a cached song stays O(1).
+
+    def __init__(self, pitches, first_notes):
+        self._pitches = pitches; self._first_notes = first_notes; self._sets = {}
+
+    def __len__(self):
+        return len(self._first_notes) - 1
+
+    def __getitem__(self, chord_idx):
+        pitch_set = self._sets.get(chord_idx)
+        if pitch_set is None: pitch_set = self._sets[chord_idx] = frozenset(self._pitches[self._first_notes[chord_idx]:self._first_notes[chord_idx + 1]])
+        return pitch_set